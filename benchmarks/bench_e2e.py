@@ -0,0 +1,341 @@
+"""
+端到端同步基准测试
+
+启动本地豆瓣替身服务器（douban_stub.py），用 gen_media_db.py 生成的媒体库驱动插件完整的 do_job：
+反向同步（抓取豆瓣看过列表并写入媒体库）、在看 / 已看的正向同步（搜索豆瓣ID并标记）。
+每个插件连续运行两次：首次同步（cold），以及模拟一次用户活动（churn）后的增量同步（incr），输出
+    items/s         每秒处理的条目数（正向扫描到的条目 + 反向同步读到的豆瓣条目）
+    req/item        每个条目平均发出的豆瓣请求数
+    p50/p95/p99     各接口请求耗时的分位数（毫秒，从插件侧测量，包含替身服务器注入的延迟）
+以及替身服务器统计的请求数、注入的故障（限流、未开播、无效 ck）和标记数
+
+用法：
+    python benchmarks/bench_e2e.py [--plugin trim zvideo] [--size 1k] [--latency 30 --jitter 20]
+                                   [--burst-every 200 --burst-length 5 --burst-kind 403|captcha]
+                                   [--not-aired 0.02] [--missing 0.05] [--speedup 100] [--json report.json]
+
+插件需要 MoviePilot 的 app 包，需在 MoviePilot 的运行环境中执行；插件数据保存在临时目录和内存中，
+不会写入 MoviePilot 的数据库，也不会发送通知。
+豆瓣限速器的速率按 --speedup 放大、冷却时间按同样倍数缩短，使测试在合理时间内完成，
+限速器自适应的行为（被限流后减速、冷却和恢复）保持不变。
+每个插件在独立的子进程中运行，通过环境变量 DOUBAN_BASE_URL 指向替身服务器
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+
+ROOT = Path(__file__).resolve().parent
+PLUGINS = ROOT.parent / "plugins"
+sys.path.insert(0, str(ROOT))
+
+import douban_stub  # noqa: E402
+import gen_media_db  # noqa: E402
+
+# 插件 -> (插件目录, 插件类, 适配器类, 媒体服务器, 媒体库用户的配置项)
+PLUGIN_SPECS = {
+    "trim": ("trimmediahelper", "TrimMediaHelper", "TrimMediaAdapter", "fnos", "trimmedia_user"),
+    "zvideo": ("zvideohelperex", "ZvideoHelperEx", "ZvideoAdapter", "zvideo", "zvideo_username"),
+}
+# 替身服务器上的豆瓣用户和登录 cookie
+DOUBAN_USER = "bench"
+COOKIE = 'bid=bench; dbcl2="bench:stub"'
+# 不在媒体库中的豆瓣条目从这里编号，详情页给出的 IMDb ID 与媒体库不重合
+UNKNOWN_BASE = 10_000_000
+
+
+def seed_stub(stub: douban_stub.DoubanStub, server: str, db_path: str, ratio: float, seed: int = 3) -> int:
+    """
+    按媒体库预置豆瓣看过列表：取 ratio 比例的媒体库条目，另加约 10% 不在媒体库中的条目
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    try:
+        if server == "fnos":
+            douban_ids = [douban_stub.douban_id_for(row[0]) for row in conn.execute(
+                "SELECT DISTINCT imdb_id FROM item WHERE imdb_id IS NOT NULL AND imdb_id != ''")]
+        else:
+            douban_ids = [row[0] for row in conn.execute(
+                "SELECT DISTINCT douban_id FROM zvideo_collection WHERE douban_id IS NOT NULL AND douban_id != 0")]
+    finally:
+        conn.close()
+    picked = rng.sample(douban_ids, int(len(douban_ids) * ratio))
+    picked += [UNKNOWN_BASE + i for i in range(len(picked) // 10)]
+    rng.shuffle(picked)
+    stub.seed_collection("collect", [(douban_id, f"豆瓣条目 {douban_id}") for douban_id in picked])
+    return len(picked)
+
+
+def fetch_stats(base_url: str) -> dict:
+    with urlopen(f"{base_url}/__stats") as response:
+        return json.load(response)
+
+
+def stats_delta(before: dict, after: dict) -> dict:
+    return {
+        category: {key: value - before.get(category, {}).get(key, 0)
+                   for key, value in after.get(category, {}).items()
+                   if value - before.get(category, {}).get(key, 0)}
+        for category in ("requests", "status", "faults", "marked")
+    }
+
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    cuts = statistics.quantiles(ordered, n=100, method="inclusive") if len(ordered) > 1 else ordered * 99
+    return {"count": len(ordered), "p50": cuts[49], "p95": cuts[94], "p99": cuts[98], "max": ordered[-1]}
+
+
+class HttpTimer:
+    """
+    记录插件发出的每个豆瓣请求的耗时（毫秒），按接口分类。
+    requests 跟随重定向时会递归调用 send，只记录最外层的一次
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def record(self, request, elapsed: float):
+        endpoint = douban_stub.endpoint_of(request.method, urlsplit(str(request.url)).path)
+        with self._lock:
+            self.samples[endpoint].append(elapsed * 1000)
+
+    def take(self) -> dict:
+        with self._lock:
+            samples, self.samples = self.samples, defaultdict(list)
+        return samples
+
+    def install(self):
+        import httpx
+        import requests
+
+        timer = self
+        session_send = requests.Session.send
+        async_send = httpx.AsyncClient.send
+
+        def send(session, request, **kwargs):
+            depth = getattr(timer._local, "depth", 0)
+            timer._local.depth = depth + 1
+            started = time.perf_counter()
+            try:
+                return session_send(session, request, **kwargs)
+            finally:
+                timer._local.depth = depth
+                if not depth:
+                    timer.record(request, time.perf_counter() - started)
+
+        async def send_async(client, request, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await async_send(client, request, **kwargs)
+            finally:
+                timer.record(request, time.perf_counter() - started)
+
+        requests.Session.send = send
+        httpx.AsyncClient.send = send_async
+
+
+class MemoryData:
+    """
+    代替 MoviePilot 插件数据表的内存存储
+    """
+
+    def __init__(self):
+        self.values = {}
+
+    def get_data(self, key=None, plugin_id=None):
+        return self.values.get(key)
+
+    def save_data(self, key, value, plugin_id=None):
+        self.values[key] = value
+
+    def del_data(self, key, plugin_id=None):
+        self.values.pop(key, None)
+
+
+def run_worker(name: str, db_path: str, base_url: str, args) -> dict:
+    """
+    在当前进程中运行一个插件的两次 do_job，返回每次的吞吐量、请求数和请求耗时
+    """
+    try:
+        import app.plugins
+    except ImportError:
+        raise SystemExit("没有找到 MoviePilot 的 app 包，请在 MoviePilot 的运行环境中执行")
+    if str(PLUGINS) not in app.plugins.__path__:
+        app.plugins.__path__.insert(0, str(PLUGINS))
+
+    folder, class_name, adapter_name, server, user_key = PLUGIN_SPECS[name]
+    package = f"app.plugins.{folder}"
+    # 限速器在创建豆瓣账户时取用，需在插件第一次访问豆瓣前替换
+    client = importlib.import_module(f"{package}.DoubanClient")
+    rate_limiter = importlib.import_module(f"{package}.RateLimiter")
+    rate_limiter.TokenBucket.BASE_COOLDOWN /= args.speedup
+    rate_limiter.TokenBucket.MAX_COOLDOWN /= args.speedup
+    client._registry().limiter = rate_limiter.RateLimiter({
+        endpoint: tuple(rate * args.speedup for rate in rates)
+        for endpoint, rates in rate_limiter.RateLimiter.DEFAULT_RATES.items()
+    })
+
+    # 统计正向扫描到的条目数和反向同步读到的豆瓣条目数
+    sync_engine = importlib.import_module(f"{package}.SyncEngine")
+    adapter_class = getattr(importlib.import_module(f"{package}.{adapter_name}"), adapter_name)
+    counts = defaultdict(int)
+    scan, stream_iter = adapter_class.scan, sync_engine.MovieStream.__iter__
+
+    def counted_scan(adapter, kind, since):
+        result = scan(adapter, kind, since)
+        counts[kind] += len(result[1])
+        return result
+
+    def counted_iter(stream):
+        for movie in stream_iter(stream):
+            counts["douban"] += 1
+            yield movie
+
+    adapter_class.scan = counted_scan
+    sync_engine.MovieStream.__iter__ = counted_iter
+    timer = HttpTimer()
+    timer.install()
+
+    plugin = getattr(importlib.import_module(package), class_name)()
+    data = MemoryData()
+    data_dir = Path(tempfile.mkdtemp(prefix=f"bench_e2e_{name}_"))
+    plugin.get_data, plugin.save_data, plugin.del_data = data.get_data, data.save_data, data.del_data
+    plugin.get_data_path = lambda plugin_id=None: data_dir
+    plugin.post_message = lambda **kwargs: None
+    plugin.update_config = lambda config, plugin_id=None: None
+    config = {
+        "enabled": True, "db_path": db_path, "cookie": COOKIE, "douban_user": DOUBAN_USER,
+        user_key: gen_media_db.BENCH_USER, "sync_douban_status": True, "reverse_sync_douban_status": True,
+        "private": True, "notify": False, "onlyonce": False,
+    }
+    if server == "fnos":
+        config["douban_concurrency"] = args.concurrency
+    plugin.init_plugin(config)
+
+    phases = []
+    for phase in ("cold", "incr"):
+        if phase == "incr":
+            gen_media_db.GENERATORS[server][1](db_path, ratio=args.churn, seed=args.seed + 1)
+        counts.clear()
+        timer.take()
+        before = fetch_stats(base_url)
+        started = time.perf_counter()
+        plugin.do_job()
+        seconds = time.perf_counter() - started
+        stub_stats = stats_delta(before, fetch_stats(base_url))
+        items = counts["watching"] + counts["done"] + counts["douban"]
+        requests_sent = sum(stub_stats["requests"].values())
+        samples = timer.take()
+        phases.append({
+            "phase": phase, "seconds": seconds, "items": items, "counts": dict(counts),
+            "items_per_s": items / seconds if seconds else 0.0,
+            "requests": requests_sent, "req_per_item": requests_sent / items if items else 0.0,
+            "latency_ms": {"all": percentiles([ms for values in samples.values() for ms in values]),
+                           **{endpoint: percentiles(values) for endpoint, values in sorted(samples.items())}},
+            "stub": stub_stats,
+        })
+    plugin.stop_service()
+    return {"plugin": name, "phases": phases}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--plugin", nargs="+", choices=list(PLUGIN_SPECS), default=list(PLUGIN_SPECS))
+    arg_parser.add_argument("--size", default="1k", help="媒体库条目数：1k、10k 或具体数字")
+    arg_parser.add_argument("--watched", type=float, default=0.3, help="每个用户的观看比例")
+    arg_parser.add_argument("--collect", type=float, default=0.2, help="豆瓣看过列表中媒体库条目的比例")
+    arg_parser.add_argument("--churn", type=float, default=0.01, help="两次同步之间变化的条目比例")
+    arg_parser.add_argument("--seed", type=int, default=0, help="生成数据库的随机种子")
+    arg_parser.add_argument("--latency", type=float, default=30, help="替身服务器每个请求的固定延迟（毫秒）")
+    arg_parser.add_argument("--jitter", type=float, default=20, help="替身服务器的随机延迟上限（毫秒）")
+    arg_parser.add_argument("--burst-every", type=int, default=0, help="每多少个正常请求后限流一次，0 为不限流")
+    arg_parser.add_argument("--burst-length", type=int, default=3, help="每次连续被限流的请求数")
+    arg_parser.add_argument("--burst-kind", choices=["403", "captcha"], default="403")
+    arg_parser.add_argument("--not-aired", type=float, default=0.0, help="标记时返回未开播的条目比例")
+    arg_parser.add_argument("--missing", type=float, default=0.0, help="搜索不到的 IMDb ID 比例")
+    arg_parser.add_argument("--speedup", type=float, default=100, help="限速器速率放大、冷却时间缩短的倍数")
+    arg_parser.add_argument("--concurrency", type=int, default=4, help="飞牛影视插件的豆瓣并发数")
+    arg_parser.add_argument("--json", help="把结果写入 JSON 文件")
+    arg_parser.add_argument("-v", "--verbose", action="store_true", help="输出插件日志")
+    arg_parser.add_argument("--worker", nargs=3, metavar=("PLUGIN", "DB", "URL"), help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.worker:
+        name, db_path, base_url = args.worker
+        print(json.dumps(run_worker(name, db_path, base_url, args), ensure_ascii=False))
+        return
+
+    results = []
+    header = f"{'plugin':<8}{'phase':<6}{'items':>8}{'seconds':>9}{'items/s':>9}{'requests':>10}{'req/item':>10}" \
+        f"  {'endpoint':<11}{'count':>7}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}"
+    print(header)
+    print("-" * len(header))
+    with tempfile.TemporaryDirectory(prefix="bench_e2e_") as work_dir:
+        for name in args.plugin:
+            server = PLUGIN_SPECS[name][3]
+            db_path = str(Path(work_dir) / f"{server}.db")
+            generate = gen_media_db.GENERATORS[server][0]
+            generate(db_path, gen_media_db.parse_size(args.size), watched=args.watched, seed=args.seed)
+            # 每个插件使用新的替身服务器，收藏列表和统计互不影响
+            stub = douban_stub.DoubanStub(
+                user=DOUBAN_USER, latency=args.latency, jitter=args.jitter, burst_every=args.burst_every,
+                burst_length=args.burst_length, burst_kind=args.burst_kind, not_aired=args.not_aired,
+                missing=args.missing, seed=args.seed)
+            collected = seed_stub(stub, server, db_path, args.collect)
+            http_server = douban_stub.serve(stub)
+            base_url = "http://%s:%s" % http_server.server_address[:2]
+            try:
+                command = [sys.executable, __file__, "--worker", name, db_path, base_url,
+                           "--speedup", str(args.speedup), "--concurrency", str(args.concurrency),
+                           "--churn", str(args.churn), "--seed", str(args.seed)]
+                output = subprocess.run(
+                    command, check=True, text=True, env={**os.environ, "DOUBAN_BASE_URL": base_url},
+                    stdout=subprocess.PIPE, stderr=None if args.verbose else subprocess.DEVNULL,
+                ).stdout
+            finally:
+                http_server.shutdown()
+                http_server.server_close()
+            if args.verbose:
+                print(output.rstrip().rsplit("\n", 1)[0] if "\n" in output.rstrip() else "")
+            result = json.loads(output.rstrip().rsplit("\n", 1)[-1])
+            result["collected"] = collected
+            results.append(result)
+            for phase in result["phases"]:
+                prefix = f"{name:<8}{phase['phase']:<6}{phase['items']:>8}{phase['seconds']:>9.2f}" \
+                    f"{phase['items_per_s']:>9.1f}{phase['requests']:>10}{phase['req_per_item']:>10.2f}"
+                for endpoint, latency in phase["latency_ms"].items():
+                    if latency:
+                        print(f"{prefix}  {endpoint:<11}{latency['count']:>7}{latency['p50']:>8.1f}"
+                              f"{latency['p95']:>8.1f}{latency['p99']:>8.1f}{latency['max']:>8.1f}")
+                        prefix = " " * len(prefix)
+                faults = {**phase["stub"]["faults"], **{f"marked_{key}": value
+                                                        for key, value in phase["stub"]["marked"].items()}}
+                if faults:
+                    print(f"{' ' * 14}{', '.join(f'{key} {value}' for key, value in sorted(faults.items()))}")
+
+    if args.json:
+        report = {"params": {key: value for key, value in vars(args).items() if key not in ("json", "worker")},
+                  "results": results}
+        Path(args.json).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+豆瓣页面解析后端基准测试
+
+对 fixtures 目录下保存的搜索结果页、收藏列表页和条目详情页，分别用各解析后端
+（整页解析 / 只解析需要的片段）反复解析，输出每秒解析页数和峰值内存
+
+用法：
+    python benchmarks/bench_parser.py [-n 次数] [--backend 后端 ...]
+
+每个后端在独立的子进程中运行，避免相互影响内存统计；
+峰值内存为 tracemalloc 统计的 Python 对象峰值，以及进程常驻内存（RSS）峰值相对解析前的增量，
+后者包含 lxml、selectolax 在 C 层分配的内存
+"""
+import argparse
+import importlib.util
+import json
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+FIXTURES = ROOT / "fixtures"
+PARSER_FILE = ROOT.parent / "plugins" / "trimmediahelper" / "DoubanParser.py"
+
+# fixture 文件名 -> 解析方法
+PAGES = {
+    "search": "search_results",
+    "collection": "collection_items",
+    "subject": "subject_info",
+}
+
+
+def load_parser():
+    spec = importlib.util.spec_from_file_location("DoubanParser", PARSER_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_pages() -> dict:
+    return {name: (FIXTURES / f"{name}.html").read_text(encoding="utf-8") for name in PAGES}
+
+
+def run_one(backend_name: str, partial: bool, rounds: int) -> dict:
+    """
+    在当前进程中测试一个后端，返回各页面的每秒解析页数和峰值内存
+    """
+    parser_module = load_parser()
+    pages = load_pages()
+    backend = parser_module.BACKENDS[backend_name](partial=partial)
+    reference = parser_module.SoupBackend(partial=False)
+
+    result = {"backend": backend_name, "partial": partial, "pages": {}}
+    # 预热一次，同时与整页 BeautifulSoup 解析的结果比对
+    for name, method in PAGES.items():
+        if getattr(backend, method)(pages[name]) != getattr(reference, method)(pages[name]):
+            result.setdefault("mismatch", []).append(name)
+    del reference
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    for name, method in PAGES.items():
+        parse = getattr(backend, method)
+        html = pages[name]
+        started = time.perf_counter()
+        for _ in range(rounds):
+            parse(html)
+        elapsed = time.perf_counter() - started
+        result["pages"][name] = rounds / elapsed
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # 单独计时一次，tracemalloc 会拖慢解析，吞吐量以不开启时为准
+    for name, method in PAGES.items():
+        parse = getattr(backend, method)
+        html = pages[name]
+        started = time.perf_counter()
+        for _ in range(rounds):
+            parse(html)
+        result["pages"][name] = rounds / (time.perf_counter() - started)
+
+    result["py_peak_kb"] = peak / 1024
+    # Linux 下 ru_maxrss 单位为 KB
+    result["rss_growth_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+    return result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("-n", "--rounds", type=int, default=50, help="每个页面的解析次数")
+    arg_parser.add_argument("--backend", action="append", help="只测试指定后端，可重复")
+    arg_parser.add_argument("--worker", nargs=2, metavar=("BACKEND", "PARTIAL"), help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.worker:
+        backend_name, partial = args.worker
+        print(json.dumps(run_one(backend_name, partial == "1", args.rounds)))
+        return
+
+    parser_module = load_parser()
+    backends = [name for name, backend in parser_module.BACKENDS.items()
+                if backend.available() and (not args.backend or name in args.backend)]
+    skipped = [name for name, backend in parser_module.BACKENDS.items() if not backend.available()]
+    if skipped:
+        print(f"未安装，跳过: {', '.join(skipped)}")
+
+    sizes = {name: len(html.encode("utf-8")) // 1024 for name, html in load_pages().items()}
+    print(f"fixture: {', '.join(f'{name} {size}KB' for name, size in sizes.items())}，每页解析 {args.rounds} 次")
+    header = f"{'backend':<12}{'mode':<9}" + "".join(f"{name + ' p/s':>16}" for name in PAGES) \
+        + f"{'py peak KB':>12}{'rss +KB':>10}"
+    print(header)
+    print("-" * len(header))
+    for backend_name in backends:
+        for partial in (False, True):
+            output = subprocess.run(
+                [sys.executable, __file__, "-n", str(args.rounds), "--worker", backend_name, "1" if partial else "0"],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output)
+            line = f"{backend_name:<12}{'partial' if partial else 'full':<9}" \
+                + "".join(f"{result['pages'][name]:>16.1f}" for name in PAGES) \
+                + f"{result['py_peak_kb']:>12.0f}{result['rss_growth_kb']:>10}"
+            if result.get("mismatch"):
+                line += f"  结果不一致: {', '.join(result['mismatch'])}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
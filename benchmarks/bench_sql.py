@@ -0,0 +1,353 @@
+"""
+插件 SQL 基准测试
+
+用 gen_media_db.py 生成的飞牛影视 / 极影视数据库，直接调用插件的适配器（TrimMediaAdapter / ZvideoAdapter），
+对每个扫描和写入路径计时，并记录每条语句的查询计划（EXPLAIN QUERY PLAN）：
+    signal          判断数据库是否有变化的信号查询（CHANGE_SIGNAL_SQL）
+    watching/done   完整扫描在看 / 已看，完整扫描已看时同时取出库中全部条目的 key
+    *+incr          模拟一次用户活动（churn）后，从完整扫描得到的水位开始的增量扫描
+    reverse-load    反向同步打开写入目标时预加载条目索引和已有观看记录
+    reverse-write   反向同步按适配器的批次大小写入豆瓣看过的条目
+
+用法：
+    python benchmarks/bench_sql.py [--server fnos|zvideo ...] [--size 1k 10k 100k 1m ...] [-n 次数]
+                                   [--watched 0.3] [--churn 0.01] [--indexes] [--plans] [--json report.json]
+
+规模从小到大依次测试，耗时增长明显快于条目数增长的路径会单独标出。
+生成的数据库缓存在 benchmarks/data 下（--data-dir 修改），相同参数再次运行时直接复用；
+增量扫描和写入在副本上进行，不会修改缓存的数据库。
+在 MoviePilot 之外运行时，为插件模块提供最小的 app.log 和 app.plugins 包，不执行插件的 __init__，
+插件日志默认关闭（-v 打开）
+"""
+import argparse
+import ast
+import importlib
+import importlib.util
+import json
+import logging
+import random
+import re
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import types
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+PLUGINS = ROOT.parent / "plugins"
+sys.path.insert(0, str(ROOT))
+
+import gen_media_db  # noqa: E402
+
+# 媒体服务器 -> (插件目录, 适配器模块, 适配器类)
+SERVERS = {
+    "fnos": ("trimmediahelper", "TrimMediaAdapter", "TrimMediaAdapter"),
+    "zvideo": ("zvideohelperex", "ZvideoAdapter", "ZvideoAdapter"),
+}
+# 反向同步模拟的豆瓣看过条目数，其中约 10% 在媒体库中不存在
+REVERSE_MOVIES = 1000
+# 规模增大时耗时的增长倍数超过条目数增长倍数的多少倍视为超线性，以及参与判断的最短耗时（毫秒）
+SUPERLINEAR_FACTOR = 3
+SUPERLINEAR_MIN_MS = 50
+
+
+def install_app_shim(verbose: bool):
+    """
+    MoviePilot 之外没有 app 包时，提供插件模块依赖的 app.log，
+    并把插件目录注册为不执行 __init__ 的包，只加载适配器和数据库相关的模块
+    """
+    if importlib.util.find_spec("app") is not None:
+        return
+    logger = logging.getLogger("bench_sql")
+    logging.basicConfig(format="%(levelname)s %(message)s")
+    logger.setLevel(logging.INFO if verbose else logging.CRITICAL + 1)
+    app = types.ModuleType("app")
+    app.__path__ = []
+    log = types.ModuleType("app.log")
+    log.logger = logger
+    plugins = types.ModuleType("app.plugins")
+    plugins.__path__ = [str(PLUGINS)]
+    sys.modules.update({"app": app, "app.log": log, "app.plugins": plugins})
+    for plugin, _, _ in SERVERS.values():
+        package = types.ModuleType(f"app.plugins.{plugin}")
+        package.__path__ = [str(PLUGINS / plugin)]
+        sys.modules[package.__name__] = package
+
+
+def load_module(plugin: str, name: str):
+    return importlib.import_module(f"app.plugins.{plugin}.{name}")
+
+
+def change_signal_sql(plugin: str) -> str:
+    """
+    从插件 __init__.py 的源码中读取 CHANGE_SIGNAL_SQL，插件主类依赖 MoviePilot，不能直接导入
+    """
+    tree = ast.parse((PLUGINS / plugin / "__init__.py").read_text(encoding="utf-8"))
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and any(
+                isinstance(target, ast.Name) and target.id == "CHANGE_SIGNAL_SQL" for target in node.targets):
+            return ast.literal_eval(node.value)
+    raise LookupError(f"{plugin} 中没有 CHANGE_SIGNAL_SQL")
+
+
+class StatementRecorder:
+    """
+    记录插件打开的连接执行的语句（参数已展开），用于之后查询执行计划
+    只在单独的一轮中开启，跟踪回调会拖慢 executemany，不计入计时
+    """
+
+    def __init__(self):
+        self.statements = None
+        original = sqlite3.connect
+
+        def connect(*args, **kwargs):
+            conn = original(*args, **kwargs)
+            if self.statements is not None:
+                conn.set_trace_callback(self.statements.append)
+            return conn
+
+        sqlite3.connect = connect
+
+    @contextmanager
+    def capture(self):
+        self.statements = []
+        try:
+            yield self.statements
+        finally:
+            self.statements = None
+
+
+def normalize(sql: str) -> str:
+    """
+    去掉注释、字面量和多余空白，同一语句不同参数的多次执行归为一条
+    """
+    sql = re.sub(r"--[^\n]*", "", sql)
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+\b", "?", sql)
+    return " ".join(sql.split())
+
+
+def explain(db_path: str, statements: list) -> list:
+    """
+    对记录到的查询和写入语句执行 EXPLAIN QUERY PLAN，按计划树缩进输出
+    """
+    plans, seen = [], set()
+    conn = sqlite3.connect(db_path)
+    try:
+        for sql in statements:
+            key = normalize(sql)
+            # 只关心查询和写入语句，跳过开启读事务时对 sqlite_master 的读取
+            if key in seen or "sqlite_master" in key \
+                    or not re.match(r"(SELECT|WITH|INSERT|UPDATE|DELETE)\b", key, re.IGNORECASE):
+                continue
+            seen.add(key)
+            depth, lines = {0: -1}, []
+            for node_id, parent, _, detail in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+                depth[node_id] = depth.get(parent, -1) + 1
+                lines.append("  " * depth[node_id] + detail)
+            plans.append({"sql": key, "plan": lines})
+    finally:
+        conn.close()
+    return plans
+
+
+def copy_db(source: Path, work_dir: Path, name: str) -> str:
+    target = work_dir / name
+    for suffix in ("-wal", "-shm"):
+        Path(f"{target}{suffix}").unlink(missing_ok=True)
+    shutil.copyfile(source, target)
+    return str(target)
+
+
+def douban_movies(server: str, db_path: str, count: int, seed: int = 2) -> list:
+    """
+    从媒体库中随机取条目，构造反向同步时从豆瓣读到的看过列表
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    try:
+        if server == "fnos":
+            keys = [row[0] for row in conn.execute(
+                "SELECT DISTINCT imdb_id FROM item WHERE imdb_id IS NOT NULL AND imdb_id != ''")]
+        else:
+            keys = [row[0] for row in conn.execute(
+                "SELECT DISTINCT douban_id FROM zvideo_collection WHERE douban_id IS NOT NULL AND douban_id != 0")]
+    finally:
+        conn.close()
+    movies = []
+    for i, key in enumerate(rng.sample(keys, min(len(keys), count))):
+        # 约 10% 的条目不在媒体库中
+        missing = rng.random() < 0.1
+        movie = {"title": f"豆瓣条目 {i}", "status": "看过", "rating_date": "2025-06-01"}
+        if server == "fnos":
+            movie.update(douban_id=str(30_000_000 + i), imdb_id="tt99999999" if missing else key)
+        else:
+            movie.update(douban_id=str(99_999_999 if missing else key))
+        movies.append(movie)
+    return movies
+
+
+def reverse_write(adapter, movies: list) -> int:
+    """
+    与 SyncEngine.reverse 相同的写入方式：逐条匹配、规划，累计到适配器的批次大小后在一个事务中写入
+    """
+    target = adapter.open_target()
+    written = 0
+    try:
+        pending_items, pending_writes = 0, []
+        for movie in movies:
+            item = target.match(movie)
+            if not item:
+                continue
+            writes = target.plan(item)
+            if not writes:
+                continue
+            pending_items += 1
+            pending_writes.extend(writes)
+            if pending_items >= adapter.write_batch:
+                target.write(pending_writes)
+                written += len(pending_writes)
+                pending_items, pending_writes = 0, []
+        if pending_writes:
+            target.write(pending_writes)
+            written += len(pending_writes)
+    finally:
+        target.close()
+    return written
+
+
+def run_path(rounds: int, func, prepare=None) -> dict:
+    """
+    执行 rounds 次，prepare 的耗时不计入，返回中位数和最小耗时（毫秒）以及结果行数
+    """
+    timings, rows = [], None
+    for _ in range(rounds):
+        state = prepare() if prepare else None
+        started = time.perf_counter()
+        rows = func(state)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"ms_median": statistics.median(timings), "ms_min": min(timings), "rows": rows}
+
+
+def bench_server(server: str, size_name: str, args, recorder: StatementRecorder, work_dir: Path) -> list:
+    plugin, module_name, class_name = SERVERS[server]
+    adapter_class = getattr(load_module(plugin, module_name), class_name)
+    media_database = load_module(plugin, "MediaDatabase")
+    generate, churn = gen_media_db.GENERATORS[server]
+
+    # 生成（或复用）基准数据库
+    base = Path(args.data_dir) / (f"{server}-{size_name}-w{args.watched}-u{args.users}"
+                                  f"{'-idx' if args.indexes else ''}-s{args.seed}.db")
+    if not base.exists():
+        started = time.perf_counter()
+        counts = generate(str(base), gen_media_db.parse_size(size_name), watched=args.watched, users=args.users,
+                          indexes=args.indexes, seed=args.seed)
+        print(f"生成 {base.name}: {', '.join(f'{table} {count}' for table, count in counts.items())}，"
+              f"耗时 {time.perf_counter() - started:.1f}s")
+    # 在副本上模拟两次同步之间的活动
+    churned = copy_db(base, work_dir, f"{server}-churned.db")
+    churn(churned, ratio=args.churn)
+    movies = douban_movies(server, churned, REVERSE_MOVIES)
+    signal_sql = change_signal_sql(plugin)
+
+    def adapter_for(db_path):
+        return adapter_class(db_path, gen_media_db.BENCH_USER)
+
+    def scan(db_path, kind, since=None):
+        return lambda _: len(adapter_for(db_path).scan(kind, since)[1])
+
+    def signal(_):
+        with media_database.read_transaction(str(base)) as conn:
+            return len(conn.execute(signal_sql).fetchone())
+
+    def reverse_load(_):
+        adapter_for(churned).open_target().close()
+        return None
+
+    # 完整扫描得到的水位作为增量扫描的起点
+    watermarks = {kind: adapter_for(str(base)).scan(kind, None)[0] for kind in ("watching", "done")}
+    paths = [
+        ("signal", str(base), signal, None),
+        ("watching", str(base), scan(str(base), "watching"), None),
+        ("done", str(base), scan(str(base), "done"), None),
+        ("watching+incr", churned, scan(churned, "watching", watermarks["watching"]), None),
+        ("done+incr", churned, scan(churned, "done", watermarks["done"]), None),
+        ("reverse-load", churned, reverse_load, None),
+        ("reverse-write", str(work_dir / f"{server}-write.db"),
+         lambda db_path: reverse_write(adapter_for(db_path), movies),
+         lambda: copy_db(Path(churned), work_dir, f"{server}-write.db")),
+    ]
+
+    results = []
+    for name, db_path, func, prepare in paths:
+        result = {"server": server, "size": size_name, "path": name}
+        result.update(run_path(args.rounds, func, prepare))
+        # 单独执行一轮记录语句，再对同一数据库查询执行计划
+        state = prepare() if prepare else None
+        with recorder.capture() as statements:
+            func(state)
+        result["plans"] = explain(db_path, statements)
+        results.append(result)
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--server", nargs="+", choices=list(SERVERS), default=list(SERVERS))
+    arg_parser.add_argument("--size", nargs="+", default=["1k", "10k", "100k"],
+                            help="条目数：1k、10k、100k、1m 或具体数字，1m 的数据库约 1GB")
+    arg_parser.add_argument("-n", "--rounds", type=int, default=3, help="每个路径的执行次数")
+    arg_parser.add_argument("--watched", type=float, default=0.3, help="每个用户的观看比例")
+    arg_parser.add_argument("--users", type=int, default=3, help="用户数")
+    arg_parser.add_argument("--churn", type=float, default=0.01, help="两次同步之间变化的条目比例")
+    arg_parser.add_argument("--indexes", action="store_true", help="生成的数据库额外创建常见查询列上的索引")
+    arg_parser.add_argument("--seed", type=int, default=0, help="生成数据库的随机种子")
+    arg_parser.add_argument("--data-dir", default=str(ROOT / "data"), help="生成的数据库的缓存目录")
+    arg_parser.add_argument("--plans", action="store_true", help="输出每个路径的查询计划")
+    arg_parser.add_argument("--json", help="把结果和查询计划写入 JSON 文件")
+    arg_parser.add_argument("-v", "--verbose", action="store_true", help="输出插件日志")
+    args = arg_parser.parse_args()
+
+    install_app_shim(args.verbose)
+    recorder = StatementRecorder()
+    results = []
+    header = f"{'server':<8}{'size':>6}  {'path':<15}{'median ms':>12}{'min ms':>12}{'rows':>10}"
+    print(header)
+    print("-" * len(header))
+    # (server, path) -> 上一个规模的条目数和耗时，用于发现随规模超线性增长的路径
+    previous = {}
+    with tempfile.TemporaryDirectory(prefix="bench_sql_") as work_dir:
+        for server in args.server:
+            for size_name in sorted(args.size, key=gen_media_db.parse_size):
+                for result in bench_server(server, size_name, args, recorder, Path(work_dir)):
+                    results.append(result)
+                    rows = "" if result["rows"] is None else result["rows"]
+                    print(f"{server:<8}{size_name:>6}  {result['path']:<15}"
+                          f"{result['ms_median']:>12.2f}{result['ms_min']:>12.2f}{rows:>10}")
+                    count = gen_media_db.parse_size(size_name)
+                    last = previous.get((server, result["path"]))
+                    previous[(server, result["path"])] = (count, result["ms_median"])
+                    if last and last[0] < count and result["ms_median"] >= SUPERLINEAR_MIN_MS:
+                        growth = result["ms_median"] / max(last[1], 0.01)
+                        result["superlinear"] = growth > count / last[0] * SUPERLINEAR_FACTOR
+                        if result["superlinear"]:
+                            print(f"    ⚠️ 条目数增长 {count / last[0]:.0f} 倍，耗时增长 {growth:.0f} 倍，随规模超线性增长")
+                    if args.plans:
+                        for plan in result["plans"]:
+                            print(f"    {plan['sql'][:110]}")
+                            for line in plan["plan"]:
+                                print(f"        {line}")
+
+    if args.json:
+        report = {"params": {key: value for key, value in vars(args).items() if key not in ("json", "plans")},
+                  "sqlite": sqlite3.sqlite_version, "results": results}
+        Path(args.json).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+"""
+本地豆瓣替身服务器
+
+以 fixtures 目录下录制的页面为外壳，按请求参数生成搜索结果页、收藏列表页（grid / list）和条目详情页，
+并实现标记接口和首页返回 ck 的 Set-Cookie，用于端到端性能测试和容错测试。
+插件进程设置环境变量 DOUBAN_BASE_URL 指向本服务器后，www 与 movie 站点的请求都发到这里
+
+用法：
+    python benchmarks/douban_stub.py [--port 8800] [--latency 50] [--jitter 20] [--user bench]
+                                     [--burst-every 200 --burst-length 5 --burst-kind 403|captcha]
+                                     [--not-aired 0.02] [--missing 0.05]
+    DOUBAN_BASE_URL=http://127.0.0.1:8800 ...
+
+条目数据由ID推算，不需要预先录入：IMDb ID ttN 对应豆瓣ID 30000000+N，详情页再反推出 IMDb ID；
+--missing 比例的 IMDb ID 搜索不到结果，--not-aired 比例的条目标记时返回 {"r": false}（未开播）。
+首页只对带登录 cookie（dbcl2）的请求下发 ck，标记接口校验表单中的 ck。
+标记成功的条目进入 --user 用户的收藏列表，收藏列表按标记时间倒序分页，每页 15 条。
+--burst-every N 表示每 N 个正常请求后，接下来 --burst-length 个请求被限流：
+返回 403，或重定向到含“检测到有异常请求”的验证页。
+GET /__stats 返回各接口的请求数、状态码、注入的故障数和标记数
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import secrets
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from email.utils import formatdate
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlsplit
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+# 由 IMDb ID 推算的豆瓣ID从这里开始，与极影视生成器中的豆瓣ID（20000000 起）不重叠
+IMDB_BASE = 30_000_000
+# 收藏列表每页条目数
+PAGE_SIZE = 15
+# 页面中需要替换的片段，与 DoubanParser 中截取的片段一致：(起始标记, 结束标记)
+SEARCH_REGION = ('<div class="result-list"', '<div class="paginator"')
+COLLECTION_REGION = ('<div class="grid-view"', '<div class="paginator"')
+SUBJECT_REGION = ('<h1', '<div id="interest_sectl"')
+CAPTCHA_PAGE = "<html><head><title>禁止访问</title></head><body>检测到有异常请求从你的 IP 发出，请输入验证码</body></html>"
+COLLECTION_STATUSES = ("collect", "do", "wish")
+
+
+def endpoint_of(method: str, path: str) -> str:
+    """
+    请求对应的接口名称，与插件限速器的接口名一致，无法识别时为 other
+    """
+    if path == "/":
+        return "home"
+    if path.startswith("/search"):
+        return "search"
+    if method == "POST" and re.fullmatch(r"/j/subject/\d+/interest", path):
+        return "interest"
+    if re.fullmatch(r"/subject/\d+/?", path):
+        return "subject"
+    if re.fullmatch(r"/people/[^/]+/\w+/?", path):
+        return "collection"
+    return "other"
+
+
+def _fraction(key: str) -> float:
+    """
+    由 key 确定的 [0, 1) 内的数，同一条目每次请求得到相同的结果
+    """
+    return int(hashlib.md5(key.encode()).hexdigest()[:8], 16) / 2 ** 32
+
+
+def douban_id_for(imdb_id: str) -> Optional[int]:
+    match = re.fullmatch(r"tt(\d+)", imdb_id or "")
+    return IMDB_BASE + int(match.group(1)) if match else None
+
+
+def imdb_id_for(douban_id: int) -> str:
+    if douban_id >= IMDB_BASE:
+        return f"tt{douban_id - IMDB_BASE:07d}"
+    # 不是由 IMDb ID 推算的条目，给一个不会与媒体库重合的 IMDb ID
+    return f"tt{douban_id:08d}"
+
+
+def _split(html: str, region: Tuple[str, str]) -> Tuple[str, str, str]:
+    """
+    把录制的页面拆成 (片段之前, 片段, 片段之后)
+    """
+    start = html.index(region[0])
+    end = html.index(region[1], start)
+    return html[:start], html[start:end], html[end:]
+
+
+class DoubanStub:
+    """
+    替身服务器的状态：收藏列表、下发的 ck、故障注入计数和请求统计，由各请求线程共享
+    """
+
+    def __init__(self, user: str = "bench", latency: float = 0, jitter: float = 0,
+                 burst_every: int = 0, burst_length: int = 3, burst_kind: str = "403",
+                 not_aired: float = 0.0, missing: float = 0.0, seed: int = 0):
+        """
+        :param user: 登录用户，标记的条目进入该用户的收藏列表
+        :param latency: 每个请求的固定延迟（毫秒）
+        :param jitter: 在固定延迟之上增加的随机延迟上限（毫秒）
+        :param burst_every: 每多少个正常请求后出现一次限流，0 为不限流
+        :param burst_length: 每次连续被限流的请求数
+        :param burst_kind: 403 或 captcha（重定向到验证页）
+        :param not_aired: 标记时返回 {"r": false} 的条目比例
+        :param missing: 搜索不到的 IMDb ID 比例
+        """
+        self.user = user
+        self.latency = latency
+        self.jitter = jitter
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.burst_kind = burst_kind
+        self.not_aired = not_aired
+        self.missing = missing
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._served = 0
+        self._cks = set()
+        # 状态 -> {豆瓣ID: (标记序号, 标记日期, 标题)}，序号越大越新
+        self._collections: Dict[str, Dict[int, tuple]] = {status: {} for status in COLLECTION_STATUSES}
+        self._sequence = 0
+        self.stats = {"requests": Counter(), "status": Counter(), "faults": Counter(), "marked": Counter()}
+        self._pages = {
+            name: _split((FIXTURES / f"{name}.html").read_text(encoding="utf-8"), region)
+            for name, region in (("search", SEARCH_REGION), ("collection", COLLECTION_REGION),
+                                 ("subject", SUBJECT_REGION))
+        }
+
+    # ---------------------------
+    # 收藏列表
+    # ---------------------------
+
+    def seed_collection(self, status: str, entries: Iterable[Tuple[int, str]], start: date = None):
+        """
+        预置用户的收藏列表，entries 按标记时间从早到晚排列，标记日期从 start 起每条递增一天
+        """
+        day = start or date(2024, 1, 1)
+        with self._lock:
+            for douban_id, title in entries:
+                self._mark(status, int(douban_id), day.isoformat(), title)
+                day += timedelta(days=1)
+
+    def _mark(self, status: str, douban_id: int, marked_on: str, title: str = None):
+        for other in COLLECTION_STATUSES:
+            self._collections[other].pop(douban_id, None)
+        self._sequence += 1
+        self._collections[status][douban_id] = (self._sequence, marked_on, title or f"条目 {douban_id}")
+
+    def collection_page(self, status: str, start: int) -> list:
+        with self._lock:
+            entries = sorted(self._collections.get(status, {}).items(), key=lambda item: -item[1][0])
+        return [(douban_id, marked_on, title) for douban_id, (_, marked_on, title)
+                in entries[start:start + PAGE_SIZE]]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = {name: dict(counter) for name, counter in self.stats.items()}
+            stats["collections"] = {status: len(items) for status, items in self._collections.items()}
+        return stats
+
+    # ---------------------------
+    # 故障注入
+    # ---------------------------
+
+    def delay(self):
+        seconds = (self.latency + self._random.uniform(0, self.jitter)) / 1000
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def next_throttled(self) -> bool:
+        """
+        按请求顺序判断本次请求是否落在限流区间内
+        """
+        with self._lock:
+            position = self._served
+            self._served += 1
+        return bool(self.burst_every) and position % (self.burst_every + self.burst_length) >= self.burst_every
+
+    def count(self, category: str, key):
+        with self._lock:
+            self.stats[category][str(key)] += 1
+
+    # ---------------------------
+    # 页面
+    # ---------------------------
+
+    def search_html(self, base: str, query: str) -> str:
+        prefix, _, suffix = self._pages["search"]
+        douban_id = douban_id_for(query)
+        if douban_id is None:
+            # 按标题搜索时给出一个固定的条目
+            douban_id = 10_000_000 + int(_fraction(query) * 9_000_000)
+        results = ""
+        if douban_id and _fraction(f"missing:{query}") >= self.missing:
+            link = quote(f"{base}/subject/{douban_id}/", safe="")
+            title = escape(f"条目 {douban_id}")
+            results = f"""
+  <div class="result">
+    <div class="content">
+      <div class="title">
+        <h3><span>[电影]</span>&nbsp;<a href="{base}/link2/?url={link}&amp;query={quote(query)}&amp;cat_id=1002">{title}</a></h3>
+        <div class="rating-info">
+          <span class="rating_nums">7.5</span>
+          <span class="subject-cast">原名:{title} / 导演 / 演员 / {2000 + douban_id % 25}</span>
+        </div>
+      </div>
+    </div>
+  </div>"""
+        return f'{prefix}<div class="result-list">{results}\n        </div>\n        {suffix}'
+
+    def collection_html(self, base: str, status: str, start: int, mode: str) -> str:
+        prefix, _, suffix = self._pages["collection"]
+        items = []
+        for douban_id, marked_on, title in self.collection_page(status, start):
+            link = f"{base}/subject/{douban_id}/"
+            title = escape(title)
+            if mode == "list":
+                # 列表模式没有海报和 <em> 标题，解析时走 .info a 的分支
+                items.append(f"""
+    <div class="item">
+        <div class="info">
+            <a href="{link}">{title}</a>
+            <span class="date">{marked_on}</span>
+        </div>
+    </div>""")
+            else:
+                items.append(f"""
+    <div class="item comment-item" data-cid="{douban_id}">
+        <div class="pic"><a title="{title}" href="{link}" class="nbg"><img alt="{title}" src=""></a></div>
+        <div class="info">
+            <ul>
+                <li class="title"><a href="{link}"><em>{title}</em></a></li>
+                <li><span class="date">{marked_on}</span></li>
+            </ul>
+        </div>
+    </div>""")
+        view = "list-view" if mode == "list" else "grid-view"
+        return f'{prefix}<div class="{view}">{"".join(items)}\n                </div>\n                {suffix}'
+
+    def subject_html(self, douban_id: int) -> str:
+        prefix, _, suffix = self._pages["subject"]
+        title = escape(f"条目 {douban_id}")
+        episodes = '        <span class="pl">集数:</span> 12<br/>\n' if douban_id % 3 == 0 else ""
+        body = f"""<h1>
+        <span property="v:itemreviewed">{title}</span>
+        <span class="year">({2000 + douban_id % 25})</span>
+    </h1>
+    <div id="info">
+        <span class="pl">类型:</span> <span property="v:genre">剧情</span><br/>
+{episodes}        <span class="pl">IMDb:</span> {imdb_id_for(douban_id)}<br>
+    </div>
+"""
+        return prefix + body + suffix
+
+    def interest(self, douban_id: int, form: dict) -> Tuple[int, dict]:
+        with self._lock:
+            valid_ck = form.get("ck") in self._cks
+        if not valid_ck:
+            self.count("faults", "bad_ck")
+            return 400, {"r": 1, "msg": "ck 无效"}
+        if _fraction(f"not_aired:{douban_id}") < self.not_aired:
+            self.count("faults", "not_aired")
+            return 200, {"r": False}
+        status = form.get("interest", "do")
+        with self._lock:
+            self._mark(status, douban_id, date.today().isoformat())
+        self.count("marked", status)
+        return 200, {"r": 0}
+
+    def issue_ck(self) -> str:
+        ck = secrets.token_urlsafe(3)[:4]
+        with self._lock:
+            self._cks.add(ck)
+        return ck
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头和正文分两次写出，关闭 Nagle 算法避免保持连接时每个响应多等一个延迟确认（约 40ms）
+    disable_nagle_algorithm = True
+    stub: DoubanStub = None
+    quiet = True
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _send(self, status: int, body: str, content_type: str = "text/html; charset=utf-8", headers: dict = None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.stub.count("status", status)
+
+    def _handle(self, method: str):
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        form = {}
+        if method == "POST":
+            length = int(self.headers.get("Content-Length") or 0)
+            form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode("utf-8")).items()}
+        if url.path == "/__stats":
+            self._send(200, json.dumps(self.stub.snapshot(), ensure_ascii=False), "application/json")
+            return
+        if url.path == "/misc/sorry":
+            self._send(200, CAPTCHA_PAGE)
+            return
+
+        endpoint = endpoint_of(method, url.path)
+        self.stub.count("requests", endpoint)
+        self.stub.delay()
+        if self.stub.next_throttled():
+            self.stub.count("faults", f"throttled_{self.stub.burst_kind}")
+            if self.stub.burst_kind == "captcha":
+                self._send(302, "", headers={"Location": f"/misc/sorry?original-url={quote(self.path)}"})
+            else:
+                self._send(403, "<html><body>403 Forbidden</body></html>")
+            return
+
+        base = f"http://{self.headers.get('Host')}"
+        if endpoint == "home":
+            headers = {}
+            if "dbcl2=" in (self.headers.get("Cookie") or ""):
+                expires = formatdate(time.time() + 24 * 3600, usegmt=True)
+                headers["Set-Cookie"] = f"ck={self.stub.issue_ck()}; Path=/; Expires={expires}"
+            self._send(200, "<html><body>豆瓣</body></html>", headers=headers)
+        elif endpoint == "search":
+            self._send(200, self.stub.search_html(base, query.get("q", "")))
+        elif endpoint == "subject":
+            self._send(200, self.stub.subject_html(int(re.search(r"\d+", url.path).group(0))))
+        elif endpoint == "collection":
+            user, status = url.path.strip("/").split("/")[1:3]
+            if user != self.stub.user:
+                # 其它用户的收藏不公开，返回空列表
+                status = ""
+            self._send(200, self.stub.collection_html(base, status, int(query.get("start", 0)),
+                                                      query.get("mode", "grid")))
+        elif endpoint == "interest":
+            status, result = self.stub.interest(int(re.search(r"\d+", url.path).group(0)), form)
+            self._send(status, json.dumps(result, ensure_ascii=False), "application/json")
+        else:
+            self._send(404, "<html><body>404</body></html>")
+
+
+def serve(stub: DoubanStub, host: str = "127.0.0.1", port: int = 0, quiet: bool = True) -> ThreadingHTTPServer:
+    """
+    在后台线程中启动替身服务器，port 为 0 时自动选择端口，server.server_address 为实际地址
+    """
+    handler = type("Handler", (StubHandler,), {"stub": stub, "quiet": quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="douban-stub", daemon=True).start()
+    return server
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8800)
+    arg_parser.add_argument("--user", default="bench", help="登录用户，标记的条目进入该用户的收藏列表")
+    arg_parser.add_argument("--latency", type=float, default=0, help="每个请求的固定延迟（毫秒）")
+    arg_parser.add_argument("--jitter", type=float, default=0, help="随机延迟上限（毫秒）")
+    arg_parser.add_argument("--burst-every", type=int, default=0, help="每多少个正常请求后限流一次，0 为不限流")
+    arg_parser.add_argument("--burst-length", type=int, default=3, help="每次连续被限流的请求数")
+    arg_parser.add_argument("--burst-kind", choices=["403", "captcha"], default="403")
+    arg_parser.add_argument("--not-aired", type=float, default=0.0, help="标记时返回 {\"r\": false} 的条目比例")
+    arg_parser.add_argument("--missing", type=float, default=0.0, help="搜索不到的 IMDb ID 比例")
+    arg_parser.add_argument("-v", "--verbose", action="store_true", help="输出每个请求的访问日志")
+    args = arg_parser.parse_args()
+
+    stub = DoubanStub(user=args.user, latency=args.latency, jitter=args.jitter, burst_every=args.burst_every,
+                      burst_length=args.burst_length, burst_kind=args.burst_kind, not_aired=args.not_aired,
+                      missing=args.missing)
+    server = serve(stub, args.host, args.port, quiet=not args.verbose)
+    host, port = server.server_address[:2]
+    print(f"豆瓣替身服务器已启动: DOUBAN_BASE_URL=http://{host}:{port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,513 @@
+"""
+合成媒体库数据库生成器
+
+按飞牛影视（user / item / item_user_play）和极影视（zvideo_collection / zvideo_collection_tags /
+zvideo_playlist）的表结构生成 SQLite 数据库，用于测量插件 SQL 在不同规模下的耗时和查询计划。
+表中包含插件读写的全部列，以及简介、海报等占位列，使数据页数量接近真实的媒体库
+
+用法：
+    python benchmarks/gen_media_db.py fnos 100k fnos.db [--watched 0.3] [--users 3] [--indexes]
+    python benchmarks/gen_media_db.py zvideo 1m zvideo.db [--watched 0.3] [--playlist 0.05]
+    python benchmarks/gen_media_db.py churn fnos fnos.db [--ratio 0.01]
+
+规模为媒体条目数（飞牛影视 item 表 / 极影视 zvideo_collection 表的行数，可写 1k、10k、100k、1m 或具体数字），
+观看记录和标签按观看比例随之增长。第一个用户为同步的用户，其余用户的观看记录作为干扰数据。
+churn 模拟两次同步之间的用户活动：新的观看记录、已看状态变化和新入库的条目，用于测量增量扫描。
+--indexes 额外创建常见查询列上的索引，用于对比有无索引时的查询计划；
+生成结果只取决于参数和随机种子，相同参数生成的数据库完全一致
+"""
+import argparse
+import json
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# 规模名称 -> 媒体条目数
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+# 同步的用户，其余用户的观看记录作为干扰数据
+BENCH_USER = "alice"
+OTHER_USERS = ["bob", "carol", "dave", "erin", "frank", "grace", "heidi"]
+# 观看时间分布在 2024 年起的两年内
+BASE_TIME = datetime(2024, 1, 1, tzinfo=timezone(timedelta(hours=8)))
+TIME_SPAN = 2 * 365 * 24 * 3600
+# 每批写入的行数
+BATCH = 50_000
+# 简介等大字段的占位文本
+FILLER = ("这是一段用于占位的剧情简介，长度与媒体服务器刮削到的简介相近，"
+          "使数据库的页数和缓存命中情况接近真实的媒体库。") * 4
+
+FNOS_SCHEMA = """
+CREATE TABLE user (
+    guid TEXT PRIMARY KEY,
+    username TEXT NOT NULL
+);
+CREATE TABLE item (
+    guid TEXT PRIMARY KEY,
+    parent_guid TEXT,
+    type TEXT NOT NULL,
+    title TEXT,
+    original_title TEXT,
+    imdb_id TEXT,
+    tmdb_id INTEGER,
+    season_number INTEGER,
+    episode_number INTEGER,
+    overview TEXT,
+    poster TEXT,
+    air_date TEXT,
+    create_time INTEGER,
+    update_time INTEGER
+);
+CREATE TABLE item_user_play (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_guid TEXT NOT NULL,
+    user_guid TEXT NOT NULL,
+    ts INTEGER,
+    watched INTEGER,
+    media_guid TEXT,
+    video_guid TEXT,
+    audio_guid TEXT,
+    subtitle_guid TEXT,
+    direct_link_audio_index INTEGER,
+    resolution TEXT,
+    bitrate INTEGER,
+    type TEXT,
+    visible INTEGER,
+    create_time INTEGER,
+    update_time INTEGER
+);
+"""
+
+FNOS_INDEXES = [
+    "CREATE INDEX idx_item_imdb_id ON item (imdb_id)",
+    "CREATE INDEX idx_item_parent_guid ON item (parent_guid)",
+    "CREATE INDEX idx_play_user_item ON item_user_play (user_guid, item_guid)",
+    "CREATE INDEX idx_play_update_time ON item_user_play (update_time)",
+]
+
+ZVIDEO_SCHEMA = """
+CREATE TABLE zvideo_collection (
+    collection_id INTEGER PRIMARY KEY,
+    type INTEGER NOT NULL,
+    extend_type INTEGER,
+    douban_id INTEGER,
+    tmdb_id INTEGER,
+    title TEXT,
+    meta_info TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE TABLE zvideo_collection_tags (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_name TEXT,
+    collection_id INTEGER,
+    tag_id INTEGER,
+    tag_type INTEGER,
+    tag_name TEXT,
+    created_at TEXT
+);
+CREATE TABLE zvideo_playlist (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_name TEXT,
+    collection_id INTEGER,
+    file_id INTEGER,
+    position INTEGER,
+    duration INTEGER,
+    created_at TEXT,
+    updated_at TEXT
+);
+"""
+
+ZVIDEO_INDEXES = [
+    "CREATE INDEX idx_collection_douban_id ON zvideo_collection (douban_id)",
+    "CREATE INDEX idx_tags_name_created ON zvideo_collection_tags (tag_name, created_at)",
+    "CREATE INDEX idx_tags_user_type ON zvideo_collection_tags (user_name, tag_type)",
+    "CREATE INDEX idx_playlist_collection ON zvideo_playlist (collection_id)",
+]
+
+FNOS_ITEM_INSERT = "INSERT INTO item VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+FNOS_PLAY_INSERT = """
+    INSERT INTO item_user_play (
+        item_guid, user_guid, ts, watched, media_guid, video_guid, audio_guid, subtitle_guid,
+        direct_link_audio_index, resolution, bitrate, type, visible, create_time, update_time
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+ZVIDEO_COLLECTION_INSERT = "INSERT INTO zvideo_collection VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+ZVIDEO_TAG_INSERT = """
+    INSERT INTO zvideo_collection_tags (user_name, collection_id, tag_id, tag_type, tag_name, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+ZVIDEO_PLAYLIST_INSERT = """
+    INSERT INTO zvideo_playlist (user_name, collection_id, file_id, position, duration, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def parse_size(text: str) -> int:
+    text = text.lower()
+    return SIZES[text] if text in SIZES else int(text)
+
+
+def _create(path: str, schema: str) -> sqlite3.Connection:
+    path = Path(path)
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    # 媒体服务器的数据库使用 WAL 模式，生成时关闭同步加快写入
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.executescript(schema)
+    return conn
+
+
+def _finish(conn: sqlite3.Connection, indexes: list, tables: list) -> dict:
+    """
+    批量写入完成后再建索引，合并 WAL 后关闭，返回各表行数
+    """
+    conn.commit()
+    for sql in indexes:
+        conn.execute(sql)
+    conn.commit()
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in tables}
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    return counts
+
+
+def _guid(rng: random.Random) -> str:
+    return f"{rng.getrandbits(128):032x}"
+
+
+def _overview(rng: random.Random, length: int = 60) -> str:
+    start = rng.randrange(len(FILLER) - length)
+    return FILLER[start:start + length]
+
+
+def _imdb_id(rng: random.Random, serial: int):
+    # 少量条目没有刮削到 IMDb ID，为 NULL 或空字符串
+    r = rng.random()
+    if r < 0.02:
+        return None
+    if r < 0.04:
+        return ""
+    return f"tt{1_000_000 + serial:07d}"
+
+
+def _fnos_ms(offset: float) -> int:
+    return int((BASE_TIME.timestamp() + offset) * 1000)
+
+
+def _fnos_item(rng, guid, parent_guid, item_type, title, imdb_id, serial, season=None, episode=None) -> tuple:
+    created = _fnos_ms(rng.randrange(TIME_SPAN))
+    return (guid, parent_guid, item_type, title, title, imdb_id, 10_000 + serial, season, episode,
+            _overview(rng), f"/cache/poster/{guid[:2]}/{guid}.webp",
+            "2020-01-01", created, created)
+
+
+def _fnos_play(rng, item_guid, user_guid, item_type, watched, offset) -> tuple:
+    update_time = _fnos_ms(offset)
+    ts = 0 if watched else rng.randrange(60, 3600)
+    return (item_guid, user_guid, ts, watched, _guid(rng), _guid(rng), _guid(rng), "",
+            -1, "1080p", 8_000_000, item_type, 1, update_time, update_time)
+
+
+def generate_fnos(path: str, size: int, watched: float = 0.3, users: int = 3,
+                  indexes: bool = False, seed: int = 0) -> dict:
+    """
+    生成飞牛影视数据库：约 20% 为电影，其余为剧集（剧 -> 季 -> 集，季和集与剧共用 IMDb ID）
+    :param size: item 表的行数
+    :param watched: 每个用户看过一部电影或一部剧的比例，剧集中一半看完、一半看到中途
+    """
+    rng = random.Random(seed)
+    conn = _create(path, FNOS_SCHEMA)
+    user_guids = [_guid(rng) for _ in range(users)]
+    conn.executemany("INSERT INTO user (guid, username) VALUES (?, ?)",
+                     zip(user_guids, [BENCH_USER] + OTHER_USERS[:users - 1]))
+
+    items, plays = [], []
+    count = serial = 0
+    while count < size:
+        serial += 1
+        imdb_id = _imdb_id(rng, serial)
+        if rng.random() < 0.2 or size - count < 3:
+            # 少量电影有多个版本，同一 IMDb ID 对应多个条目
+            versions = 2 if rng.random() < 0.02 and size - count >= 2 else 1
+            for _ in range(versions):
+                guid = _guid(rng)
+                items.append(_fnos_item(rng, guid, None, "Movie", f"电影 {serial}", imdb_id, serial))
+                count += 1
+                for user_guid in user_guids:
+                    r = rng.random()
+                    if r < watched:
+                        plays.append(_fnos_play(rng, guid, user_guid, "Movie", 1, rng.randrange(TIME_SPAN)))
+                    elif r < watched + 0.05:
+                        plays.append(_fnos_play(rng, guid, user_guid, "Movie", 0, rng.randrange(TIME_SPAN)))
+        else:
+            tv_guid = _guid(rng)
+            items.append(_fnos_item(rng, tv_guid, None, "TV", f"剧集 {serial}", imdb_id, serial))
+            count += 1
+            seasons = []
+            for season in range(1, rng.randint(1, 4) + 1):
+                if count >= size:
+                    break
+                season_guid = _guid(rng)
+                items.append(_fnos_item(rng, season_guid, tv_guid, "Season", f"第 {season} 季",
+                                        imdb_id, serial, season))
+                count += 1
+                episodes = []
+                for episode in range(1, rng.randint(6, 24) + 1):
+                    if count >= size:
+                        break
+                    episode_guid = _guid(rng)
+                    items.append(_fnos_item(rng, episode_guid, season_guid, "Episode", f"第 {episode} 集",
+                                            imdb_id, serial, season, episode))
+                    count += 1
+                    episodes.append(episode_guid)
+                seasons.append((season_guid, episodes))
+            all_episodes = [guid for _, episodes in seasons for guid in episodes]
+            for user_guid in user_guids:
+                r = rng.random()
+                if r >= watched or not all_episodes:
+                    continue
+                offset = rng.randrange(TIME_SPAN - 90 * 24 * 3600)
+                if r < watched / 2:
+                    # 看完整部剧：每一集、每一季和剧本身都有已看记录
+                    for guid in all_episodes:
+                        offset += rng.randrange(600, 3 * 24 * 3600)
+                        plays.append(_fnos_play(rng, guid, user_guid, "Episode", 1, offset))
+                    for season_guid, _ in seasons:
+                        plays.append(_fnos_play(rng, season_guid, user_guid, "Season", 1, offset))
+                    plays.append(_fnos_play(rng, tv_guid, user_guid, "TV", 1, offset))
+                else:
+                    # 看到中途：前面若干集已看，下一集看了一部分
+                    seen = rng.randrange(1, len(all_episodes) + 1)
+                    for guid in all_episodes[:seen]:
+                        offset += rng.randrange(600, 3 * 24 * 3600)
+                        plays.append(_fnos_play(rng, guid, user_guid, "Episode", 1, offset))
+                    if seen < len(all_episodes):
+                        plays.append(_fnos_play(rng, all_episodes[seen], user_guid, "Episode", 0, offset + 600))
+        if len(items) >= BATCH:
+            conn.executemany(FNOS_ITEM_INSERT, items)
+            conn.executemany(FNOS_PLAY_INSERT, plays)
+            items, plays = [], []
+    conn.executemany(FNOS_ITEM_INSERT, items)
+    conn.executemany(FNOS_PLAY_INSERT, plays)
+    return _finish(conn, FNOS_INDEXES if indexes else [], ["user", "item", "item_user_play"])
+
+
+def churn_fnos(path: str, ratio: float = 0.01, seed: int = 1) -> dict:
+    """
+    模拟两次同步之间的活动，变化数为条目数 * ratio：
+    60% 为同步用户新看过的电影和单集，20% 为看到一半的记录变为已看，10% 为其他用户的观看记录，10% 为新入库的电影
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    users = conn.execute("SELECT guid, username FROM user").fetchall()
+    user_guid = next(guid for guid, username in users if username == BENCH_USER)
+    others = [guid for guid, username in users if username != BENCH_USER] or [user_guid]
+    played = {row[0] for row in conn.execute(
+        "SELECT item_guid FROM item_user_play WHERE user_guid = ?", (user_guid,))}
+    candidates = [(guid, item_type) for guid, item_type in conn.execute(
+        "SELECT guid, type FROM item WHERE type IN ('Movie', 'Episode')") if guid not in played]
+    unfinished = [row[0] for row in conn.execute(
+        "SELECT id FROM item_user_play WHERE user_guid = ? AND watched = 0", (user_guid,))]
+    size = conn.execute("SELECT COUNT(*) FROM item").fetchone()[0]
+    changes = max(10, int(size * ratio))
+    # 新的记录都晚于已有的最大更新时间
+    now = (conn.execute("SELECT MAX(update_time) FROM item_user_play").fetchone()[0] or _fnos_ms(0)) / 1000 \
+        - BASE_TIME.timestamp()
+
+    def later():
+        nonlocal now
+        now += rng.randrange(1, 600)
+        return now
+
+    # 新看过的电影和单集各占一半，库中单集远多于电影，按条目随机抽取时几乎不会有电影
+    new_plays = []
+    for item_type in ("Movie", "Episode"):
+        pool = [guid for guid, candidate_type in candidates if candidate_type == item_type]
+        new_plays += [_fnos_play(rng, guid, user_guid, item_type, 1, later())
+                      for guid in rng.sample(pool, min(len(pool), changes * 3 // 10))]
+    finished = [(_fnos_ms(later()), play_id)
+                for play_id in rng.sample(unfinished, min(len(unfinished), changes * 2 // 10))]
+    new_plays += [_fnos_play(rng, guid, rng.choice(others), item_type, 1, later())
+                  for guid, item_type in rng.sample(candidates, min(len(candidates), changes // 10))]
+    serial = size * 10
+    new_items = [_fnos_item(rng, _guid(rng), None, "Movie", f"新电影 {serial + i}",
+                            _imdb_id(rng, serial + i), serial + i) for i in range(changes // 10)]
+    with conn:
+        conn.executemany(FNOS_PLAY_INSERT, new_plays)
+        conn.executemany("UPDATE item_user_play SET watched = 1, update_time = ? WHERE id = ?", finished)
+        conn.executemany(FNOS_ITEM_INSERT, new_items)
+    conn.close()
+    return {"new_plays": len(new_plays), "finished": len(finished), "new_items": len(new_items)}
+
+
+def _zvideo_time(offset: float) -> str:
+    return (BASE_TIME + timedelta(seconds=offset)).strftime("%Y-%m-%d %H:%M:%S") + ".000000000+08:00"
+
+
+def _zvideo_meta(rng, title: str, douban_id, collection_id: int) -> str:
+    r = rng.random()
+    # 少量 meta_info 损坏，不是合法 JSON
+    if r < 0.001:
+        return '{"title": "' + title
+    meta = {
+        "title": title,
+        "original_title": title,
+        "year": 1990 + collection_id % 35,
+        "plot": _overview(rng, 120),
+        "genres": ["剧情", "动作"],
+        "actors": [{"name": f"演员 {rng.randrange(100_000)}", "role": "主演"} for _ in range(3)],
+        "relation": {"tmdb": {"tmdb_id": 10_000 + collection_id}},
+    }
+    if douban_id is not None:
+        meta["relation"]["douban"] = {"douban_id": douban_id}
+    return json.dumps(meta, ensure_ascii=False)
+
+
+def _zvideo_collection(rng, collection_id: int, title: str = None) -> tuple:
+    is_tv = rng.random() < 0.3
+    title = title or f"{'剧集' if is_tv else '电影'} {collection_id}"
+    r = rng.random()
+    # 少量条目没有豆瓣ID，或豆瓣ID为 0；另有少量条目与前一个条目共用豆瓣ID（同一影片的多个版本）
+    if r < 0.03:
+        douban_id = None
+    elif r < 0.04:
+        douban_id = 0
+    elif r < 0.06 and collection_id > 1:
+        douban_id = 20_000_000 + collection_id - 1
+    else:
+        douban_id = 20_000_000 + collection_id
+    created = _zvideo_time(rng.randrange(TIME_SPAN))
+    return (collection_id, 200 if is_tv else 100, 7 if rng.random() < 0.02 else 1, douban_id,
+            10_000 + collection_id, title, _zvideo_meta(rng, title, douban_id, collection_id), created, created)
+
+
+def generate_zvideo(path: str, size: int, watched: float = 0.3, playlist: float = 0.05, users: int = 3,
+                    indexes: bool = False, seed: int = 0) -> dict:
+    """
+    生成极影视数据库：约 30% 为剧集，meta_info 中记录标题和豆瓣ID
+    :param size: zvideo_collection 表的行数
+    :param watched: 每个用户标记“是否看过”的条目比例，另有 5% 的条目带其他标签
+    :param playlist: 每个用户播放列表中的剧集比例
+    """
+    rng = random.Random(seed)
+    conn = _create(path, ZVIDEO_SCHEMA)
+    user_names = [BENCH_USER] + OTHER_USERS[:users - 1]
+    collections, tags, playlists = [], [], []
+    for collection_id in range(1, size + 1):
+        row = _zvideo_collection(rng, collection_id)
+        collections.append(row)
+        for user_name in user_names:
+            r = rng.random()
+            if r < watched:
+                tags.append((user_name, collection_id, 1, 9, "是否看过", _zvideo_time(rng.randrange(TIME_SPAN))))
+            elif r < watched + 0.05:
+                tags.append((user_name, collection_id, 2, 1, "收藏", _zvideo_time(rng.randrange(TIME_SPAN))))
+            if row[1] == 200 and rng.random() < playlist:
+                for file_id in range(rng.randint(1, 3)):
+                    created = _zvideo_time(rng.randrange(TIME_SPAN))
+                    playlists.append((user_name, collection_id, collection_id * 100 + file_id,
+                                      rng.randrange(2400), 2400, created, created))
+        if len(collections) >= BATCH:
+            conn.executemany(ZVIDEO_COLLECTION_INSERT, collections)
+            conn.executemany(ZVIDEO_TAG_INSERT, tags)
+            conn.executemany(ZVIDEO_PLAYLIST_INSERT, playlists)
+            collections, tags, playlists = [], [], []
+    conn.executemany(ZVIDEO_COLLECTION_INSERT, collections)
+    conn.executemany(ZVIDEO_TAG_INSERT, tags)
+    conn.executemany(ZVIDEO_PLAYLIST_INSERT, playlists)
+    return _finish(conn, ZVIDEO_INDEXES if indexes else [],
+                   ["zvideo_collection", "zvideo_collection_tags", "zvideo_playlist"])
+
+
+def churn_zvideo(path: str, ratio: float = 0.01, seed: int = 1) -> dict:
+    """
+    模拟两次同步之间的活动，变化数为条目数 * ratio：
+    50% 为同步用户新标记的“是否看过”，30% 为同步用户播放列表中新增的剧集，10% 为其他用户的标签，10% 为新入库的条目
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    tagged = {row[0] for row in conn.execute(
+        "SELECT collection_id FROM zvideo_collection_tags WHERE user_name = ? AND tag_type = 9", (BENCH_USER,))}
+    collections = [(collection_id, collection_type) for collection_id, collection_type in conn.execute(
+        "SELECT collection_id, type FROM zvideo_collection")]
+    untagged = [collection_id for collection_id, _ in collections if collection_id not in tagged]
+    shows = [collection_id for collection_id, collection_type in collections if collection_type == 200]
+    others = [row[0] for row in conn.execute(
+        "SELECT DISTINCT user_name FROM zvideo_collection_tags WHERE user_name != ?", (BENCH_USER,))] or [BENCH_USER]
+    size = len(collections)
+    changes = max(10, int(size * ratio))
+    # 新的记录都晚于已有的最大创建时间
+    latest = conn.execute("SELECT MAX(created_at) FROM zvideo_collection_tags").fetchone()[0]
+    now = (datetime.strptime(latest[:19], "%Y-%m-%d %H:%M:%S").replace(tzinfo=BASE_TIME.tzinfo) - BASE_TIME) \
+        .total_seconds() if latest else 0
+
+    def later():
+        nonlocal now
+        now += rng.randrange(1, 600)
+        return _zvideo_time(now)
+
+    tags = [(BENCH_USER, collection_id, 1, 9, "是否看过", later())
+            for collection_id in rng.sample(untagged, min(len(untagged), changes // 2))]
+    tags += [(rng.choice(others), collection_id, 1, 9, "是否看过", later())
+             for collection_id in rng.sample(untagged, min(len(untagged), changes // 10))]
+    playlists = []
+    for collection_id in rng.sample(shows, min(len(shows), changes * 3 // 10)):
+        created = later()
+        playlists.append((BENCH_USER, collection_id, collection_id * 100, rng.randrange(2400), 2400,
+                          created, created))
+    max_id = max((collection_id for collection_id, _ in collections), default=0)
+    new_collections = [_zvideo_collection(rng, max_id + i + 1) for i in range(changes // 10)]
+    with conn:
+        conn.executemany(ZVIDEO_TAG_INSERT, tags)
+        conn.executemany(ZVIDEO_PLAYLIST_INSERT, playlists)
+        conn.executemany(ZVIDEO_COLLECTION_INSERT, new_collections)
+    conn.close()
+    return {"new_tags": len(tags), "new_playlist": len(playlists), "new_collections": len(new_collections)}
+
+
+# 媒体服务器 -> (生成, 模拟变化)
+GENERATORS = {
+    "fnos": (generate_fnos, churn_fnos),
+    "zvideo": (generate_zvideo, churn_zvideo),
+}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    for server in GENERATORS:
+        command = commands.add_parser(server, help=f"生成{'飞牛影视' if server == 'fnos' else '极影视'}数据库")
+        command.add_argument("size", help="条目数：1k、10k、100k、1m 或具体数字")
+        command.add_argument("path", help="输出的数据库文件，已存在时覆盖")
+        command.add_argument("--watched", type=float, default=0.3, help="每个用户的观看比例")
+        command.add_argument("--users", type=int, default=3, help=f"用户数，第一个用户为 {BENCH_USER}")
+        command.add_argument("--indexes", action="store_true", help="额外创建常见查询列上的索引")
+        command.add_argument("--seed", type=int, default=0, help="随机种子")
+        if server == "zvideo":
+            command.add_argument("--playlist", type=float, default=0.05, help="每个用户播放列表中的剧集比例")
+    command = commands.add_parser("churn", help="在已有数据库上模拟两次同步之间的活动")
+    command.add_argument("server", choices=list(GENERATORS))
+    command.add_argument("path")
+    command.add_argument("--ratio", type=float, default=0.01, help="变化数占条目数的比例")
+    command.add_argument("--seed", type=int, default=1, help="随机种子")
+    args = arg_parser.parse_args()
+
+    started = time.perf_counter()
+    if args.command == "churn":
+        result = GENERATORS[args.server][1](args.path, ratio=args.ratio, seed=args.seed)
+    else:
+        options = {"watched": args.watched, "users": args.users, "indexes": args.indexes, "seed": args.seed}
+        if args.command == "zvideo":
+            options["playlist"] = args.playlist
+        result = GENERATORS[args.command][0](args.path, parse_size(args.size), **options)
+    print(", ".join(f"{name} {value}" for name, value in result.items())
+          + f"，耗时 {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import asyncio
+import queue
+import threading
+from typing import Callable, Iterator, Optional
+
+import httpx
+
+from app.log import logger
+from app.plugins.trimmediahelper.DoubanClient import DoubanThrottledError
+from app.plugins.trimmediahelper.DoubanHelper import CollectionCrawl, DoubanHelper
+
+
+class AsyncDoubanHelper:
+    """
+    基于 httpx.AsyncClient 抓取收藏列表，列表翻页与条目详情并发获取，仅用于反向同步
+    与同步的 DoubanHelper 共用 cookie、缓存与限速器，同时进行中的请求数受 concurrency 限制
+    正向同步的搜索和标记请求不经过本类，由 SyncEngine 的流水线线程调用 DoubanHelper 并发完成，同样受限速器控制
+    """
+
+    # 默认并发请求数
+    CONCURRENCY = 3
+    # 流式抓取时待处理结果的队列长度，队列满时暂停抓取
+    STREAM_QUEUE_SIZE = 50
+    # 流式抓取结束标记
+    _DONE = object()
+
+    def __init__(self, helper: DoubanHelper, concurrency: int = CONCURRENCY,
+                 should_stop: Callable[[], bool] = None):
+        """
+        :param helper: 已初始化的同步 DoubanHelper
+        :param concurrency: 同时进行中的请求数上限
+        :param should_stop: 返回 True 时不再发起新的请求
+        """
+        self.helper = helper
+        self.concurrency = max(1, int(concurrency or self.CONCURRENCY))
+        self.should_stop = should_stop or (lambda: False)
+        self._cancelled = threading.Event()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _stopped(self) -> bool:
+        return self._cancelled.is_set() or self.should_stop()
+
+    async def __aenter__(self):
+        cookies = httpx.Cookies()
+        for cookie in self.helper.session.cookies:
+            cookies.set(cookie.name, cookie.value, domain=cookie.domain)
+        self._client = httpx.AsyncClient(
+            headers=dict(self.helper.session.headers),
+            cookies=cookies,
+            timeout=self.helper.TIMEOUT,
+            limits=httpx.Limits(max_connections=self.concurrency,
+                                max_keepalive_connections=self.concurrency),
+            transport=httpx.AsyncHTTPTransport(retries=3),
+            follow_redirects=True,
+        )
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._client.aclose()
+        self._client = None
+        self._semaphore = None
+
+    async def _request(self, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        同 DoubanHelper._request，限速器等待期间不阻塞其它请求，重试后仍被限流时抛出 DoubanThrottledError
+        """
+        async with self._semaphore:
+            for attempt in range(self.helper.MAX_THROTTLE_RETRIES + 1):
+                await self.helper.limiter.acquire_async(endpoint)
+                response = await self._client.request(method, url, **kwargs)
+                if not self.helper._is_throttled(response):
+                    self.helper.limiter.on_success(endpoint)
+                    return response
+                logger.warning(f"豆瓣请求被限流 状态码：{response.status_code} {url}（第 {attempt + 1} 次）")
+                self.helper.limiter.on_throttled(endpoint)
+            raise DoubanThrottledError(f"豆瓣请求被限流 状态码：{response.status_code} {url}", response=response)
+
+    async def get_subject(self, url: str) -> Optional[dict]:
+        """
+        同 DoubanHelper.get_subject，请求失败或被限流时抛出异常
+        """
+        if self._stopped():
+            return None
+        response = await self._request("subject", "GET", url)
+        if response.status_code == 404:
+            logger.warning(f"豆瓣条目不存在 {url}")
+            return None
+        response.raise_for_status()
+        subject = self.helper.parse_subject(url, response.text)
+        self.helper._cache_subject(url, subject)
+        return subject
+
+    async def get_imdb_id(self, url: str) -> Optional[str]:
+        """
+        优先查询本地条目缓存，未缓存时才请求详情页
+        """
+        subject = self.helper.cached_subject(self.helper.extract_douban_id(url))
+        if subject is None:
+            subject = await self.get_subject(url)
+        return subject.get('imdb_id') if subject else None
+
+    async def _emit(self, out: queue.Queue, record):
+        """
+        向结果队列放入一条记录，队列满时让出事件循环等待消费
+        """
+        while not self._cancelled.is_set():
+            try:
+                out.put_nowait(record)
+                return
+            except queue.Full:
+                await asyncio.sleep(0.05)
+
+    async def produce_user_movies(self, username: str, status: str, watermark: dict, out: queue.Queue,
+                                  crawl: CollectionCrawl):
+        """
+        抓取收藏列表并将结果逐条放入 out
+        列表翻页与条目详情获取流水线进行：翻页协程将条目放入有界队列，
+        concurrency 个协程并发获取详情，抓取到水位处即停止
+        :param crawl: 记录本次抓取是否完整和最新条目，请求失败或中断时 complete 为 False
+        """
+        status_name = self.helper.STATUS_MAP.get(status, status)
+        logger.info(f"开始获取用户 {username} 的 {status_name} 列表...")
+        crawl.complete = False
+        pending: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        count = 0
+
+        async def crawl_pages():
+            start = 0
+            try:
+                while not self._stopped():
+                    url = self.helper.collection_url(username, status)
+                    try:
+                        resp = await self._request("collection", "GET", url,
+                                                   params=self.helper.collection_params(start))
+                        resp.raise_for_status()
+                    except Exception as e:
+                        logger.error(f"请求列表失败 {url}: {e}")
+                        return
+
+                    items = self.helper.parse_movies(resp.text, status)
+                    if not items:
+                        crawl.complete = True
+                        return
+
+                    logger.info(f"第 {start // 15 + 1} 页，获取到 {len(items)} 条")
+                    items, reached = self.helper.cut_at_watermark(items, watermark)
+                    if items and crawl.newest is None:
+                        crawl.newest = self.helper._movie_record(items[0])
+                    for item in items:
+                        await pending.put(item)
+                    if reached:
+                        crawl.complete = True
+                        return
+                    start += 15
+            finally:
+                for _ in range(self.concurrency):
+                    await pending.put(None)
+
+        async def fetch_details():
+            nonlocal count
+            while (item := await pending.get()) is not None:
+                # 中断后仅取空队列，让翻页协程结束
+                if self._stopped():
+                    continue
+                count += 1
+                try:
+                    imdb_id = await self.get_imdb_id(item['link'])
+                except Exception as e:
+                    logger.warning(f"获取条目详情失败 {item['link']}: {e}")
+                    await self._emit(out, self.helper._movie_record(item, error=str(e)))
+                    continue
+                await self._emit(out, self.helper._movie_record(item, imdb_id))
+
+        await asyncio.gather(crawl_pages(), *(fetch_details() for _ in range(self.concurrency)))
+        logger.info(f"{status_name} 共获取 {count} 条")
+
+    # ---------------------------
+    # 同步调用入口
+    # ---------------------------
+
+    def _offer(self, out: queue.Queue, record):
+        while not self._cancelled.is_set():
+            try:
+                out.put(record, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def stream_user_movies(self, username: str, status: str = "collect", watermark: dict = None,
+                           maxsize: int = STREAM_QUEUE_SIZE, crawl: CollectionCrawl = None) -> Iterator[dict]:
+        """
+        在后台线程中抓取收藏列表，每获取到一条即产出，条目顺序不保证与列表一致
+        结果队列有界，消费变慢时抓取随之暂停；提前关闭生成器会停止抓取
+        :param crawl: 抓取结束后 crawl.complete 和 crawl.newest 可用于判断是否推进水位
+        """
+        crawl = crawl if crawl is not None else CollectionCrawl()
+        out = queue.Queue(maxsize=maxsize)
+        self._cancelled.clear()
+        # 后台线程中运行的抓取任务，提前关闭时取消，限速器冷却等待中的协程也能立即结束
+        running = []
+
+        async def runner():
+            running.append((asyncio.get_running_loop(), asyncio.current_task()))
+            if self._cancelled.is_set():
+                return
+            async with self:
+                await self.produce_user_movies(username, status, watermark, out, crawl)
+
+        def produce():
+            try:
+                asyncio.run(runner())
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                self._offer(out, e)
+            finally:
+                self._offer(out, self._DONE)
+
+        thread = threading.Thread(target=produce, name="douban-user-movies", daemon=True)
+        thread.start()
+        try:
+            while (record := out.get()) is not self._DONE:
+                if isinstance(record, Exception):
+                    raise record
+                yield record
+        finally:
+            self._cancelled.set()
+            if running and thread.is_alive():
+                loop, task = running[0]
+                try:
+                    loop.call_soon_threadsafe(task.cancel)
+                except RuntimeError:
+                    # 抓取恰好结束，事件循环已关闭
+                    pass
+            # 取消后线程应很快结束，线程为守护线程，超时后不再等待
+            thread.join(self.helper.TIMEOUT)
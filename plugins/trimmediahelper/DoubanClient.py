@@ -0,0 +1,352 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+import types
+from http.cookies import SimpleCookie
+from typing import Callable, Dict, Hashable, Iterable, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.helper.cookiecloud import CookieCloudHelper
+from app.plugins.trimmediahelper.RateLimiter import RateLimiter
+from app.log import logger
+
+# 进程内共享状态所在的模块名
+# 每个插件各带一份本文件，通过 sys.modules 找到同一份共享状态；共享对象的接口变化时修改版本号，避免新旧插件混用
+REGISTRY_MODULE = "_douban_client_registry_v2"
+# 豆瓣站点地址。设置环境变量 DOUBAN_BASE_URL 后 www 与 movie 站点都指向该地址，
+# 用于对接本地的豆瓣替身服务器（benchmarks/douban_stub.py）做性能和容错测试
+BASE_URL = os.environ.get("DOUBAN_BASE_URL", "").rstrip("/")
+WWW_URL = BASE_URL or "https://www.douban.com"
+MOVIE_URL = BASE_URL or "https://movie.douban.com"
+# 登录 cookie 和 ck 所属的域
+COOKIE_DOMAIN = urlparse(BASE_URL).hostname if BASE_URL else ".douban.com"
+# 共享连接池中保持的连接数量
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 4
+
+
+def _build_adapter() -> HTTPAdapter:
+    """
+    带传输层重试的连接池，所有账号的会话共用，cookie 仍由各会话的 cookie jar 管理
+    """
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=2,
+        backoff_factor=1,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=["GET", "HEAD"],
+        raise_on_status=False,
+    )
+    return HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        pool_block=True,
+        max_retries=retry,
+    )
+
+
+class DoubanThrottledError(requests.RequestException):
+    """
+    重试后仍被限流（403/429/验证页），响应不是真实页面，调用方不能据此判断条目不存在或列表已抓取完
+    """
+
+
+def _registry() -> types.ModuleType:
+    """
+    进程内唯一的共享状态：账号表、全局限速器、连接池、豆瓣数据缓存
+    """
+    registry = sys.modules.get(REGISTRY_MODULE)
+    if registry is None:
+        registry = types.ModuleType(REGISTRY_MODULE)
+        registry.lock = threading.Lock()
+        registry.accounts = {}
+        # 所有账号从同一出口 IP 访问豆瓣，共用一份限速额度
+        registry.limiter = RateLimiter()
+        registry.adapter = _build_adapter()
+        registry.cache = None
+        # 共享账号抛出的异常类也需共用，任一插件的代码都能捕获
+        registry.throttled_error = DoubanThrottledError
+        # setdefault 是原子操作，多个插件同时创建时只有一份生效
+        registry = sys.modules.setdefault(REGISTRY_MODULE, registry)
+    return registry
+
+
+# 使用共享状态中的异常类，而不是本文件定义的那份
+DoubanThrottledError = _registry().throttled_error
+
+
+def account_key(user_cookie: str = None) -> str:
+    """
+    账号标识：配置了 cookie 时为登录 cookie 的指纹，否则使用 CookieCloud 同步的 cookie
+    """
+    if not user_cookie:
+        return "cookiecloud"
+    cookies = {k: v.value for k, v in SimpleCookie(user_cookie).items() if k not in ("ck", "__utmz")}
+    cookie_str = ";".join(f"{k}={v}" for k, v in sorted(cookies.items()))
+    return hashlib.md5(cookie_str.encode()).hexdigest()
+
+
+def get_account(user_cookie: str = None, ck_state: dict = None) -> "DoubanAccount":
+    """
+    获取账号的共享客户端，同一账号在进程内只创建一次
+    :param ck_state: 调用方保存的 ck 状态，账号尚无有效 ck 时采用
+    """
+    registry = _registry()
+    key = account_key(user_cookie)
+    with registry.lock:
+        account = registry.accounts.get(key)
+        if account is None:
+            account = DoubanAccount(key, user_cookie, registry.limiter, registry.adapter)
+            registry.accounts[key] = account
+    account.offer_ck_state(ck_state)
+    return account
+
+
+def shared_cache(cache=None):
+    """
+    豆瓣数据缓存（IMDb ID -> 豆瓣ID、条目信息）与账号无关，进程内共用第一个提供的缓存
+    :param cache: 调用方自己的缓存，尚无共享缓存时登记为共享缓存
+    """
+    registry = _registry()
+    with registry.lock:
+        if registry.cache is None and cache is not None:
+            registry.cache = cache
+        return registry.cache
+
+
+class DoubanAccount:
+    """
+    一个豆瓣账号的会话、cookie 与 ck，进程内所有插件共用
+    请求经全局限速器发出，各插件的请求合计受同一额度约束，同一时刻运行的多个同步任务不会叠加请求频率
+    另外缓存最近抓取的收藏列表，一个插件刚抓取过的列表其它插件可直接使用
+    """
+
+    # ck 默认有效期（秒），豆瓣返回的 Set-Cookie 带过期时间时以其为准
+    CK_TTL = 12 * 3600
+    # 获取 ck 失败后多久再重试（秒）
+    CK_RETRY_INTERVAL = 300
+    # CookieCloud 的 cookie 多久重新下载一次（秒）
+    COOKIECLOUD_TTL = 6 * 3600
+    # 收藏列表缓存的有效期（秒）
+    COLLECTION_TTL = 10 * 60
+    # 请求超时时间（秒）
+    TIMEOUT = 10
+    # 被限流后同一请求最多重试次数
+    MAX_THROTTLE_RETRIES = 2
+    # 豆瓣反爬验证页面特征
+    CAPTCHA_MARKERS = ("sec.douban.com", "检测到有异常请求")
+    HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36 Edg/113.0.1774.57',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Encoding': 'gzip, deflate, sdch',
+        'Accept-Language': 'zh-CN,zh;q=0.8,en-US;q=0.6,en;q=0.4,en-GB;q=0.2,zh-TW;q=0.2',
+        'Connection': 'keep-alive',
+        'DNT': '1',
+    }
+
+    def __init__(self, key: str, user_cookie: Optional[str], limiter: RateLimiter, adapter: HTTPAdapter):
+        """
+        构造时不发起任何网络请求，cookie 与 ck 在第一次请求豆瓣时才获取
+        """
+        self.key = key
+        self.limiter = limiter
+        self.headers = dict(self.HEADERS)
+        self.cookies = {}
+        self._user_cookie = user_cookie
+        self._adapter = adapter
+        self._ck_state: dict = {}
+        # 重新获取 ck 后的回调，用于各插件持久化 ck 状态：owner -> callback
+        self._ck_listeners: Dict[Hashable, Callable[[dict], None]] = {}
+        self._init_lock = threading.RLock()
+        self._session: Optional[requests.Session] = None
+        self._session_created = 0.0
+        # 收藏列表缓存：(用户, 状态) -> (抓取时间, 豆瓣ID集合)
+        self._collections: Dict[tuple, tuple] = {}
+        self._collections_lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        第一次使用时加载 cookie 并创建会话，CookieCloud 的 cookie 过期后重新加载
+        """
+        if self._session is None or self._session_expired():
+            with self._init_lock:
+                if self._session is None or self._session_expired():
+                    self._session = self._init_session()
+                    self._session_created = time.monotonic()
+        return self._session
+
+    def _session_expired(self) -> bool:
+        return not self._user_cookie and time.monotonic() - self._session_created > self.COOKIECLOUD_TTL
+
+    @property
+    def ck(self) -> str:
+        """
+        ck 在有效期内直接复用，过期或 cookie 变化后重新获取
+        """
+        with self._init_lock:
+            session = self.session
+            if not self._ck_valid():
+                self.set_ck()
+            elif self._ck_state['ck'] and self.cookies.get('ck') != self._ck_state['ck']:
+                self.cookies['ck'] = self._ck_state['ck']
+                session.cookies.set('ck', self._ck_state['ck'], domain=COOKIE_DOMAIN)
+            return self.cookies.get('ck')
+
+    def add_ck_listener(self, owner: Hashable, callback: Callable[[dict], None]):
+        """
+        登记 ck 刷新回调，同一 owner 重复登记时替换旧回调
+        """
+        with self._init_lock:
+            self._ck_listeners[owner] = callback
+
+    def offer_ck_state(self, ck_state: dict = None):
+        """
+        采用调用方保存的 ck 状态，账号已有 ck 时保留现有的
+        """
+        if not ck_state or not ck_state.get('ck'):
+            return
+        with self._init_lock:
+            if not self._ck_state.get('ck'):
+                self._ck_state = dict(ck_state)
+
+    def _init_session(self) -> requests.Session:
+        if not self._user_cookie:
+            cookie_dict, msg = CookieCloudHelper().download()
+            if cookie_dict is None:
+                logger.error(f"获取cookiecloud数据错误 {msg}")
+            cookies = (cookie_dict or {}).get("douban.com")
+        else:
+            cookies = self._user_cookie
+        self.cookies = {k: v.value for k, v in SimpleCookie(cookies).items()}
+
+        if self.cookies.get('__utmz'):
+            self.cookies.pop("__utmz")
+
+        # 移除用户传进来的comment-key
+        if self.cookies.get('ck'):
+            self.cookies.pop("ck")
+
+        if not self.cookies:
+            logger.error(f"cookie获取为空，请检查插件配置或cookie cloud")
+
+        # 复用连接的会话，避免每次请求都重新建立 TCP+TLS 连接
+        session = requests.Session()
+        session.mount("https://", self._adapter)
+        session.mount("http://", self._adapter)
+        session.headers.update(self.headers)
+        for key, value in self.cookies.items():
+            session.cookies.set(key, value, domain=COOKIE_DOMAIN)
+        return session
+
+    def _cookie_fingerprint(self) -> str:
+        cookie_str = ";".join(f"{k}={v}" for k, v in sorted(self.cookies.items()) if k != 'ck')
+        return hashlib.md5(cookie_str.encode()).hexdigest()
+
+    def _ck_valid(self) -> bool:
+        state = self._ck_state
+        if not state.get('expires') or state['expires'] <= time.time():
+            return False
+        # 获取失败的记录只在内存中短暂保留，避免反复请求首页
+        if not state.get('ck'):
+            return not state.get('cookie')
+        return state.get('cookie') == self._cookie_fingerprint()
+
+    def is_throttled(self, response) -> bool:
+        """
+        判断响应是否为限流或反爬验证页，兼容 requests 与 httpx 的响应对象
+        """
+        if response.status_code in (403, 429):
+            return True
+        if "sec.douban.com" in str(response.url):
+            return True
+        return response.status_code == 200 and any(marker in response.text for marker in self.CAPTCHA_MARKERS)
+
+    def request(self, endpoint: str, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        经全局限速器发出请求，被限流（403/429/验证页）时降速并在冷却后重试，重试后仍被限流时抛出 DoubanThrottledError
+        :param endpoint: 限速器中的接口名称，见 RateLimiter.DEFAULT_RATES
+        """
+        kwargs.setdefault("timeout", self.TIMEOUT)
+        for attempt in range(self.MAX_THROTTLE_RETRIES + 1):
+            self.limiter.acquire(endpoint)
+            response = self.session.request(method, url, **kwargs)
+            if not self.is_throttled(response):
+                self.limiter.on_success(endpoint)
+                return response
+            logger.warning(f"豆瓣请求被限流 状态码：{response.status_code} {url}（第 {attempt + 1} 次）")
+            self.limiter.on_throttled(endpoint)
+        raise DoubanThrottledError(f"豆瓣请求被限流 状态码：{response.status_code} {url}", response=response)
+
+    def set_ck(self):
+        with self._init_lock:
+            try:
+                response = self.request("home", "GET", f"{WWW_URL}/")
+            except DoubanThrottledError as e:
+                logger.error(f'获取ck失败: {e}')
+                self.cookies['ck'] = ''
+                self._ck_state = {'ck': '', 'expires': time.time() + self.CK_RETRY_INTERVAL}
+                return
+            # 返回的 Set-Cookie 已由会话写入 cookie jar，后续请求自动携带
+            ck = response.cookies.get('ck')
+            expires = next((c.expires for c in response.cookies if c.name == 'ck' and c.expires), None)
+            if not ck:
+                ck_str = response.headers.get('Set-Cookie', '')
+                logger.debug(ck_str)
+                if not ck_str:
+                    logger.error('获取ck失败，检查豆瓣登录状态')
+                    self.cookies['ck'] = ''
+                    self._ck_state = {'ck': '', 'expires': time.time() + self.CK_RETRY_INTERVAL}
+                    return
+                cookie_parts = ck_str.split(";")
+                ck = cookie_parts[0].split("=")[1].strip()
+                self.session.cookies.set('ck', ck, domain=COOKIE_DOMAIN)
+            logger.debug(ck)
+            self.cookies['ck'] = ck
+            self._ck_state = {
+                'ck': ck,
+                'expires': min(expires or float('inf'), time.time() + self.CK_TTL),
+                'cookie': self._cookie_fingerprint(),
+            }
+            listeners = list(self._ck_listeners.values())
+        for callback in listeners:
+            try:
+                callback(dict(self._ck_state))
+            except Exception as e:
+                logger.warning(f"保存ck状态失败: {e}")
+
+    def get_collection(self, username: str, status: str) -> Optional[set]:
+        """
+        查询最近抓取的收藏列表，未抓取或已过期时返回 None
+        """
+        with self._collections_lock:
+            cached = self._collections.get((username, status))
+            if not cached or time.monotonic() - cached[0] > self.COLLECTION_TTL:
+                return None
+            return set(cached[1])
+
+    def set_collection(self, username: str, status: str, douban_ids: Iterable[str]):
+        """
+        记录完整抓取的收藏列表
+        """
+        with self._collections_lock:
+            self._collections[(username, status)] = (time.monotonic(), set(douban_ids))
+
+    def record_interest(self, subject_id: str, status: str):
+        """
+        标记成功后同步更新已缓存的收藏列表：条目移入新状态，并从其它状态中移除
+        """
+        subject_id = str(subject_id)
+        with self._collections_lock:
+            for (_, cached_status), (_, douban_ids) in self._collections.items():
+                if cached_status == status:
+                    douban_ids.add(subject_id)
+                else:
+                    douban_ids.discard(subject_id)
@@ -1,122 +1,167 @@
 import re
-from typing import Tuple
+from typing import Iterator, Tuple
 from urllib.parse import unquote
 
 import requests
-from bs4 import BeautifulSoup
-from http.cookies import SimpleCookie
-from app.helper.cookiecloud import CookieCloudHelper
+from app.plugins.trimmediahelper.DoubanParser import get_backend
+from app.plugins.trimmediahelper.DoubanClient import (MOVIE_URL, WWW_URL, DoubanAccount, DoubanThrottledError,
+                                                      get_account, shared_cache)
 from app.log import logger
 
-import time
 import json
-import random
+from typing import Callable, Hashable, Optional
+
+
+class CollectionCrawl:
+    """
+    一次收藏列表抓取的结果，每次抓取单独创建，同一助手被多个同步同时使用时互不影响
+    """
+
+    def __init__(self):
+        # 是否完整抓取到列表末尾或水位处，请求失败或中断时为 False
+        self.complete = False
+        # 本次抓取到的最新条目，用于推进水位
+        self.newest: Optional[dict] = None
+
 
 class DoubanHelper:
 
-    def __init__(self, user_cookie: str = None):
-        if not user_cookie:
-            self.cookiecloud = CookieCloudHelper()
-            cookie_dict, msg = self.cookiecloud.download()
-            if cookie_dict is None:
-                logger.error(f"获取cookiecloud数据错误 {msg}")
-            self.cookies = cookie_dict.get("douban.com")
-        else:
-            self.cookies = user_cookie
-        self.cookies = {k: v.value for k, v in SimpleCookie(self.cookies).items()}
-        user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36 Edg/113.0.1774.57'
-        self.headers = {
-            'User-Agent': user_agent,
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, sdch',
-            'Accept-Language': 'zh-CN,zh;q=0.8,en-US;q=0.6,en;q=0.4,en-GB;q=0.2,zh-TW;q=0.2',
-            'Connection': 'keep-alive',
-            'DNT': '1',
-        }
+    # 请求超时时间（秒）
+    TIMEOUT = DoubanAccount.TIMEOUT
+    # 被限流后同一请求最多重试次数
+    MAX_THROTTLE_RETRIES = DoubanAccount.MAX_THROTTLE_RETRIES
 
-        if self.cookies.get('__utmz'):
-            self.cookies.pop("__utmz")
+    def __init__(self, user_cookie: str = None, cache=None,
+                 ck_state: dict = None, on_ck_refresh: Callable[[dict], None] = None,
+                 parser: str = None, owner: Hashable = None):
+        """
+        构造时不发起任何网络请求，cookie 与 ck 在第一次请求豆瓣时才获取
+        会话、ck 与限速器按账号在进程内共享（见 DoubanClient），多个插件使用同一账号时共用请求额度
+        :param ck_state: 上次保存的 ck 状态（ck、过期时间、对应的 cookie 指纹）
+        :param on_ck_refresh: 重新获取 ck 后的回调，用于持久化 ck 状态
+        :param parser: 页面解析后端（selectolax/lxml/bs4），为空时使用可用的最快后端
+        :param owner: 回调的登记者，同一 owner 重新创建助手时替换旧回调
+        """
+        # IMDb ID -> 豆瓣ID 持久化缓存（DoubanCache），进程内各插件共用，为空则不使用缓存
+        self.cache = shared_cache(cache)
+        self.account = get_account(user_cookie, ck_state)
+        if on_ck_refresh:
+            self.account.add_ck_listener(owner if owner is not None else id(self), on_ck_refresh)
+        # 全局限速器，替代分散在各处的固定 sleep
+        self.limiter = self.account.limiter
+        self.parser = get_backend(parser)
+
+    @property
+    def session(self) -> requests.Session:
+        return self.account.session
 
-        # 移除用户传进来的comment-key
-        if self.cookies.get('ck'):
-            self.cookies.pop("ck")
+    @property
+    def ck(self) -> str:
+        return self.account.ck
 
-        # 获取最新的ck
-        self.set_ck()
+    @property
+    def cookies(self) -> dict:
+        return self.account.cookies
 
-        self.ck = self.cookies.get('ck')
-        logger.debug(f"ck:{self.ck} cookie:{self.cookies}")
+    @property
+    def headers(self) -> dict:
+        return self.account.headers
 
-        if not self.cookies:
-            logger.error(f"cookie获取为空，请检查插件配置或cookie cloud")
-        if not self.ck:
-            logger.error(f"请求ck失败，请检查传入的cookie登录状态")
+    def _is_throttled(self, response) -> bool:
+        return self.account.is_throttled(response)
+
+    def _request(self, endpoint: str, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        经全局限速器发出请求，被限流（403/429/验证页）时降速并在冷却后重试
+        :param endpoint: 限速器中的接口名称，见 RateLimiter.DEFAULT_RATES
+        """
+        return self.account.request(endpoint, method, url, **kwargs)
 
     def set_ck(self):
-        self.headers["Cookie"] = ";".join([f"{key}={value}" for key, value in self.cookies.items()])
-        response = requests.get("https://www.douban.com/", headers=self.headers)
-        ck_str = response.headers.get('Set-Cookie', '')
-        logger.debug(ck_str)
-        if not ck_str:
-            logger.error('获取ck失败，检查豆瓣登录状态')
-            self.cookies['ck'] = ''
-            return
-        cookie_parts = ck_str.split(";")
-        ck = cookie_parts[0].split("=")[1].strip()
-        logger.debug(ck)
-        self.cookies['ck'] = ck
+        self.account.set_ck()
 
     def get_douban_id(self, imdb_id: str) -> str:
-        # 基础随机延迟 7-11 秒,避免被豆瓣反爬
-        time.sleep(random.uniform(9, 13))
-        url = f"https://www.douban.com/search?cat=1002&q={imdb_id}"
-        print(f"请求URL: {url}")
-        response = requests.get(url, headers=self.headers, cookies=self.cookies)
-        try:
-            response = requests.get(url, headers=self.headers, cookies=self.cookies, timeout=10)
-            if response.status_code != 200:
-                print(f"搜索 IMDb ID {imdb_id} 失败，状态码：{response.status_code}")
-                return None
-                
-            soup = BeautifulSoup(response.text, 'html.parser')
-            title_divs = soup.find_all("div", class_="title")
-            
-            if not title_divs:
-                print(f"找不到 IMDb ID {imdb_id} 相关条目")
-                return None
-            
-            # 查找第一个有效的结果
-            for div in title_divs:
-                a_tag = div.find_all("a")
-                if not a_tag:
-                    continue
-                    
-                link = unquote(a_tag[0]["href"])
-                if "subject/" in link:
-                    pattern = r"subject/(\d+)/"
-                    match = re.search(pattern, link)
-                    if match:
-                        douban_id = match.group(1)
-                        # 验证是否是我们要找的内容
-                        title = a_tag[0].string.strip() if a_tag[0].string else ""
-                        print(f"找到匹配: {title} -> 豆瓣ID: {douban_id} (IMDb: {imdb_id})")
-                        return douban_id
-            
-            print(f"IMDb ID {imdb_id} 的搜索结果中没有找到豆瓣链接")
-            return None
-            
-        except requests.RequestException as e:
-            print(f"请求豆瓣搜索失败: {e}")
-            return None
-        except Exception as e:
-            print(f"解析搜索结果失败: {e}")
+        """
+        按 IMDb ID 搜索豆瓣ID，豆瓣上没有该条目时返回 None 并缓存
+        请求失败或被限流时抛出异常且不写入缓存，调用方需与“豆瓣上没有该条目”区分，以便下次重试
+        """
+        # 先查持久化缓存，命中则无需访问豆瓣
+        if self.cache:
+            hit, douban_id = self.cache.get_douban_id(imdb_id)
+            if hit:
+                logger.debug(f"IMDb ID {imdb_id} 命中缓存 -> 豆瓣ID: {douban_id}")
+                return douban_id
+        url = f"{WWW_URL}/search?cat=1002&q={imdb_id}"
+        logger.debug(f"请求URL: {url}")
+        # 搜索接口由限速器控制请求间隔，避免被豆瓣反爬
+        response = self._request("search", "GET", url)
+        response.raise_for_status()
+        douban_id = self.parse_douban_id(imdb_id, response.text)
+        self._cache_douban_id(imdb_id, douban_id)
+        return douban_id
+
+    def known_missing(self, imdb_id: str) -> bool:
+        """
+        豆瓣上没有该 IMDb ID 的条目，且未命中的缓存结果仍在有效期内
+        """
+        if not self.cache:
+            return False
+        hit, douban_id = self.cache.get_douban_id(imdb_id)
+        return hit and not douban_id
+
+    def parse_douban_id(self, imdb_id: str, html: str) -> str | None:
+        """
+        从豆瓣搜索结果页中解析第一个条目的豆瓣ID
+        """
+        results = self.parser.search_results(html)
+
+        if not results:
+            logger.info(f"找不到 IMDb ID {imdb_id} 相关条目")
             return None
 
+        # 查找第一个有效的结果
+        for result in results:
+            link = unquote(result["link"] or "")
+            if "subject/" in link:
+                pattern = r"subject/(\d+)/"
+                match = re.search(pattern, link)
+                if match:
+                    douban_id = match.group(1)
+                    # 验证是否是我们要找的内容
+                    title = result["title"] or ""
+                    logger.debug(f"找到匹配: {title} -> 豆瓣ID: {douban_id} (IMDb: {imdb_id})")
+                    return douban_id
+
+        logger.info(f"IMDb ID {imdb_id} 的搜索结果中没有找到豆瓣链接")
+        return None
+
+    def _cache_douban_id(self, imdb_id: str, douban_id: str = None):
+        if self.cache:
+            self.cache.set_douban_id(imdb_id, douban_id)
+
     def set_watching_status(self, subject_id: str, status: str = "do", private: bool = True) -> bool:
-        self.headers["Referer"] = f"https://movie.douban.com/subject/{subject_id}/"
-        self.headers["Origin"] = "https://movie.douban.com"
-        self.headers["Host"] = "movie.douban.com"
-        self.headers["Cookie"] = ";".join([f"{key}={value}" for key, value in self.cookies.items()])
+        try:
+            response = self._request(
+                "interest", "POST",
+                f"{MOVIE_URL}/j/subject/{subject_id}/interest",
+                headers=self.interest_headers(subject_id),
+                data=self.interest_form(status, private))
+        except DoubanThrottledError as e:
+            logger.error(f"douban_id: {subject_id} 标记失败: {e}")
+            return False
+        ok = self.parse_interest_result(subject_id, response)
+        if ok:
+            self.account.record_interest(subject_id, status)
+        return ok
+
+    @staticmethod
+    def interest_headers(subject_id: str) -> dict:
+        return {
+            "Referer": f"{MOVIE_URL}/subject/{subject_id}/",
+            "Origin": MOVIE_URL,
+        }
+
+    def interest_form(self, status: str, private: bool) -> dict:
         data_json = {
             "ck": self.ck,
             "interest": "do",
@@ -128,11 +173,11 @@ class DoubanHelper:
         if private:
             data_json["private"] = "on"
         data_json["interest"] = status
-        response = requests.post(
-            url=f"https://movie.douban.com/j/subject/{subject_id}/interest",
-            headers=self.headers,
-            data=data_json)
-        if not response:
+        return data_json
+
+    @staticmethod
+    def parse_interest_result(subject_id: str, response) -> bool:
+        if response is None or response.status_code >= 400:
             return False
         if response.status_code == 200:
             # 正常情况 {"r":0}
@@ -171,111 +216,249 @@ class DoubanHelper:
         return "".join(parts)
         
         
-    def get_user_movies(self, username: str, status: str = "collect"):
-        movies = []
-        start = 0
-        
-        # 状态映射
-        status_map = {
-            "collect": "已看",
-            "do": "在看",
-            "wish": "想看"
+    # 状态映射
+    STATUS_MAP = {
+        "collect": "已看",
+        "do": "在看",
+        "wish": "想看"
+    }
+
+    @staticmethod
+    def collection_url(username: str, status: str) -> str:
+        return f"{MOVIE_URL}/people/{username}/{status}"
+
+    @staticmethod
+    def collection_params(start: int) -> dict:
+        return {
+            "start": start,
+            "sort": "time",
+            "rating": "all",
+            "filter": "all",
+            "mode": "grid"
         }
-        logger.info(f"开始获取用户 {username} 的 {status_map.get(status, status)} 列表...")
+
+    def get_user_movies(self, username: str, status: str = "collect", watermark: dict = None) -> list:
+        """
+        按标记时间倒序获取用户的收藏列表
+        :param watermark: 上次同步的水位，抓取到水位处即停止，为空时抓取全部
+        """
+        return list(self.iter_user_movies(username, status, watermark))
+
+    def iter_user_movies(self, username: str, status: str = "collect", watermark: dict = None,
+                         crawl: CollectionCrawl = None) -> Iterator[dict]:
+        """
+        get_user_movies 的生成器版本，每解析出一条即产出，调用方可边抓取边处理
+        :param crawl: 记录本次抓取是否完整和最新条目，见 iter_collection_items
+        """
+        for item in self.iter_collection_items(username, status, watermark, crawl):
+            # 条目缓存中已有则不再请求详情页
+            try:
+                imdb_id = self.get_imdb_id(item['link'])
+            except Exception as e:
+                logger.warning(f"获取条目详情失败 {item['link']}: {e}")
+                yield self._movie_record(item, error=str(e))
+                continue
+            yield self._movie_record(item, imdb_id)
+
+    def iter_collection_items(self, username: str, status: str = "collect", watermark: dict = None,
+                              crawl: CollectionCrawl = None) -> Iterator[dict]:
+        """
+        逐页抓取收藏列表，只解析列表页，不请求详情页
+        :param crawl: 记录本次抓取是否完整和最新条目，请求失败时记录日志并停止抓取，不抛出异常
+        """
+        crawl = crawl if crawl is not None else CollectionCrawl()
+        crawl.complete = False
+        count = 0
+        start = 0
+        status_name = self.STATUS_MAP.get(status, status)
+        logger.info(f"开始获取用户 {username} 的 {status_name} 列表...")
 
         while True:
+            url = self.collection_url(username, status)
             try:
-                url = f"https://movie.douban.com/people/{username}/{status}"
-                params = {
-                    "start": start,
-                    "sort": "time",
-                    "rating": "all",
-                    "filter": "all",
-                    "mode": "grid"
-                }               
-                resp = requests.get(url, headers=self.headers, cookies=self.cookies, params=params, timeout=10)
+                resp = self._request("collection", "GET", url, params=self.collection_params(start))
                 resp.raise_for_status()
             except Exception as e:
                 logger.error(f"请求列表失败 {url}: {e}")
                 break
 
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            items = soup.find_all('div', class_='item')
+            items = self.parse_movies(resp.text, status)
             if not items:
-                # 额外检查是否被反爬（页面有“验证”或登录提示）
-                if "请验证" in resp.text or "登录" in resp.text:
-                    logger.warning("豆瓣检测到爬虫或需要登录，请检查您的收藏是否公开！")
-                logger.info(f"{status_map.get(status, status)} 列表获取完毕（本页无数据）")
+                crawl.complete = True
                 break
 
             logger.info(f"第 {start // 15 + 1} 页，获取到 {len(items)} 条")
+            items, reached = self.cut_at_watermark(items, watermark)
+            if items and crawl.newest is None:
+                crawl.newest = self._movie_record(items[0])
             for item in items:
-                link_elem = item.find('a', class_='nbg')
-                if not link_elem:
-                    continue
-                link = link_elem['href']
-                title_full = item.find('em').text.strip()
-                # 优先提取中文
-                simplified_title = ' '.join(re.findall(r'[\u4e00-\u9fa5]+', title_full))
-                if not simplified_title:
-                    simplified_title = title_full.split(' / ')[0].strip()
-                douban_id = link.strip('/').split('/')[-1]
-
-                imdb_id = self.get_imdb_id(link)
-                movies.append({
-                    'douban_id': douban_id,
-                    'title': simplified_title,
-                    'imdb_id': imdb_id, 
-                    'status': status_map.get(status, status)
-                })
+                count += 1
+                yield item
+            if reached:
+                crawl.complete = True
+                break
 
             start += 15
-            time.sleep(random.uniform(5, 10))
 
-        logger.info(f"{status_map.get(status, status)} 共获取 {len(movies)} 条")
+        logger.info(f"{status_name} 共获取 {count} 条")
+
+    def get_collection_ids(self, username: str, status: str = "collect") -> Optional[set]:
+        """
+        获取用户某个状态下全部条目的豆瓣ID，只抓取列表页
+        :return: 豆瓣ID集合，未能完整抓取时返回 None
+        """
+        # 其它插件刚抓取过同一列表时直接使用
+        douban_ids = self.account.get_collection(username, status)
+        if douban_ids is not None:
+            logger.info(f"使用最近抓取的 {self.STATUS_MAP.get(status, status)} 列表，共 {len(douban_ids)} 条")
+            return douban_ids
+        crawl = CollectionCrawl()
+        douban_ids = {item['douban_id'] for item in self.iter_collection_items(username, status, crawl=crawl)}
+        if not crawl.complete:
+            return None
+        self.account.set_collection(username, status, douban_ids)
+        return douban_ids
+
+    @staticmethod
+    def _movie_record(item: dict, imdb_id: str = None, error: str = None) -> dict:
+        """
+        :param error: 获取条目详情失败的原因，此时 imdb_id 未知，不代表条目没有 IMDb ID
+        """
+        record = {
+            'douban_id': item['douban_id'],
+            'title': item['title'],
+            'imdb_id': imdb_id,
+            'status': item['status'],
+            'rating_date': item.get('rating_date')
+        }
+        if error:
+            record['error'] = error
+        return record
+
+    def cut_at_watermark(self, items: list, watermark: dict = None) -> Tuple[list, bool]:
+        """
+        截掉一页中水位及更早的条目
+        :return: (水位之前的新条目, 是否已到达水位)
+        """
+        for index, item in enumerate(items):
+            if self.reached_watermark(item['douban_id'], item.get('rating_date'), watermark):
+                logger.info(f"已抓取到上次同步的位置: {item['title']} ({item.get('rating_date')})，停止抓取")
+                return items[:index], True
+        return items, False
+
+    @staticmethod
+    def reached_watermark(douban_id: str, rating_date: str, watermark: dict = None) -> bool:
+        """
+        收藏列表按标记时间倒序，遇到上次同步时最新的条目或更早标记的条目即可停止
+        :param watermark: 上次同步时最新条目 {"douban_id": ..., "rating_date": ...}
+        """
+        if not watermark:
+            return False
+        if douban_id and douban_id == watermark.get("douban_id"):
+            return True
+        return bool(rating_date and watermark.get("rating_date") and rating_date < watermark["rating_date"])
+
+    def parse_movies(self, html: str, status: str) -> list:
+        """
+        解析收藏列表的一页，返回条目列表（含详情页链接 link），本页无数据时返回空列表
+        """
+        status_name = self.STATUS_MAP.get(status, status)
+        items = self.parser.collection_items(html)
+        if not items:
+            # 额外检查是否被反爬（页面有“验证”或登录提示）
+            if "请验证" in html or "登录" in html:
+                logger.warning("豆瓣检测到爬虫或需要登录，请检查您的收藏是否公开！")
+            logger.info(f"{status_name} 列表获取完毕（本页无数据）")
+            return []
+
+        movies = []
+        for item in items:
+            link = item['link']
+            if not link:
+                continue
+            title_full = item['title'] or ''
+            # 优先提取中文
+            simplified_title = ' '.join(re.findall(r'[\u4e00-\u9fa5]+', title_full))
+            if not simplified_title:
+                simplified_title = title_full.split(' / ')[0].strip()
+            movies.append({
+                'douban_id': link.strip('/').split('/')[-1],
+                'title': simplified_title,
+                'link': link,
+                'status': status_name,
+                # 标记日期，用于增量同步的水位判断
+                'rating_date': item['date']
+            })
         return movies
 
     def get_imdb_id(self, url: str) -> str:
         """
-        从豆瓣电影页面获取 IMDb ID，包含基础防反爬延迟
-        返回完整的 IMDb ID（包含 'tt' 前缀）
+        获取豆瓣条目的 IMDb ID，优先查询本地条目缓存，未缓存时才请求详情页
+        返回完整的 IMDb ID（包含 'tt' 前缀），条目没有 IMDb ID 时返回 None，请求失败时抛出异常
         """
-        try:
-            # 基础随机延迟 1-3 秒
-            time.sleep(random.uniform(1, 2))
-            
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            info = soup.find('div', id='info')
-            
-            if info:
-                for span in info.find_all('span', class_='pl'):
-                    # 更宽松的匹配，豆瓣可能有中文冒号或空格
-                    span_text = span.get_text(strip=True)
-                    if 'IMDb:' in span_text or 'IMDb：' in span_text:
-                        # 查找 IMDb ID
-                        next_sibling = span.next_sibling
-                        # 可能需要跳过空白节点
-                        while next_sibling and (not next_sibling.string or next_sibling.string.strip() == ''):
-                            next_sibling = next_sibling.next_sibling
-                        
-                        if next_sibling and next_sibling.string:
-                            imdb_id = next_sibling.string.strip()
-                            logger.debug(f"从 {url} 获取到 IMDb ID: {imdb_id}")
-                            return imdb_id
-            
-            logger.debug(f"未在 {url} 中找到 IMDb ID")
-            return None
-            
-        except requests.RequestException as e:
-            logger.warning(f"请求豆瓣页面失败 {url}: {e}")
+        subject = self.cached_subject(self.extract_douban_id(url))
+        if subject is None:
+            subject = self.get_subject(url)
+        return subject.get('imdb_id') if subject else None
+
+    def cached_subject(self, douban_id: str) -> dict | None:
+        """
+        从本地缓存查询条目信息，未缓存时返回 None
+        """
+        if not self.cache or not douban_id:
             return None
-        except Exception as e:
-            logger.warning(f"解析豆瓣页面失败 {url}: {e}")
+        subject = self.cache.get_subject(douban_id)
+        if not subject:
+            # 搜索 IMDb ID 时已得到的对应关系也可直接使用
+            imdb_id = self.cache.get_imdb_id(douban_id)
+            subject = {'imdb_id': imdb_id} if imdb_id else None
+        if subject:
+            logger.debug(f"豆瓣ID {douban_id} 命中条目缓存 -> IMDb ID: {subject.get('imdb_id')}")
+        return subject
+
+    def get_subject(self, url: str) -> dict | None:
+        """
+        请求豆瓣条目详情页并解析条目信息，解析成功时写入缓存，请求间隔由限速器控制
+        条目不存在（404）或页面中没有条目信息时返回 None；请求失败或被限流时抛出异常，
+        调用方需与“条目没有 IMDb ID”区分，以便下次重试
+        """
+        response = self._request("subject", "GET", url)
+        if response.status_code == 404:
+            logger.warning(f"豆瓣条目不存在 {url}")
             return None
-        
+        response.raise_for_status()
+        subject = self.parse_subject(url, response.text)
+        self._cache_subject(url, subject)
+        return subject
+
+    def _cache_subject(self, url: str, subject: dict = None):
+        douban_id = self.extract_douban_id(url)
+        if not self.cache or not subject or not douban_id:
+            return
+        self.cache.set_subject(douban_id, **subject)
+        if subject.get('imdb_id'):
+            self._cache_douban_id(subject['imdb_id'], douban_id)
+
+    def parse_subject(self, url: str, html: str) -> dict | None:
+        """
+        解析豆瓣条目详情页，返回 IMDb ID、标题、年份和类型，页面中没有 #info 时返回 None
+        """
+        subject = self.parser.subject_info(html)
+        if not subject:
+            logger.debug(f"未在 {url} 中找到条目信息")
+        elif subject['imdb_id']:
+            logger.debug(f"从 {url} 获取到 IMDb ID: {subject['imdb_id']}")
+        else:
+            logger.debug(f"未在 {url} 中找到 IMDb ID")
+        return subject
+
+    def parse_imdb_id(self, url: str, html: str) -> str | None:
+        """
+        从豆瓣条目详情页的 #info 中解析 IMDb ID
+        """
+        subject = self.parse_subject(url, html)
+        return subject.get('imdb_id') if subject else None
+
 if __name__ == "__main__":
     doubanHelper = DoubanHelper()
     subject_title, subject_id, score = doubanHelper.get_subject_id("火线 第 3 季")
@@ -0,0 +1,122 @@
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from app.log import logger
+
+# 数据库被媒体服务器锁定时的最长等待时间（秒）
+BUSY_TIMEOUT = 30
+# 打开数据库遇到锁定时的重试次数
+OPEN_RETRIES = 3
+
+# 数据库指纹的有效期（秒），过期后即使没有变化也完整同步一次，
+# 以覆盖观看后才刮削到 IMDb/豆瓣ID 等不体现在变化信号中的修改
+FINGERPRINT_MAX_AGE = 24 * 3600
+
+# 大范围扫描时的连接参数：64MB 页缓存、256MB 内存映射、临时表放在内存中
+SCAN_PRAGMAS = {
+    "cache_size": -64 * 1024,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+def _uri(db_path: str, mode: str) -> str:
+    return f"file:{quote(Path(db_path).as_posix())}?mode={mode}"
+
+
+def connect(db_path: str, readonly: bool = True, timeout: float = BUSY_TIMEOUT) -> sqlite3.Connection:
+    """
+    打开媒体服务器的数据库，不会创建不存在的数据库文件
+    :param readonly: 为 True 时以只读方式打开，并禁止任何写操作
+    :param timeout: 数据库被锁定时的等待时间（秒）
+    """
+    if readonly:
+        # 只读连接使用自动提交模式，由 read_transaction 显式控制读事务
+        conn = sqlite3.connect(_uri(db_path, "ro"), uri=True, timeout=timeout, isolation_level=None)
+    else:
+        conn = sqlite3.connect(_uri(db_path, "rw"), uri=True, timeout=timeout)
+    conn.execute(f"PRAGMA busy_timeout = {int(timeout * 1000)}")
+    for name, value in SCAN_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    if readonly:
+        conn.execute("PRAGMA query_only = 1")
+    return conn
+
+
+def _is_locked(e: sqlite3.OperationalError) -> bool:
+    message = str(e).lower()
+    return "locked" in message or "busy" in message
+
+
+def begin_read(db_path: str, timeout: float = BUSY_TIMEOUT) -> sqlite3.Connection:
+    """
+    打开只读连接并开启读事务，事务内的所有查询看到的是同一时刻的数据，关闭连接即结束事务
+    事务期间会阻止媒体服务器回收 WAL 或写入（取决于日志模式），不要在事务内发起网络请求
+    """
+    for attempt in range(OPEN_RETRIES):
+        conn = connect(db_path, readonly=True, timeout=timeout)
+        try:
+            conn.execute("BEGIN")
+            # 读取一次 schema 以获取读锁，确保后续查询使用同一快照
+            conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+            return conn
+        except sqlite3.OperationalError as e:
+            conn.close()
+            if not _is_locked(e) or attempt == OPEN_RETRIES - 1:
+                raise
+            logger.warning(f"数据库被锁定，{attempt + 1} 秒后重试: {e}")
+            time.sleep(attempt + 1)
+
+
+@contextmanager
+def read_transaction(db_path: str, timeout: float = BUSY_TIMEOUT) -> Iterator[sqlite3.Connection]:
+    """
+    begin_read 的上下文管理器版本，退出时结束读事务并关闭连接
+    """
+    conn = begin_read(db_path, timeout)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def file_signature(db_path: str) -> list:
+    """
+    数据库文件及其 -wal 文件的大小和修改时间，文件不存在时为 None
+    """
+    signature = []
+    for path in (Path(db_path), Path(f"{db_path}-wal")):
+        try:
+            stat = path.stat()
+            signature.append([stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            signature.append(None)
+    return signature
+
+
+def check_unchanged(previous: Optional[dict], db_path: str, signal_sql: str, key: str = "",
+                    max_age: float = FINGERPRINT_MAX_AGE) -> Tuple[bool, dict]:
+    """
+    判断数据库自上次记录指纹后是否有变化
+    先比较文件大小和修改时间，文件有变化时再执行 signal_sql 比较内容信号（如最大更新时间、记录数），
+    媒体服务器写入了与同步无关的数据时也能判断为未变化
+    :param previous: 上次同步成功后保存的指纹
+    :param signal_sql: 返回一行变化信号的查询
+    :param key: 影响同步结果的配置（如数据库路径、用户名），配置变化时视为有变化
+    :return: (是否未变化, 当前指纹)，同步成功后保存当前指纹
+    """
+    current = {"key": key, "files": file_signature(db_path), "time": time.time()}
+    valid = bool(previous) and previous.get("key") == key \
+        and time.time() - previous.get("time", 0) < max_age
+    if valid and previous.get("files") == current["files"]:
+        return True, previous
+    with read_transaction(db_path) as conn:
+        current["signal"] = list(conn.execute(signal_sql).fetchone() or [])
+    if valid and previous.get("signal") == current["signal"]:
+        # 保留原记录时间，只更新文件信息，下次可直接通过文件信息判断
+        return True, {**previous, "files": current["files"]}
+    return False, current
@@ -0,0 +1,595 @@
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.log import logger
+
+from app.plugins.trimmediahelper.SyncPipeline import SyncPipeline
+from app.plugins.trimmediahelper.SyncState import SyncState
+
+# 豆瓣状态
+WATCHING = "do"
+DONE = "collect"
+# 同步类型 -> 豆瓣状态
+KIND_STATUS = {
+    "watching": WATCHING,
+    "done": DONE,
+}
+STATUS_LABELS = {
+    WATCHING: "在看",
+    DONE: "已看",
+}
+
+
+class SyncError(Exception):
+    """
+    配置或媒体库数据有误，无法继续同步，消息会发送给用户
+    """
+
+
+class MovieStream:
+    """
+    豆瓣收藏列表的抓取结果，按标记时间倒序逐条产出
+    """
+
+    def __init__(self, movies: Iterator[dict], complete: Callable[[], bool] = None,
+                 newest: Callable[[], Optional[dict]] = None):
+        """
+        :param complete: 是否完整抓取到列表末尾或水位处，为空时以迭代正常结束为准
+        :param newest: 本次抓取到的最新条目，为空时取第一条
+        """
+        self._movies = movies
+        self._complete = complete
+        self._newest = newest
+        self._exhausted = False
+        self._first: Optional[dict] = None
+
+    def __iter__(self):
+        for movie in self._movies:
+            if self._first is None:
+                self._first = movie
+            yield movie
+        self._exhausted = True
+
+    @property
+    def complete(self) -> bool:
+        return self._complete() if self._complete else self._exhausted
+
+    @property
+    def newest(self) -> Optional[dict]:
+        return self._newest() if self._newest else self._first
+
+    def close(self):
+        close = getattr(self._movies, "close", None)
+        if close:
+            close()
+
+
+class WatchedTarget:
+    """
+    反向同步时写入媒体库的一方，由适配器在开始同步时创建，同步结束后关闭
+    """
+
+    def match(self, movie: dict) -> Optional[dict]:
+        """
+        在媒体库中查找豆瓣条目，找不到或数据不完整时返回 None
+        :return: 同步条目，含 key、title，以及可选的 douban_id、imdb_id 和写入所需的其它字段
+        """
+        raise NotImplementedError
+
+    def plan(self, item: dict) -> list:
+        """
+        计算标记条目看过需要的写入，并在内存中记为已看，媒体库中已是看过时返回空列表
+        """
+        raise NotImplementedError
+
+    def write(self, writes: list):
+        """
+        在一个事务中执行一批写入，出错时抛出 sqlite3.Error
+        """
+        raise NotImplementedError
+
+    def discard(self, writes: list):
+        """
+        写入失败后撤销 plan 在内存中的记录，下次重新处理
+        """
+
+    def close(self):
+        pass
+
+
+class MediaSourceAdapter:
+    """
+    媒体服务器适配器：提供各媒体服务器的查询和写入，批处理、限速、同步状态、水位和进度由 SyncEngine 统一处理
+    新增媒体服务器时实现本类即可
+    """
+
+    # 通知标题中的媒体服务器名称
+    name = ""
+    # 反向同步时每个事务最多写入的条目数，以及两次写入的最长间隔（秒），为 None 时只按数量
+    write_batch = 200
+    write_interval: Optional[float] = None
+    # 反向同步时是否跳过同步状态已是已看的条目
+    reverse_skip_synced = False
+
+    def config_key(self) -> str:
+        """
+        影响同步结果的配置（数据库路径、用户名），变化后水位和同步进度失效
+        """
+        raise NotImplementedError
+
+    def validate(self, kind: str) -> Optional[str]:
+        """
+        检查配置，返回错误信息，配置完整时返回 None
+        :param kind: watching 在看 / done 已看 / reverse 反向同步
+        """
+        return None
+
+    def scan(self, kind: str, since: Any) -> Tuple[Any, List[dict], Optional[Set[str]]]:
+        """
+        查询需要同步到豆瓣的条目，数据库出错时抛出 sqlite3.Error
+        :param kind: watching 在看 / done 已看
+        :param since: 上次同步的水位，为 None 时完整扫描
+        :return: (新的水位, 条目列表, 完整扫描时库中全部条目的同步状态 key)
+                 条目含 key、title，以及 douban_id 或 imdb_id；条目需可序列化为 JSON，用于记录同步进度
+        """
+        raise NotImplementedError
+
+    def state_lookup(self, item: dict) -> Dict[str, Any]:
+        """
+        按主键未查到同步状态时，用于 SyncState.find 的辅助字段
+        """
+        return {}
+
+    def douban_movies(self, helper, douban_user: str, watermark: Optional[dict]) -> MovieStream:
+        """
+        抓取豆瓣上的看过列表，watermark 为上次同步时最新的条目
+        列表请求失败时不抛出异常，由 MovieStream.complete 为 False 表示未完整抓取，反向同步不推进水位
+        """
+        raise NotImplementedError
+
+    def open_target(self) -> WatchedTarget:
+        """
+        打开媒体库准备反向同步，预加载索引，用户不存在等无法同步的情况抛出 SyncError
+        """
+        raise NotImplementedError
+
+
+class SyncEngine:
+    """
+    媒体服务器与豆瓣之间的同步流程
+    正向：增量扫描 -> 记录进度 -> 过滤已同步 -> 比对豆瓣收藏 -> 查询豆瓣ID和标记豆瓣状态的流水线 -> 推进水位
+    反向：抓取豆瓣看过列表 -> 在媒体库中匹配 -> 分批写入 -> 记录同步状态 -> 推进水位
+    媒体服务器相关的部分由 MediaSourceAdapter 提供
+    """
+
+    # 每隔一段时间（秒）完整扫描一次，以覆盖标记后才刮削到 IMDb/豆瓣ID 的条目
+    FULL_SCAN_INTERVAL = 7 * 24 * 3600
+    # 待标记的条目超过该数量、且多于估计的收藏列表页数时，先抓取豆瓣上的收藏列表，跳过豆瓣上已是目标状态的条目
+    RECONCILE_THRESHOLD = 20
+    # 豆瓣收藏列表每页的条目数
+    COLLECTION_PAGE_SIZE = 15
+    # 标记豆瓣状态的线程数，标记接口限流严格，默认逐条标记
+    MARK_WORKERS = 1
+
+    def __init__(self, adapter: MediaSourceAdapter, state: SyncState, store, helper: Callable[[], Any],
+                 should_stop: Callable[[], bool] = None, notify: Callable[[str], None] = None,
+                 douban_user: str = None, private: bool = True, resolve_workers: int = 1):
+        """
+        :param store: 保存水位和进度的插件（get_data/save_data/del_data）
+        :param helper: 获取豆瓣助手，第一次请求豆瓣时才调用
+        :param notify: 发送通知，为空时不通知
+        :param resolve_workers: 查询豆瓣ID的线程数
+        """
+        self.adapter = adapter
+        self.state = state
+        self.store = store
+        self._helper = helper
+        self.should_stop = should_stop or (lambda: False)
+        self.notify = notify or (lambda text: None)
+        self.douban_user = douban_user
+        self.private = private
+        self.resolve_workers = max(1, int(resolve_workers or 1))
+
+    @property
+    def helper(self):
+        return self._helper()
+
+    # ---------------------------
+    # 正向同步：媒体库 -> 豆瓣
+    # ---------------------------
+
+    def forward(self, kind: str) -> bool:
+        """
+        查询有变化的条目并标记豆瓣状态，查询后记录待处理条目，中断后下次直接从这些条目继续
+        :param kind: watching 在看 / done 已看，对应各自的水位和进度
+        :return: 是否全部同步成功
+        """
+        status = KIND_STATUS[kind]
+        label = STATUS_LABELS[status]
+        logger.info(f"⏳ 开始同步{label}状态...")
+        error = self.adapter.validate(kind)
+        if error:
+            logger.error(error)
+            self.notify(error)
+            return False
+
+        checkpoint = self._load_checkpoint(kind)
+        if checkpoint:
+            since, high_water, items = checkpoint["since"], checkpoint["high_water"], checkpoint["items"]
+            logger.info(f"上次同步未完成，继续处理上次查询到的 {len(items)} 个条目")
+        else:
+            since = self._get_watermark(kind)
+            try:
+                high_water, items, library_keys = self.adapter.scan(kind, since)
+            except sqlite3.Error as e:
+                logger.error(f"数据库查询错误: {e}")
+                self.notify(f"数据库查询错误: {e}")
+                return False
+            logger.info(f"{'完整' if since is None else '增量'}扫描，查询到 {len(items)} 个{label}条目")
+            if library_keys is not None:
+                self._evict(library_keys)
+            if self.should_stop():
+                return False
+            self._save_checkpoint(kind, since, high_water, items)
+
+        pending = [item for item in items if not self._synced(item, status)]
+        if len(pending) < len(items):
+            logger.info(f"其中 {len(items) - len(pending)} 个条目已同步过，跳过")
+        remote_ids = self._collection_ids(status, pending)
+        marked, failed = self._mark(pending, status, remote_ids)
+        # 提交剩余的同步状态
+        self.state.flush()
+        if self.should_stop():
+            logger.info(f"检测到中断请求，停止同步{label}状态...")
+            return False
+        # 已处理完，失败的条目由下次增量扫描重新处理
+        self._clear_checkpoint(kind)
+        logger.info(f"{label}状态同步完成，共处理 {marked}/{len(items)} 个条目，失败 {failed} 个")
+        if failed:
+            return False
+        self._save_watermark(kind, high_water, full_scan=since is None)
+        return True
+
+    def status_of(self, item: dict) -> Optional[str]:
+        """
+        查询条目的同步状态，先按主键，再按适配器提供的辅助字段
+        """
+        status = self.state.get(item["key"])
+        if status is None:
+            lookup = self.adapter.state_lookup(item)
+            if lookup:
+                status = self.state.find(**lookup)
+        return status
+
+    def _synced(self, item: dict, status: str) -> bool:
+        current = self.status_of(item)
+        # 在看的条目处理过即不再标记，已看的条目需已标记为已看
+        return current is not None if status == WATCHING else current == status
+
+    def _record(self, item: dict, status: str, douban_id=None):
+        self.state.set(item["key"], status,
+                       douban_id=douban_id or item.get("douban_id"),
+                       title=item.get("title"),
+                       imdb_id=item.get("imdb_id"))
+
+    def _collection_ids(self, status: str, pending: List[dict]) -> Optional[set]:
+        """
+        待标记的条目较多时（如清理缓存或重新安装后的首次同步），先抓取一次豆瓣上该状态的收藏列表，
+        豆瓣上已是该状态的条目不再重复标记
+        抓取列表每页一个请求，待标记的条目需多于估计的列表页数才值得抓取，列表大小按同步状态中该状态的条目数估计；
+        豆瓣上没有的条目（搜索未命中的结果仍在有效期内）不会发出标记请求，不计入待标记数
+        :return: 豆瓣ID集合，条目较少、未配置豆瓣用户ID或抓取失败时返回 None，逐条标记
+        """
+        if len(pending) < self.RECONCILE_THRESHOLD or not self.douban_user or self.should_stop():
+            return None
+        helper = self.helper
+        to_mark = sum(1 for item in pending if not self._known_missing(helper, item))
+        pages = -(-self.state.count(status) // self.COLLECTION_PAGE_SIZE)
+        if to_mark < self.RECONCILE_THRESHOLD:
+            return None
+        if to_mark <= pages:
+            logger.info(f"待标记 {to_mark} 个{STATUS_LABELS[status]}条目，不多于豆瓣收藏列表的约 {pages} 页，逐条标记")
+            return None
+        try:
+            douban_ids = helper.get_collection_ids(self.douban_user, status)
+        except Exception as e:
+            logger.warning(f"获取豆瓣收藏列表失败，逐条标记: {e}")
+            return None
+        if douban_ids is None:
+            logger.warning("获取豆瓣收藏列表失败，逐条标记")
+            return None
+        logger.info(f"豆瓣上已有 {len(douban_ids)} 个{STATUS_LABELS[status]}条目，待标记 {to_mark} 个")
+        return douban_ids
+
+    @staticmethod
+    def _known_missing(helper, item: dict) -> bool:
+        """
+        只有 IMDb ID 的条目，豆瓣上是否确定没有对应条目，此时查询豆瓣ID命中缓存，不会请求豆瓣
+        """
+        return not item.get("douban_id") and bool(item.get("imdb_id")) and helper.known_missing(item["imdb_id"])
+
+    def _mark(self, items: List[dict], status: str, remote_ids: Optional[set] = None) -> Tuple[int, int]:
+        """
+        查询豆瓣ID和标记豆瓣状态用有界队列连成流水线，每查到一个豆瓣ID立即标记
+        :param remote_ids: 豆瓣上已是目标状态的豆瓣ID，这些条目只记录同步状态，不再标记
+        :return: (成功标记数, 失败数)
+        """
+        if not items:
+            return 0, 0
+        label = STATUS_LABELS[status]
+        helper = self.helper
+        lock = threading.Lock()
+        messages = []
+        failed = []
+
+        def pending():
+            for item in items:
+                # 继续上次未完成的同步时，跳过已标记的条目
+                if not self._synced(item, status):
+                    yield item
+
+        def resolve(item):
+            title = item.get("title")
+            douban_id = item.get("douban_id")
+            if not douban_id and item.get("imdb_id"):
+                try:
+                    douban_id = helper.get_douban_id(item["imdb_id"])
+                except Exception as e:
+                    # 请求失败不代表豆瓣上没有该条目，计为失败，水位不推进，下次重试
+                    logger.error(f"⚠️ 查询豆瓣ID失败: {title} (IMDB: {item['imdb_id']}): {e}")
+                    with lock:
+                        messages.append(f"{title}，***查询豆瓣ID失败***")
+                        failed.append(item)
+                    return None
+                if douban_id == "0":  # 豆瓣ID为0的直接跳过
+                    logger.info(f"ℹ️ 豆瓣ID为0: {title} (IMDB: {item['imdb_id']})，跳过...")
+                    return None
+                if douban_id:
+                    logger.info(f"✅ 找到豆瓣ID: {title} -> 豆瓣ID: {douban_id} (IMDB: {item['imdb_id']})")
+            if not douban_id:
+                logger.error(f"未找到豆瓣ID: {title} (IMDB: {item.get('imdb_id')})")
+                return None
+            if remote_ids is not None and str(douban_id) in remote_ids:
+                self._record(item, status, douban_id)
+                logger.info(f"ℹ️ 豆瓣上已是{label}: {title} (豆瓣ID: {douban_id})，跳过...")
+                return None
+            return item, douban_id
+
+        def mark(resolved):
+            item, douban_id = resolved
+            title = item.get("title")
+            ret = helper.set_watching_status(subject_id=douban_id, status=status, private=self.private)
+            with lock:
+                if ret:
+                    self._record(item, status, douban_id)
+                    logger.info(f"✅ {title} (豆瓣ID: {douban_id})，已标记为{label}")
+                    messages.append(f"{title}，已标记为{label}")
+                    return resolved
+                logger.error(f"⚠️ {title} (豆瓣ID: {douban_id})，标记{label}失败")
+                messages.append(f"{title}，***标记{label}失败***")
+                failed.append(resolved)
+                return None
+
+        pipeline = SyncPipeline(should_stop=self.should_stop) \
+            .add_stage("查询豆瓣ID", resolve, workers=self.resolve_workers) \
+            .add_stage(f"标记{label}", mark, workers=self.MARK_WORKERS)
+        stats = pipeline.run(pending())
+        if stats[0].received:
+            for stage_stats in stats:
+                logger.info(str(stage_stats))
+        if messages:
+            self.notify("\n".join(messages))
+        # 阶段函数中未预料的异常由流水线记录，同样计为失败
+        return stats[-1].emitted, len(failed) + sum(stage_stats.errors for stage_stats in stats)
+
+    def _evict(self, library_keys: Set[str]):
+        """
+        删除已不在媒体库中的条目的同步状态
+        """
+        evicted = self.state.evict(library_keys)
+        if evicted:
+            logger.info(f"清理了 {evicted} 条已从媒体库移除的同步状态")
+
+    # ---------------------------
+    # 反向同步：豆瓣 -> 媒体库
+    # ---------------------------
+
+    def reverse(self) -> bool:
+        """
+        把豆瓣上上次同步之后新增的看过同步到媒体库，边抓取边分批写入
+        :return: 是否全部同步成功
+        """
+        logger.info(f"⏳ 开始同步豆瓣已看数据到{self.adapter.name}...")
+        error = self.adapter.validate("reverse") or (None if self.douban_user else "豆瓣用户ID未配置，请检查设置")
+        if error:
+            logger.error(error)
+            self.notify(error)
+            return False
+        # 上次同步到的最新条目，只抓取比它更新的标记
+        watermark = self.store.get_data("reverse_watermark")
+        if watermark:
+            logger.info(f"增量同步，上次同步至: {watermark.get('title')} ({watermark.get('rating_date')})")
+
+        stats = {"fetched": 0, "processed": 0, "skipped": 0, "errors": 0}
+        target = movies = None
+        # 待写入的条目，攒够一批或超过一定时间后在一个事务中写入
+        pending_writes = []
+        pending_items: List[dict] = []
+        write_seconds = 0.0
+        last_flush = time.monotonic()
+
+        def flush():
+            nonlocal write_seconds, last_flush
+            last_flush = time.monotonic()
+            if not pending_items:
+                return
+            started = time.perf_counter()
+            try:
+                target.write(pending_writes)
+                stats["processed"] += len(pending_items)
+                # 写入成功后再记录同步状态，豆瓣上已是看过，正向同步时不需要再标记
+                for item in pending_items:
+                    self._record(item, DONE)
+            except sqlite3.Error as e:
+                logger.error(f"❌ 写入{self.adapter.name}时数据库错误: {e}")
+                stats["errors"] += len(pending_items)
+                target.discard(pending_writes)
+            write_seconds += time.perf_counter() - started
+            pending_writes.clear()
+            pending_items.clear()
+
+        try:
+            target = self.adapter.open_target()
+            logger.info(f"正在获取豆瓣用户 {self.douban_user} 的已看数据...")
+            movies = self.adapter.douban_movies(self.helper, self.douban_user, watermark)
+            for movie in movies:
+                stats["fetched"] += 1
+                if self.should_stop():
+                    logger.info("检测到中断请求，停止同步已看状态...")
+                    break
+                # 获取条目详情失败时无法判断是否在媒体库中，计为失败，水位不推进，下次重新抓取
+                if movie.get("error"):
+                    logger.error(f"❌ 获取豆瓣条目详情失败: {movie.get('title')} (豆瓣ID: {movie.get('douban_id')})，"
+                                 f"下次同步重试")
+                    stats["errors"] += 1
+                    continue
+                item = target.match(movie)
+                if not item:
+                    stats["skipped"] += 1
+                    continue
+                if self.adapter.reverse_skip_synced and self.status_of(item) == DONE:
+                    logger.info(f"ℹ️ 已处理过: {item.get('title')}，跳过...")
+                    stats["skipped"] += 1
+                    continue
+                writes = target.plan(item)
+                if not writes:
+                    # 补记同步状态，正向同步时不再重复标记豆瓣
+                    if self.status_of(item) != DONE:
+                        self._record(item, DONE)
+                    logger.info(f"ℹ️ 已同步过: {item.get('title')}，跳过")
+                    stats["skipped"] += 1
+                    continue
+                pending_writes.extend(writes)
+                pending_items.append(item)
+                if len(pending_items) >= self.adapter.write_batch \
+                        or (self.adapter.write_interval is not None
+                            and time.monotonic() - last_flush >= self.adapter.write_interval):
+                    flush()
+            # 写入剩余的条目
+            flush()
+        except SyncError as e:
+            logger.error(str(e))
+            self.notify(str(e))
+            return False
+        except Exception as e:
+            logger.error(f"❌ 同步过程中发生严重错误: {e}")
+            self.notify(f"同步过程中发生错误: {str(e)[:100]}...")
+            raise
+        finally:
+            # 停止后台抓取并关闭数据库连接
+            if movies:
+                movies.close()
+            if target:
+                target.close()
+            self.state.flush()
+
+        if not stats["fetched"]:
+            if watermark and movies.complete:
+                logger.info("上次同步后豆瓣没有新增已看数据")
+                return True
+            logger.warning("未获取到豆瓣已看数据")
+            self.notify("未获取到豆瓣已看数据，请检查豆瓣用户ID和cookie配置")
+            return False
+
+        rate = stats["processed"] / write_seconds if write_seconds else 0
+        logger.info(f"同步完成统计: 获取豆瓣已看 {stats['fetched']} 条，成功处理 {stats['processed']} 条，"
+                    f"跳过 {stats['skipped']} 条，失败 {stats['errors']} 条，"
+                    f"写入耗时 {write_seconds:.2f} 秒，{rate:.0f} 条/秒")
+        self.notify(f"豆瓣已看数据同步完成！\n成功处理: {stats['processed']} 条\n"
+                    f"跳过: {stats['skipped']} 条\n失败: {stats['errors']} 条")
+
+        # 完整处理完才推进水位，下次只抓取更新的标记
+        newest = movies.newest
+        completed = movies.complete and not self.should_stop() and not stats["errors"]
+        if completed and newest:
+            self.store.save_data("reverse_watermark", {
+                "douban_id": newest.get("douban_id"),
+                "rating_date": newest.get("rating_date"),
+                "title": newest.get("title"),
+            })
+        return completed
+
+    # ---------------------------
+    # 水位与同步进度
+    # ---------------------------
+
+    def _get_watermark(self, kind: str):
+        """
+        获取上次同步成功时的增量标记，返回 None 表示需要完整扫描
+        配置变化或距上次完整扫描超过 FULL_SCAN_INTERVAL 时完整扫描一次
+        """
+        watermark = (self.store.get_data("sync_watermark") or {}).get(kind)
+        if not watermark or watermark.get("key") != self.adapter.config_key():
+            return None
+        if time.time() - watermark.get("full_scan_time", 0) > self.FULL_SCAN_INTERVAL:
+            return None
+        return watermark.get("value")
+
+    def _save_watermark(self, kind: str, value, full_scan: bool):
+        watermarks = self.store.get_data("sync_watermark") or {}
+        previous = watermarks.get(kind) or {}
+        watermarks[kind] = {
+            "key": self.adapter.config_key(),
+            "value": value,
+            "full_scan_time": time.time() if full_scan else previous.get("full_scan_time", 0),
+        }
+        self.store.save_data("sync_watermark", watermarks)
+
+    def _load_checkpoint(self, kind: str) -> Optional[dict]:
+        """
+        获取上次未完成的同步进度，配置变化后不再使用
+        """
+        checkpoint = (self.store.get_data("sync_checkpoint") or {}).get(kind)
+        if not checkpoint or checkpoint.get("key") != self.adapter.config_key():
+            return None
+        # 旧版本记录的进度格式不同，重新扫描
+        if not all(isinstance(item, dict) for item in checkpoint.get("items") or []):
+            return None
+        return checkpoint
+
+    def _save_checkpoint(self, kind: str, since, high_water, items: List[dict]):
+        """
+        记录查询到的待处理条目，已处理的进度由同步状态和豆瓣ID缓存记录
+        """
+        checkpoints = self.store.get_data("sync_checkpoint") or {}
+        checkpoints[kind] = {
+            "key": self.adapter.config_key(),
+            "since": since,
+            "high_water": high_water,
+            "items": items,
+        }
+        self.store.save_data("sync_checkpoint", checkpoints)
+
+    def _clear_checkpoint(self, kind: str = None):
+        """
+        :param kind: 为 None 时清除所有进度
+        """
+        checkpoints = self.store.get_data("sync_checkpoint") or {}
+        if kind is None:
+            checkpoints = {}
+        checkpoints.pop(kind, None)
+        if checkpoints:
+            self.store.save_data("sync_checkpoint", checkpoints)
+        else:
+            self.store.del_data("sync_checkpoint")
+
+    def clear(self):
+        """
+        清理缓存：删除同步状态、水位和进度，下次完整同步
+        """
+        self.state.clear()
+        for key in ("reverse_watermark", "db_fingerprint", "sync_watermark"):
+            self.store.del_data(key)
+        self._clear_checkpoint()
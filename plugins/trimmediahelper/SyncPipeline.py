@@ -0,0 +1,180 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, List, Optional
+
+from app.log import logger
+
+
+class StageStats:
+    """
+    单个阶段的处理统计
+    """
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        # 收到、传给下一阶段、丢弃（返回 None）、出错的条目数
+        self.received = 0
+        self.emitted = 0
+        self.dropped = 0
+        self.errors = 0
+        # 各工作线程处理条目的累计耗时（秒）
+        self.busy = 0.0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def throughput(self) -> float:
+        """
+        每秒处理的条目数
+        """
+        elapsed = self.elapsed
+        return self.received / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (f"{self.name}: 处理 {self.received} 条（通过 {self.emitted}，丢弃 {self.dropped}，出错 {self.errors}），"
+                f"{self.workers} 线程，耗时 {self.elapsed:.1f} 秒，{self.throughput:.2f} 条/秒")
+
+
+class _Stage:
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int, queue_size: int):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.stats = StageStats(name, workers)
+        self.remaining = workers
+
+
+class SyncPipeline:
+    """
+    多阶段流式处理管道：数据源 -> 阶段1 -> 阶段2 -> ...
+    阶段之间用有界队列连接，每个阶段有独立的工作线程数；下游处理变慢时队列写满，上游随之等待（背压），
+    每个条目处理完立即交给下一阶段，不必等上一阶段全部完成
+    阶段函数返回 None 表示丢弃该条目；抛出异常时记录日志并丢弃，不影响其它条目
+    should_stop 返回 True 后数据源停止产出，各阶段丢弃尚未处理的条目并尽快退出
+    """
+
+    # 结束标记
+    _DONE = object()
+    # 等待队列时检查停止标志的间隔（秒）
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, should_stop: Callable[[], bool] = None):
+        self.should_stop = should_stop or (lambda: False)
+        self._stages: List[_Stage] = []
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, func: Callable[[Any], Any], workers: int = 1,
+                  queue_size: int = None) -> "SyncPipeline":
+        """
+        :param func: 处理单个条目，返回传给下一阶段的结果
+        :param workers: 工作线程数
+        :param queue_size: 阶段输入队列的长度，默认为工作线程数的两倍
+        """
+        workers = max(1, int(workers))
+        self._stages.append(_Stage(name, func, workers, queue_size or workers * 2))
+        return self
+
+    @property
+    def stats(self) -> List[StageStats]:
+        return [stage.stats for stage in self._stages]
+
+    def _put(self, stage: _Stage, item) -> bool:
+        """
+        放入阶段的输入队列，队列满时等待；停止后放弃并返回 False
+        """
+        while True:
+            try:
+                stage.queue.put(item, timeout=self.POLL_INTERVAL)
+                return True
+            except queue.Full:
+                if self.should_stop():
+                    return False
+
+    def _finish(self, index: int):
+        """
+        阶段的一个工作线程退出，最后一个退出时通知下一阶段
+        """
+        stage = self._stages[index]
+        with self._lock:
+            stage.remaining -= 1
+            last = stage.remaining == 0
+        if not last:
+            return
+        stage.stats.finished = time.monotonic()
+        if index + 1 < len(self._stages):
+            following = self._stages[index + 1]
+            for _ in range(following.workers):
+                # 结束标记必须送达，下游一直在消费，不会永久阻塞
+                following.queue.put(self._DONE)
+
+    def _work(self, index: int):
+        stage = self._stages[index]
+        following = self._stages[index + 1] if index + 1 < len(self._stages) else None
+        stats = stage.stats
+        try:
+            while True:
+                item = stage.queue.get()
+                if item is self._DONE:
+                    break
+                with stats._lock:
+                    stats.received += 1
+                    if stats.started is None:
+                        stats.started = time.monotonic()
+                if self.should_stop():
+                    with stats._lock:
+                        stats.dropped += 1
+                    continue
+                started = time.monotonic()
+                try:
+                    result = stage.func(item)
+                except Exception as e:
+                    logger.error(f"{stage.name} 处理失败: {e}")
+                    result = None
+                    with stats._lock:
+                        stats.errors += 1
+                with stats._lock:
+                    stats.busy += time.monotonic() - started
+                # 送入下一阶段后才计为通过，停止时未能送入的计为丢弃
+                emitted = result is not None and (not following or self._put(following, result))
+                with stats._lock:
+                    if emitted:
+                        stats.emitted += 1
+                    else:
+                        stats.dropped += 1
+        finally:
+            self._finish(index)
+
+    def run(self, source: Iterable) -> List[StageStats]:
+        """
+        在当前线程中读取数据源并送入第一个阶段，所有阶段处理完后返回各阶段的统计
+        """
+        if not self._stages:
+            return []
+        threads = []
+        for index, stage in enumerate(self._stages):
+            for number in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(index,),
+                                          name=f"pipeline-{stage.name}-{number}", daemon=True)
+                thread.start()
+                threads.append(thread)
+        first = self._stages[0]
+        try:
+            for item in source:
+                if self.should_stop() or not self._put(first, item):
+                    break
+        finally:
+            for _ in range(first.workers):
+                first.queue.put(self._DONE)
+            for thread in threads:
+                thread.join()
+        return self.stats
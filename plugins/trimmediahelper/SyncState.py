@@ -0,0 +1,208 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.log import logger
+
+
+class SyncState:
+    """
+    同步状态存储：记录每个条目已同步到豆瓣的状态，代替整体读写的缓存字典
+    按 key 查询走主键索引，启动时不加载历史数据，耗时与历史记录数量无关
+    写入先放在内存中，攒够 flush_size 条或调用 flush 时在一个事务中提交，中途崩溃最多丢失一批
+
+    除主键 key 外，还可记录条目的豆瓣ID、标题、IMDb ID 作为辅助索引，
+    不同来源（媒体库、豆瓣收藏）的条目可通过 find 按任一已知的ID查询同一条同步状态
+    """
+
+    # 每批提交的条目数
+    FLUSH_SIZE = 20
+    # 辅助索引字段
+    FIELDS = ("douban_id", "title", "imdb_id")
+
+    def __init__(self, db_file: Path, flush_size: int = FLUSH_SIZE, legacy_field: str = None):
+        """
+        :param legacy_field: 旧版本只记录了 key 时，key 对应的辅助索引字段，升级表结构时用 key 填充该字段
+        """
+        self._flush_size = flush_size
+        self._lock = threading.Lock()
+        # 尚未提交的写入：key -> (status, douban_id, title, imdb_id)
+        self._pending: Dict[str, Tuple] = {}
+        Path(db_file).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_file), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                updated_at INTEGER NOT NULL,
+                douban_id TEXT,
+                title TEXT,
+                imdb_id TEXT
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sync_state)")}
+        for field in self.FIELDS:
+            if field not in columns:
+                self._conn.execute(f"ALTER TABLE sync_state ADD COLUMN {field} TEXT")
+                if field == legacy_field:
+                    self._conn.execute(f"UPDATE sync_state SET {field} = key")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sync_state_status ON sync_state (status)"
+        )
+        for field in self.FIELDS:
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_sync_state_{field} ON sync_state ({field})"
+            )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        查询条目的同步状态，未同步过时返回 None
+        """
+        if not key:
+            return None
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key][0]
+            row = self._conn.execute(
+                "SELECT status FROM sync_state WHERE key = ?", (str(key),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def find(self, douban_id: str = None, title: str = None, imdb_id: str = None) -> Optional[str]:
+        """
+        按豆瓣ID、IMDb ID、标题的顺序查询同步状态，返回第一个命中的状态
+        标题不唯一（同名的翻拍、同名的季），只匹配没有记录豆瓣ID的条目
+        """
+        with self._lock:
+            for pending_status, pending_douban_id, pending_title, pending_imdb_id in self._pending.values():
+                if (douban_id and pending_douban_id == str(douban_id)) \
+                        or (imdb_id and pending_imdb_id == imdb_id) \
+                        or (title and not pending_douban_id and pending_title == title):
+                    return pending_status
+            queries = []
+            if douban_id:
+                queries.append(("douban_id = ?", str(douban_id)))
+            if imdb_id:
+                queries.append(("imdb_id = ?", imdb_id))
+            if title:
+                queries.append(("title = ? AND douban_id IS NULL", title))
+            for condition, value in queries:
+                row = self._conn.execute(
+                    f"SELECT status FROM sync_state WHERE {condition} LIMIT 1", (value,)
+                ).fetchone()
+                if row:
+                    return row[0]
+        return None
+
+    def set(self, key: str, status: str, douban_id: str = None, title: str = None, imdb_id: str = None):
+        """
+        记录条目的同步状态，攒够一批后自动提交
+        """
+        if not key:
+            return
+        with self._lock:
+            self._pending[str(key)] = (status, str(douban_id) if douban_id else None, title, imdb_id)
+            if len(self._pending) >= self._flush_size:
+                self._flush()
+
+    def flush(self):
+        """
+        提交所有未提交的写入
+        """
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        now = int(time.time())
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    """
+                    INSERT INTO sync_state (key, status, updated_at, douban_id, title, imdb_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        status = excluded.status,
+                        updated_at = excluded.updated_at,
+                        douban_id = COALESCE(excluded.douban_id, douban_id),
+                        title = COALESCE(excluded.title, title),
+                        imdb_id = COALESCE(excluded.imdb_id, imdb_id)
+                    """,
+                    [(key, status, now, *fields) for key, (status, *fields) in self._pending.items()],
+                )
+            self._pending.clear()
+        except sqlite3.Error as e:
+            logger.warning(f"写入同步状态失败: {e}")
+
+    def count(self, status: str = None) -> int:
+        with self._lock:
+            self._flush()
+            if status is None:
+                return self._conn.execute("SELECT COUNT(*) FROM sync_state").fetchone()[0]
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM sync_state WHERE status = ?", (status,)
+            ).fetchone()[0]
+
+    def evict(self, keep_keys: Iterable[str]) -> int:
+        """
+        删除不在 keep_keys 中的条目，用于清理已从媒体库中移除的条目
+        :return: 删除的条目数
+        """
+        with self._lock:
+            self._flush()
+            try:
+                with self._conn:
+                    self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep_keys (key TEXT PRIMARY KEY)")
+                    self._conn.execute("DELETE FROM keep_keys")
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO keep_keys (key) VALUES (?)",
+                        ((str(key),) for key in keep_keys if key),
+                    )
+                    deleted = self._conn.execute(
+                        "DELETE FROM sync_state WHERE key NOT IN (SELECT key FROM keep_keys)"
+                    ).rowcount
+                    self._conn.execute("DELETE FROM keep_keys")
+                return deleted
+            except sqlite3.Error as e:
+                logger.warning(f"清理同步状态失败: {e}")
+                return 0
+
+    def migrate(self, legacy: Optional[dict], field: str = None) -> int:
+        """
+        导入旧版本保存在插件数据中的缓存字典（key -> status），已存在的条目不覆盖
+        :param field: 字典的 key 对应的辅助索引字段
+        :return: 导入的条目数
+        """
+        if not legacy:
+            return 0
+        if field is not None and field not in self.FIELDS:
+            raise ValueError(f"未知的索引字段: {field}")
+        columns = "key, status, updated_at" + (f", {field}" if field else "")
+        placeholders = "?, ?, ?" + (", ?" if field else "")
+        with self._lock:
+            now = int(time.time())
+            with self._conn:
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    f"INSERT OR IGNORE INTO sync_state ({columns}) VALUES ({placeholders})",
+                    ((str(key), status, now) + ((str(key),) if field else ())
+                     for key, status in legacy.items() if key and status),
+                )
+                return self._conn.total_changes - before
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            with self._conn:
+                self._conn.execute("DELETE FROM sync_state")
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._conn.close()
@@ -0,0 +1,303 @@
+import sqlite3
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from app.log import logger
+
+from app.plugins.trimmediahelper.MediaDatabase import connect, read_transaction
+from app.plugins.trimmediahelper.SyncEngine import MediaSourceAdapter, MovieStream, SyncError, WatchedTarget
+
+# 豆瓣错误的 IMDb ID 映射表（正确的 -> 豆瓣上错误的）
+INCORRECT_IMDB_MAP = {
+    "tt0139774": "tt0377169",  # 龙珠GT 正确->豆瓣
+    "tt0377169": "tt0139774",  # 龙珠GT 豆瓣->正确
+    # 可以继续添加其他错误的映射
+}
+
+# 豆瓣不存在的 IMDb ID 列表（直接跳过）
+NONEXISTENT_IMDB_LIST = [
+    "tt6475714",  # 怪物猎人
+    "tt13016388",  # 三体第一季
+    "tt6773596",  # 反击第六季
+    "tt8356942",  # 355：谍影特攻
+
+    # 可以继续添加其他不存在的 IMDb ID
+]
+
+# 有变化的在看剧集：看过其中的单集，但没有看过整季或整部剧
+WATCHING_SQL = """
+    WITH watched_items AS (
+        SELECT DISTINCT iup.item_guid
+        FROM item_user_play iup
+        INNER JOIN user u ON iup.user_guid = u.guid
+        WHERE iup.watched = 1
+          AND u.username = :username
+          AND iup.type IN ('Episode', 'Season', 'TV')
+          AND iup.update_time > :since
+    ),
+    excluded_imdb AS (
+        -- 同一 IMDb ID 下看过整季或整部剧的不算在看，需对照该用户全部的观看记录判断
+        -- item.imdb_id 没有索引，先一次性算出排除集合，避免逐行关联子查询
+        SELECT DISTINCT i2.imdb_id
+        FROM item_user_play iup2
+        INNER JOIN user u2 ON iup2.user_guid = u2.guid
+        INNER JOIN item i2 ON iup2.item_guid = i2.guid
+        WHERE iup2.watched = 1
+          AND u2.username = :username
+          AND iup2.type IN ('Episode', 'Season', 'TV')
+          AND i2.type IN ('TV', 'Season')
+          AND i2.imdb_id IS NOT NULL
+    ),
+    filtered_items AS (
+        SELECT i.*
+        FROM item i
+        WHERE i.guid IN (SELECT item_guid FROM watched_items)
+          AND i.imdb_id IS NOT NULL
+          AND i.imdb_id != ''
+          AND i.imdb_id NOT IN (SELECT imdb_id FROM excluded_imdb)
+    )
+    -- 直接连接查询父级数据
+    SELECT DISTINCT p.imdb_id, p.title
+    FROM filtered_items fi
+    INNER JOIN item p ON fi.parent_guid = p.guid
+    WHERE fi.parent_guid IS NOT NULL
+      AND fi.parent_guid != ''
+    ORDER BY p.type, p.title;
+"""
+
+# 有变化的已看条目，同一 IMDb ID 只取一条
+DONE_SQL = """
+    WITH changed_items AS (
+        SELECT i.guid, i.imdb_id, i.title
+        FROM item i
+        WHERE i.guid IN (
+            SELECT DISTINCT iup.item_guid
+            FROM item_user_play iup
+            INNER JOIN user u ON iup.user_guid = u.guid
+            WHERE iup.watched = 1
+              AND u.username = :username
+              AND iup.update_time > :since
+        )
+        AND i.type IN ('Movie', 'TV', 'Season')
+    )
+    SELECT
+        ci.imdb_id, ci.title
+    FROM
+        changed_items ci
+    WHERE
+        -- 同一 IMDb ID 只取 guid 最小的条目，分组只需覆盖有变化的 IMDb ID
+        ci.guid IN (
+            SELECT MIN(guid)
+            FROM item
+            WHERE type IN ('Movie', 'TV', 'Season')
+              AND imdb_id IN (SELECT imdb_id FROM changed_items)
+              AND imdb_id IS NOT NULL
+              AND imdb_id != ''
+            GROUP BY imdb_id
+        )
+"""
+
+
+class TrimMediaAdapter(MediaSourceAdapter):
+    """
+    飞牛影视：观看记录在 item_user_play 中，以 IMDb ID 关联豆瓣条目，同步状态以 IMDb ID 为主键
+    """
+
+    name = "飞牛影视"
+    # 反向同步时每个事务最多写入的条目数，以及两次写入的最长间隔（秒）
+    write_batch = 200
+    write_interval = 5
+    reverse_skip_synced = True
+
+    def __init__(self, db_path: str, username: str, concurrency: int = None,
+                 should_stop: Callable[[], bool] = None):
+        """
+        :param concurrency: 反向同步时抓取豆瓣条目详情的并发数（AsyncDoubanHelper）
+        """
+        self.db_path = db_path
+        self.username = username
+        self.concurrency = concurrency
+        self.should_stop = should_stop
+
+    def config_key(self) -> str:
+        return f"{self.db_path}|{self.username}"
+
+    def validate(self, kind: str) -> Optional[str]:
+        if not self.username:
+            return "飞牛影视用户名未配置，请检查设置"
+        return None
+
+    def scan(self, kind: str, since) -> Tuple[int, List[dict], Optional[Set[str]]]:
+        sql = WATCHING_SQL if kind == "watching" else DONE_SQL
+        # 在只读事务内取完结果，之后请求豆瓣时不占用数据库
+        with read_transaction(self.db_path) as conn:
+            rows = conn.execute(sql, {"username": self.username, "since": since or 0}).fetchall()
+            high_water = self._max_play_update_time(conn, since)
+            # 完整扫描已看时顺便取出库中所有 IMDb ID，清理已移除条目的同步状态
+            library_keys = None
+            if kind == "done" and since is None:
+                library_keys = {
+                    row[0] for row in conn.execute(
+                        "SELECT DISTINCT imdb_id FROM item WHERE imdb_id IS NOT NULL AND imdb_id != ''"
+                    )
+                }
+                # 同步状态中记录的可能是修正后的 IMDb ID
+                library_keys |= {INCORRECT_IMDB_MAP[imdb_id]
+                                 for imdb_id in library_keys if imdb_id in INCORRECT_IMDB_MAP}
+
+        items = []
+        for imdb_id, title in rows:
+            if not imdb_id:  # IMDb ID 为空直接跳过
+                logger.info(f"ℹ️ IMDb ID 为空: {title}，跳过...")
+                continue
+            # 检查是否是豆瓣不存在的 IMDb ID
+            if imdb_id in NONEXISTENT_IMDB_LIST:
+                logger.info(f"⚠️ 跳过豆瓣不存在的 IMDb ID: {title} (IMDB: {imdb_id})")
+                continue
+            imdb_id = self._correct_imdb_id(imdb_id, title)
+            items.append({"key": imdb_id, "title": title, "imdb_id": imdb_id})
+        return high_water, items, library_keys
+
+    @staticmethod
+    def _correct_imdb_id(imdb_id: str, title: str) -> str:
+        """
+        修正豆瓣与飞牛影视不一致的 IMDb ID，映射表是双向的
+        """
+        corrected = INCORRECT_IMDB_MAP.get(imdb_id, imdb_id)
+        if corrected != imdb_id:
+            logger.info(f"⚠️ 检测到错误的 IMDb ID: {imdb_id} -> 修正为: {corrected} ({title})")
+        return corrected
+
+    @staticmethod
+    def _max_play_update_time(conn: sqlite3.Connection, default):
+        """
+        与同步查询在同一读事务内读取观看记录的最大更新时间，作为下次增量扫描的起点
+        """
+        row = conn.execute("SELECT MAX(update_time) FROM item_user_play").fetchone()
+        return row[0] if row and row[0] is not None else default
+
+    def douban_movies(self, helper, douban_user: str, watermark: Optional[dict]) -> MovieStream:
+        # 只有反向同步需要抓取豆瓣，扫描和写入观看记录不依赖 HTTP 客户端
+        from app.plugins.trimmediahelper.AsyncDoubanHelper import AsyncDoubanHelper
+        from app.plugins.trimmediahelper.DoubanHelper import CollectionCrawl
+
+        # 列表页逐页抓取，条目详情（IMDb ID）并发查询，抓取结果记录在本次同步自己的 crawl 中
+        client = AsyncDoubanHelper(helper, concurrency=self.concurrency, should_stop=self.should_stop)
+        crawl = CollectionCrawl()
+        return MovieStream(
+            client.stream_user_movies(username=douban_user, status='collect', watermark=watermark, crawl=crawl),
+            complete=lambda: crawl.complete,
+            newest=lambda: crawl.newest,
+        )
+
+    def open_target(self) -> "TrimMediaTarget":
+        return TrimMediaTarget(self.db_path, self.username)
+
+
+class TrimMediaTarget(WatchedTarget):
+    """
+    把豆瓣看过写入飞牛影视的观看记录：已有记录的更新为已看，没有记录的插入一条已看记录
+    """
+
+    def __init__(self, db_path: str, username: str):
+        self.username = username
+        self.conn = connect(db_path, readonly=False)
+        try:
+            self._load()
+        except Exception:
+            self.conn.close()
+            raise
+
+    def _load(self):
+        row = self.conn.execute("SELECT guid FROM user WHERE username = ?", (self.username,)).fetchone()
+        if not row:
+            raise SyncError(f"未找到飞牛影视用户 {self.username}，请检查用户名")
+        self.user_guid = row[0]
+        logger.info(f"获取到用户 {self.username} 的 GUID: {self.user_guid}")
+
+        # 预加载 imdb_id -> [(guid, type)] 索引和用户已有的观看记录，避免逐条查询
+        # 两次查询放在同一个读事务中，保证数据一致
+        self.conn.execute("BEGIN")
+        self.item_index: Dict[str, List[Tuple[str, str]]] = {}
+        for imdb_id, item_guid, item_type in self.conn.execute("""
+            SELECT imdb_id, guid, type
+            FROM item
+            WHERE imdb_id IS NOT NULL AND imdb_id != ''
+              AND type IN ('Movie', 'Episode', 'Season')
+        """):
+            self.item_index.setdefault(imdb_id, []).append((item_guid, item_type))
+        # item_guid -> 是否已看
+        self.played = {}
+        for item_guid, watched in self.conn.execute("""
+            SELECT item_guid, watched
+            FROM item_user_play
+            WHERE user_guid = ?
+        """, (self.user_guid,)):
+            self.played[item_guid] = self.played.get(item_guid) or watched
+        self.conn.commit()
+        logger.info(f"飞牛影视库中共 {len(self.item_index)} 个 IMDb 条目，用户已有 {len(self.played)} 条观看记录")
+
+    def match(self, movie: dict) -> Optional[dict]:
+        douban_id = movie.get('douban_id')
+        imdb_id = movie.get('imdb_id')
+        title = movie.get('title')
+        if not imdb_id:
+            logger.info(f"ℹ️ 跳过 {title} (豆瓣ID: {douban_id}) - 无IMDb ID")
+            return None
+        # 将豆瓣错误的IMDB转换回飞牛里面正确的
+        imdb_id = TrimMediaAdapter._correct_imdb_id(imdb_id, title)
+        if imdb_id not in self.item_index:
+            logger.info(f"ℹ️ 未找到IMDb ID为 {imdb_id} 的项目: {title}")
+            return None
+        return {"key": imdb_id, "title": title, "imdb_id": imdb_id, "douban_id": douban_id}
+
+    def plan(self, item: dict) -> list:
+        writes = []
+        for item_guid, item_type in self.item_index[item["imdb_id"]]:
+            if item_guid not in self.played:
+                # 不存在观看记录，插入
+                writes.append(("insert", item_guid, item_type))
+                logger.info(f"✅ 插入观看记录: {item['title']} (guid: {item_guid}, type: {item_type})")
+            elif not self.played[item_guid]:
+                # 存在且watched=0，更新
+                writes.append(("update", item_guid, item_type))
+                logger.info(f"✅ 更新观看状态: {item['title']} (guid: {item_guid})")
+            self.played[item_guid] = 1
+        return writes
+
+    def write(self, writes: list):
+        updates = [(item_guid, self.user_guid) for action, item_guid, _ in writes if action == "update"]
+        inserts = [(item_guid, self.user_guid, item_type)
+                   for action, item_guid, item_type in writes if action == "insert"]
+        with self.conn:
+            self.conn.executemany("""
+                UPDATE item_user_play
+                SET watched = 1,
+                    update_time = CAST(strftime('%s', 'now') AS INTEGER)
+                WHERE item_guid = ?
+                  AND user_guid = ?
+            """, updates)
+            self.conn.executemany("""
+                INSERT INTO item_user_play (
+                    item_guid, user_guid, ts, watched,
+                    media_guid, video_guid, audio_guid, subtitle_guid,
+                    direct_link_audio_index, resolution, bitrate, type,
+                    visible, create_time, update_time
+                ) VALUES (
+                    ?, ?, 0, 1,
+                    '', '', '', '',
+                    -1, '', 0, ?,
+                    1, CAST(strftime('%s', 'now') AS INTEGER) * 1000, CAST(strftime('%s', 'now') AS INTEGER) * 1000
+                )
+            """, inserts)
+        logger.info(f"写入 {len(updates)} 条更新、{len(inserts)} 条新增观看记录")
+
+    def discard(self, writes: list):
+        # 未写入的记录下次重新处理
+        for action, item_guid, _ in writes:
+            if action == "update":
+                self.played[item_guid] = 0
+            else:
+                self.played.pop(item_guid, None)
+
+    def close(self):
+        self.conn.close()
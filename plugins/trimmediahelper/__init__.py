@@ -2,7 +2,14 @@ from datetime import datetime, timedelta
 import sqlite3
 import json
 from app.plugins.trimmediahelper.DoubanHelper import *
-from enum import Enum
+from app.plugins.trimmediahelper.DoubanCache import DoubanCache
+from app.plugins.trimmediahelper.DoubanClient import shared_cache
+from app.plugins.trimmediahelper.MediaDatabase import check_unchanged
+from app.plugins.trimmediahelper.SyncEngine import SyncEngine
+from app.plugins.trimmediahelper.SyncState import SyncState
+from app.plugins.trimmediahelper.TrimMediaAdapter import TrimMediaAdapter
+
+import threading
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -17,11 +24,6 @@ from typing import Any, List, Dict, Tuple, Optional
 from app.log import logger
 import time
 
-# 豆瓣状态
-class DoubanStatus(Enum):
-    WATCHING = "do"
-    DONE = "collect"
-
 class TrimMediaHelper(_PluginBase):
     # 插件名称
     plugin_name = "飞牛影视豆瓣同步"
@@ -30,7 +32,7 @@ class TrimMediaHelper(_PluginBase):
     # 插件图标
     plugin_icon = "fnos.png"
     # 插件版本
-    plugin_version = "2.0"
+    plugin_version = "2.1"
     # 插件作者
     plugin_author = "superxyj2021"
     # 作者主页
@@ -51,33 +53,29 @@ class TrimMediaHelper(_PluginBase):
     _clean_cache = False
     _private = False
     _reverse_sync_douban_status = False
-    _douban_helper = None
-    _cached_data: dict = {}
+    _douban_helper: Optional[DoubanHelper] = None
+    _douban_helper_lock = threading.Lock()
+    _warm_up_thread: Optional[threading.Thread] = None
+    _douban_cache: Optional[DoubanCache] = None
+    _sync_state: Optional[SyncState] = None
     _db_path = ""
     _cookie = ""
     _trimmedia_user = ""
     _douban_user = ""
+    # 默认的豆瓣并发请求数：反向同步抓取条目详情、正向同步查询豆瓣ID的并发数
+    DOUBAN_CONCURRENCY = 3
+    _douban_concurrency = DOUBAN_CONCURRENCY
     # 定时器
     _scheduler: Optional[BackgroundScheduler] = None
     _should_stop = False
 
-    # 豆瓣错误的 IMDb ID 映射表（正确的 -> 豆瓣上错误的）
-    _incorrect_imdb_map = {
-        "tt0139774": "tt0377169",  # 龙珠GT 正确->豆瓣
-        "tt0377169": "tt0139774",  # 龙珠GT 豆瓣->正确
-        # 可以继续添加其他错误的映射
-    }
-
-    # 豆瓣不存在的 IMDb ID 列表（直接跳过）
-    _nonexistent_imdb_list = [
-        "tt6475714",  # 怪物猎人
-        "tt13016388",  # 三体第一季
-        "tt6773596",  # 反击第六季   
-        "tt8356942",  # 355：谍影特攻 
-        
-        # 可以继续添加其他不存在的 IMDb ID
-    ]
-    
+    # 判断数据库是否有变化的信号：观看记录的最大更新时间、已看数量和条目数量
+    CHANGE_SIGNAL_SQL = """
+        SELECT
+            (SELECT MAX(update_time) FROM item_user_play),
+            (SELECT COUNT(*) FROM item_user_play WHERE watched = 1),
+            (SELECT COUNT(*) FROM item)
+    """
     def init_plugin(self, config: dict = None):
         self._should_stop = False
         # 停止现有任务
@@ -96,19 +94,26 @@ class TrimMediaHelper(_PluginBase):
             self._reverse_sync_douban_status = config.get("reverse_sync_douban_status")
             self._trimmedia_user = config.get("trimmedia_user")
             self._douban_user = config.get("douban_user")
-            self._douban_helper = DoubanHelper(user_cookie=self._cookie)
+            try:
+                self._douban_concurrency = max(1, int(config.get("douban_concurrency") or self.DOUBAN_CONCURRENCY))
+            except (TypeError, ValueError):
+                self._douban_concurrency = self.DOUBAN_CONCURRENCY
+            # IMDb ID -> 豆瓣ID 持久化缓存，不受"清理缓存数据"影响
+            if not self._douban_cache:
+                self._douban_cache = DoubanCache(self.get_data_path() / "douban_cache.db")
+            # 加载时即登记为进程内共享缓存，其它插件创建豆瓣助手时使用
+            self._douban_cache = shared_cache(self._douban_cache)
+            # 已同步条目的状态（IMDb ID -> 豆瓣状态），按需查询，不在启动时加载
+            if not self._sync_state:
+                self._sync_state = SyncState(self.get_data_path() / "sync_state.db")
+                self._migrate_cached_data()
+            # 豆瓣助手在第一次使用时才创建，避免加载插件时访问豆瓣
+            self._douban_helper = None
 
-        # 获取历史数据
-        self._cached_data = (
-            self.get_data("trimmediahelper")
-            if self.get_data("trimmediahelper") is not None
-            else dict()
-        )
         # 加载模块
         if self._onlyonce:
             if self._clean_cache:
-                self._cached_data = {}
-                self.save_data("trimmediahelper", self._cached_data)
+                self._sync_engine().clear()
                 self._clean_cache = False
             # 检查数据库路径是否存在
             path = Path(self._db_path)
@@ -161,6 +166,7 @@ class TrimMediaHelper(_PluginBase):
                 "reverse_sync_douban_status": self._reverse_sync_douban_status,
                 "trimmedia_user": self._trimmedia_user,
                 "douban_user": self._douban_user,
+                "douban_concurrency": self._douban_concurrency,
             }
         )
 
@@ -255,545 +261,118 @@ class TrimMediaHelper(_PluginBase):
         if self._reverse_sync_douban_status:
             self.reverse_sync_douban_status()
         if self._sync_douban_status:
-            self.sync_douban_status()
-
-
-    def set_douban_watching(self):
-        logger.info("⏳ 开始同步在看状态...")
-        watching_douban_id = []
-        try:
-            conn = sqlite3.connect(self._db_path)
-            cursor = conn.cursor()
-
-            # 使用新的 SQL 查询语句
-            sql = """
-                WITH watched_items AS (
-                    SELECT DISTINCT iup.item_guid
-                    FROM item_user_play iup
-                    INNER JOIN user u ON iup.user_guid = u.guid
-                    WHERE iup.watched = 1
-                      AND u.username = ?
-                      AND iup.type IN ('Episode', 'Season', 'TV')
-                ),
-                item_with_groups AS (
-                    SELECT i.*
-                    FROM item i
-                    WHERE i.guid IN (SELECT item_guid FROM watched_items)
-                      AND i.imdb_id IS NOT NULL
-                      AND i.imdb_id != ''
-                ),
-                filtered_items AS (
-                    SELECT iwg.*
-                    FROM item_with_groups iwg
-                    WHERE iwg.imdb_id IN (
-                        SELECT imdb_id
-                        FROM item_with_groups
-                        GROUP BY imdb_id
-                        HAVING COUNT(CASE WHEN type IN ('TV', 'Season') THEN 1 END) = 0
-                    )
-                )
-                -- 直接连接查询父级数据
-                SELECT DISTINCT p.imdb_id, p.title
-                FROM filtered_items fi
-                INNER JOIN item p ON fi.parent_guid = p.guid
-                WHERE fi.parent_guid IS NOT NULL
-                  AND fi.parent_guid != ''
-                ORDER BY p.type, p.title;
-            """
-            cursor.execute(sql, (self._trimmedia_user,))
-            results = cursor.fetchall()
-            
-            for row in results:
-                if self._should_stop:
-                    logger.info("检测到中断请求，停止同步在看状态...")
-                    break
-                    
-                imdb_id = row[0]
-                title = row[1]
-                
-                # 1. 先用 imdb_id 判断有没有处理过
-                if self._cached_data.get(imdb_id) is not None:
-                    logger.info(f"ℹ️ 已处理过: {title} (IMDB: {imdb_id})，跳过...")
-                    continue
-                
-                # 检查是否是豆瓣不存在的 IMDb ID
-                if imdb_id in self._nonexistent_imdb_list:
-                    logger.info(f"⚠️ 跳过豆瓣不存在的 IMDb ID: {title} (IMDB: {imdb_id})")
-                    # 将其标记为已处理，避免重复检查
-                    self._cached_data[imdb_id] = DoubanStatus.WATCHING.value
-                    continue
-
-                # 检查并修正错误的 IMDb ID
-                corrected_imdb_id = self._incorrect_imdb_map.get(imdb_id, imdb_id)
-                if corrected_imdb_id != imdb_id:
-                    logger.info(f"⚠️ 检测到错误的 IMDb ID: {imdb_id} -> 修正为: {corrected_imdb_id} ({title})")
-                    imdb_id = corrected_imdb_id
-                            
-                
-                # 2. 调用 get_douban_id 方法通过 imdb_id 查询豆瓣 ID
-                douban_id = self._douban_helper.get_douban_id(imdb_id)
- 
-                # 相应的判断逻辑：
-                if douban_id and douban_id != "0":  # 注意：douban_id 现在是字符串
-                    watching_douban_id.append((imdb_id, douban_id, title))
-                    logger.info(f"✅ 找到豆瓣ID: {title} -> 豆瓣ID: {douban_id} (IMDB: {imdb_id})")
-                else:
-                    logger.error(f"未找到豆瓣ID: {title} (IMDB: {imdb_id})")
-                    
-        except sqlite3.Error as e:
-            logger.error(f"数据库查询错误: {e}")
-            if self._notify:
-                self.post_message(
-                    mtype=NotificationType.SiteMessage,
-                    title=f"【飞牛影视豆瓣同步】",
-                    text=f"数据库查询错误: {e}",
-                )
-            return
-
-        finally:
-            # 确保游标和连接在使用完后关闭
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
-
-        # 标记豆瓣状态
-        message = ""
-        for imdb_id, douban_id, title in watching_douban_id:
-            status = DoubanStatus.WATCHING.value
-            ret = self._douban_helper.set_watching_status(
-                subject_id=douban_id, status=status, private=self._private
-            )
-            if ret:
-                # 使用 imdb_id 作为缓存键
-                self._cached_data[imdb_id] = status
-                logger.info(f"✅ {title} (豆瓣ID: {douban_id}, IMDB: {imdb_id})，已标记为在看")
-                message += f"{title}，已标记为在看\n"
+            unchanged, fingerprint = self._check_db_unchanged()
+            if unchanged:
+                logger.info("飞牛影视数据库自上次同步后没有变化，跳过同步观影状态")
+                self.save_data("db_fingerprint", fingerprint)
+                return
+            # 同步全部成功后才记录指纹，失败的条目下次重新处理
+            if self.sync_douban_status() and fingerprint:
+                self.save_data("db_fingerprint", fingerprint)
             else:
-                logger.error(f"⚠️ {title} (豆瓣ID: {douban_id}, IMDB: {imdb_id})，标记在看失败")
-                message += f"{title}，***标记在看失败***\n"
-        
-        if self._notify and len(message) > 0:
-            self.post_message(
-                mtype=NotificationType.SiteMessage,
-                title="【飞牛影视豆瓣同步】",
-                text=message,
-            )
-        # 保存缓存数据
-        self.save_data("trimmediahelper", self._cached_data)
+                self.del_data("db_fingerprint")
 
-    def set_douban_done(self):
-        logger.info("⏳ 开始同步已看状态...")
-        watching_douban_id = []
-        
-        # 获取用户名，如果没有配置则使用默认值或返回错误
-        username = self._trimmedia_user
-        if not username:
-            logger.error("飞牛影视用户名未配置")
-            if self._notify:
-                self.post_message(
-                    mtype=NotificationType.SiteMessage,
-                    title=f"【飞牛影视豆瓣同步】",
-                    text=f"飞牛影视用户名未配置，请检查设置",
-                )
-            return
-        
+    def _check_db_unchanged(self) -> Tuple[bool, Optional[dict]]:
+        """
+        判断飞牛影视数据库自上次同步成功后是否有变化
+        """
         try:
-            conn = sqlite3.connect(self._db_path)
-            cursor = conn.cursor()
-            
-            # 使用新的 SQL 查询语句
-            sql = """
-            SELECT 
-                i2.imdb_id, i2.title
-            FROM 
-                item i2
-            WHERE 
-                i2.guid IN (
-                    SELECT DISTINCT iup.item_guid
-                    FROM item_user_play iup
-                    INNER JOIN user u ON iup.user_guid = u.guid
-                    WHERE iup.watched = 1
-                      AND u.username = ?
-                )
-                AND i2.type IN ('Movie', 'TV', 'Season')
-                AND i2.guid IN (
-                    SELECT MIN(guid)
-                    FROM item
-                    WHERE type IN ('Movie', 'TV', 'Season')
-                      AND imdb_id IS NOT NULL
-                      AND imdb_id != ''
-                    GROUP BY imdb_id
-                    HAVING COUNT(*) >= 1
-                )
-            """
-            
-            cursor.execute(sql, (username,))
-            results = cursor.fetchall()
-            
-            logger.info(f"查询到 {len(results)} 个已观看项目")
-            
-            # 进度跟踪变量
-            total_items = len(results)
-            processed_items = 0
-            current_progress = 0
-            
-            for row in results:
-                if self._should_stop:
-                    logger.info("检测到中断请求，停止同步已看状态...")
-                    break
-                    
-                imdb_id = row[0]
-                title = row[1]
-                
-                # 更新进度
-                processed_items += 1
-                new_progress = int((processed_items / total_items) * 100)
-                if new_progress > current_progress:
-                    current_progress = new_progress
-                    logger.info(f"处理进度: {current_progress}% ({processed_items}/{total_items})")
+            return check_unchanged(self.get_data("db_fingerprint"), self._db_path, self.CHANGE_SIGNAL_SQL,
+                                   key=f"{self._db_path}|{self._trimmedia_user}")
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"检查飞牛影视数据库变化失败，执行完整同步: {e}")
+            return False, None
 
-                # 先用 imdb_id 判断有没有处理过
-                # 注意：这里需要确保缓存键是 imdb_id
-                if self._cached_data.get(imdb_id) == DoubanStatus.DONE.value:
-                    logger.info(f"ℹ️ 已处理过: {title} (IMDB: {imdb_id})，跳过...")
-                    continue
-                
-                if not imdb_id or imdb_id == "":  # IMDb ID 为空直接跳过
-                    logger.info(f"ℹ️ IMDb ID 为空: {title}，跳过...")
-                    continue
-                
-                # 检查是否是豆瓣不存在的 IMDb ID
-                if imdb_id in self._nonexistent_imdb_list:
-                    logger.info(f"⚠️ 跳过豆瓣不存在的 IMDb ID: {title} (IMDB: {imdb_id})")
-                    # 将其标记为已处理，避免重复检查
-                    self._cached_data[imdb_id] = DoubanStatus.DONE.value
-                    continue
 
-                # 检查并修正错误的 IMDb ID
-                corrected_imdb_id = self._incorrect_imdb_map.get(imdb_id, imdb_id)
-                if corrected_imdb_id != imdb_id:
-                    logger.info(f"⚠️ 检测到错误的 IMDb ID: {imdb_id} -> 修正为: {corrected_imdb_id} ({title})")
-                    imdb_id = corrected_imdb_id
-                
-                # 4. 调用 get_douban_id 函数将 imdb_id 转换为豆瓣ID
-                douban_id = self._douban_helper.get_douban_id(imdb_id)
-                                
-                if not douban_id:  # 豆瓣ID 为 None、空字符串或 "0"
-                    logger.info(f"ℹ️ 未找到豆瓣ID: {title} (IMDB: {imdb_id})，尝试通过标题搜索...")
-                 
-                if douban_id == "0":  # 豆瓣ID为0的直接跳过
-                    logger.info(f"ℹ️ 豆瓣ID为0: {title} (IMDB: {imdb_id})，跳过...")
-                    continue
-                                
-                if douban_id is not None:
-                    watching_douban_id.append((imdb_id, douban_id, title))
-                    logger.info(f"✅ 找到豆瓣ID: {title} -> 豆瓣ID: {douban_id} (IMDB: {imdb_id})")
-                else:
-                    logger.error(f"未找到豆瓣ID: {title} (IMDB: {imdb_id})")
+    def set_douban_watching(self) -> bool:
+        return self._sync_engine().forward("watching")
 
-        except sqlite3.Error as e:
-            logger.error(f"数据库查询错误: {e}")
-            if self._notify:
-                self.post_message(
-                    mtype=NotificationType.SiteMessage,
-                    title=f"【飞牛影视豆瓣同步】",
-                    text=f"数据库查询错误: {e}",
-                )
-            return
+    def set_douban_done(self) -> bool:
+        return self._sync_engine().forward("done")
 
-        finally:
-            # 确保游标和连接在使用完后关闭
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
+    def reverse_sync_douban_status(self) -> bool:
+        return self._sync_engine().reverse()
 
-        # 标记豆瓣已看状态
-        message = ""
-        total_to_process = len(watching_douban_id)
-        processed_count = 0
-        current_progress = 0
-        
-        for imdb_id, douban_id, title in watching_douban_id:
-            if self._should_stop:
-                logger.info("检测到中断请求，停止处理...")
-                break
-                
-            processed_count += 1
-            new_progress = int((processed_count / total_to_process) * 100)
-            if new_progress > current_progress:
-                current_progress = new_progress
-                logger.info(f"标记进度: {current_progress}% ({processed_count}/{total_to_process})")
-            
-            status = DoubanStatus.DONE.value
-            ret = self._douban_helper.set_watching_status(
-                subject_id=douban_id, status=status, private=self._private
-            )
-            if ret:
-                # 使用 imdb_id 作为缓存键
-                self._cached_data[imdb_id] = status
-                logger.info(f"✅ title: {title}, douban_id: {douban_id}, IMDb: {imdb_id}，已标记为已看")
-                message += f"{title}，已标记为已看\n"
-            else:
-                logger.error(f"⚠️ title: {title}, douban_id: {douban_id}, IMDb: {imdb_id}，标记已看失败")
-                message += f"{title}，***标记已看失败***\n"
-            
-            # 添加延迟避免请求过快
-            time.sleep(1)
-        
+    def _sync_engine(self) -> SyncEngine:
+        """
+        同步流程由 SyncEngine 完成，飞牛影视的查询和写入由 TrimMediaAdapter 提供
+        """
+        adapter = TrimMediaAdapter(
+            self._db_path, self._trimmedia_user,
+            concurrency=self._douban_concurrency,
+            should_stop=lambda: self._should_stop,
+        )
+        return SyncEngine(
+            adapter, self._sync_state, self,
+            helper=self._get_douban_helper,
+            should_stop=lambda: self._should_stop,
+            notify=self._notify_message,
+            douban_user=self._douban_user,
+            private=self._private,
+            resolve_workers=self._douban_concurrency,
+        )
+
+    def _notify_message(self, text: str):
         if self._notify:
-            if len(message) > 0:
-                self.post_message(
-                    mtype=NotificationType.SiteMessage,
-                    title="【飞牛影视豆瓣同步】",
-                    text=message,
-                )
-            # 发送完成通知
             self.post_message(
                 mtype=NotificationType.SiteMessage,
                 title="【飞牛影视豆瓣同步】",
-                text=f"已看状态同步完成！共处理 {processed_count}/{total_to_process} 个项目",
+                text=text,
             )
-            
-        # 保存缓存数据
-        self.save_data("trimmediahelper", self._cached_data)
-        
-    def reverse_sync_douban_status(self):
-        logger.info(f"⏳ 开始同步豆瓣已看数据到飞牛影视...")
-        
-        # 检查必要的配置
-        if not self._trimmedia_user:
-            logger.error("飞牛影视用户名未配置")
-            if self._notify:
-                self.post_message(
-                    mtype=NotificationType.SiteMessage,
-                    title="【飞牛影视豆瓣同步】",
-                    text="飞牛影视用户名未配置，请检查设置",
-                )
-            return
-        
-        if not self._douban_user:
-            logger.error("豆瓣用户ID未配置")
-            if self._notify:
-                self.post_message(
-                    mtype=NotificationType.SiteMessage,
-                    title="【飞牛影视豆瓣同步】",
-                    text="豆瓣用户ID未配置，请检查设置",
+
+    def _migrate_cached_data(self):
+        """
+        旧版本把同步状态整体保存在插件数据中，导入同步状态存储后删除
+        """
+        legacy = self.get_data("trimmediahelper")
+        if legacy:
+            logger.info(f"已将 {self._sync_state.migrate(legacy)} 条旧缓存数据导入同步状态存储")
+        if legacy is not None:
+            self.del_data("trimmediahelper")
+        # 旧版本的观看记录水位
+        play_watermark = self.get_data("play_watermark")
+        if play_watermark is not None:
+            self.save_data("sync_watermark", {
+                kind: {"key": watermark.get("key"), "value": watermark.get("update_time") or None,
+                       "full_scan_time": watermark.get("full_scan_time", 0)}
+                for kind, watermark in play_watermark.items()
+            })
+            self.del_data("play_watermark")
+
+    def sync_douban_status(self) -> bool:
+        """
+        :return: 是否全部同步成功
+        """
+        watching_ok = self.set_douban_watching()
+        done_ok = self.set_douban_done()
+        return bool(watching_ok and done_ok)
+
+    def _get_douban_helper(self) -> DoubanHelper:
+        """
+        第一次使用时创建豆瓣助手，ck 状态持久化以便重启后复用
+        """
+        with self._douban_helper_lock:
+            if not self._douban_helper:
+                self._douban_helper = DoubanHelper(
+                    user_cookie=self._cookie,
+                    cache=self._douban_cache,
+                    ck_state=self.get_data("douban_ck"),
+                    on_ck_refresh=lambda state: self.save_data("douban_ck", state),
+                    owner=self.__class__.__name__,
                 )
-            return
-        
-        # 连接到数据库
-        conn = sqlite3.connect(self._db_path)
-        conn.text_factory = str
-        cursor = conn.cursor()
-        
-        processed_count = 0
-        skipped_count = 0
-        error_count = 0
-        
+            return self._douban_helper
+
+    def _warm_up_douban_helper(self):
         try:
-            # 先获取一次 user_guid（只执行一次）
-            cursor.execute("""
-                SELECT guid as user_guid
-                FROM user
-                WHERE username = ?
-            """, (self._trimmedia_user,))
-            
-            user_result = cursor.fetchone()
-            if not user_result:
-                logger.error(f"未找到用户 {self._trimmedia_user}")
-                if self._notify:
-                    self.post_message(
-                        mtype=NotificationType.SiteMessage,
-                        title="【飞牛影视豆瓣同步】",
-                        text=f"未找到飞牛影视用户 {self._trimmedia_user}，请检查用户名",
-                    )
-                return
-            
-            user_guid = user_result[0]
-            logger.info(f"获取到用户 {self._trimmedia_user} 的 GUID: {user_guid}")
-            
-            # 1. 通过get_user_movies获得用户在豆瓣上全部的已看数据
-            logger.info(f"正在获取豆瓣用户 {self._douban_user} 的已看电影数据...")
-            douban_movies = self._douban_helper.get_user_movies(
-                username=self._douban_user,  # 修改参数名
-                status='collect'
-            )
-            
-            if not douban_movies:
-                logger.warning("未获取到豆瓣已看电影数据")
-                if self._notify:
-                    self.post_message(
-                        mtype=NotificationType.SiteMessage,
-                        title="【飞牛影视豆瓣同步】",
-                        text="未获取到豆瓣已看电影数据，请检查豆瓣用户ID和cookie配置",
-                    )
-                return
-            
-            logger.info(f"获取到 {len(douban_movies)} 部豆瓣已看电影")
-            
-            # 2. 遍历get_user_movies返回的所有电影数据，逐条处理
-            for movie in douban_movies:
-                if self._should_stop:
-                    logger.info("检测到中断请求，停止同步已看状态...")
-                    break
-                
-                douban_id = movie.get('douban_id')
-                imdb_id = movie.get('imdb_id')
-                title = movie.get('title')
-                
-                if not imdb_id or imdb_id == "":
-                    logger.info(f"ℹ️ 跳过 {title} (豆瓣ID: {douban_id}) - 无IMDb ID")
-                    skipped_count += 1
-                    continue
-                
-                logger.info(f"正在处理: {title} (豆瓣ID: {douban_id}, IMDb: {imdb_id})")
-                
-                # 检查缓存：如果已经处理过这个IMDb ID，则跳过
-                # 使用相同的缓存键和判断逻辑，与set_douban_done保持一致
-                if self._cached_data.get(imdb_id) == DoubanStatus.DONE.value:
-                    logger.info(f"ℹ️ 已处理过: {title} (IMDB: {imdb_id})，跳过...")
-                    skipped_count += 1
-                    continue
-                    
-                # 检查并修正错误的 IMDb ID，将豆瓣错误的IMDB转换回飞牛里面正确的
-                corrected_imdb_id = self._incorrect_imdb_map.get(imdb_id, imdb_id)
-                if corrected_imdb_id != imdb_id:
-                    logger.info(f"⚠️ 检测到错误的 IMDb ID: {imdb_id} -> 修正为: {corrected_imdb_id} ({title})")
-                    imdb_id = corrected_imdb_id
-                
-                try:
-                    # 第一步：查询获取guid和type
-                    cursor.execute("""
-                        SELECT guid, type
-                        FROM item
-                        WHERE imdb_id = ?
-                          AND type IN ('Movie', 'Episode', 'Season')
-                    """, (imdb_id,))
-                    
-                    items = cursor.fetchall()
-                    
-                    if not items:
-                        logger.info(f"ℹ️ 未找到IMDb ID为 {imdb_id} 的项目: {title}")
-                        skipped_count += 1
-                        continue
-                    
-                    logger.info(f"找到 {len(items)} 个匹配项目")
-                    
-                    has_processed = False
-                    
-                    # 第三步：对于每个查询到的(guid, type)组合，执行处理逻辑
-                    for item_guid, item_type in items:
-                        # 先查询是否已存在
-                        cursor.execute("""
-                            SELECT item_guid, watched 
-                            FROM item_user_play 
-                            WHERE item_guid = ?
-                              AND user_guid = ?
-                        """, (item_guid, user_guid))
-                        
-                        existing_record = cursor.fetchone()
-                        
-                        if existing_record:
-                            item_guid_found, watched = existing_record
-                            if watched == 0:
-                                # 如果存在且watched=0，执行更新
-                                cursor.execute("""
-                                    UPDATE item_user_play 
-                                    SET watched = 1, 
-                                        update_time = CAST(strftime('%s', 'now') AS INTEGER)
-                                    WHERE item_guid = ? 
-                                      AND user_guid = ?
-                                """, (item_guid, user_guid))
-                                logger.info(f"✅ 更新观看状态: {title} (guid: {item_guid})")
-                                has_processed = True
-                            else:
-                                logger.info(f"ℹ️ 已标记为已观看: {title} (guid: {item_guid})")
-                        else:
-                            # 如果不存在，执行插入
-                            cursor.execute("""
-                                INSERT INTO item_user_play (
-                                    item_guid, user_guid, ts, watched, 
-                                    media_guid, video_guid, audio_guid, subtitle_guid,
-                                    direct_link_audio_index, resolution, bitrate, type,
-                                    visible, create_time, update_time
-                                ) VALUES (
-                                    ?, ?, 0, 1,
-                                    '', '', '', '',
-                                    -1, '', 0, ?,
-                                    1, CAST(strftime('%s', 'now') AS INTEGER) * 1000, CAST(strftime('%s', 'now') AS INTEGER) * 1000
-                                )
-                            """, (item_guid, user_guid, item_type))
-                            logger.info(f"✅ 插入观看记录: {title} (guid: {item_guid}, type: {item_type})")
-                            has_processed = True
-                    
-                    # 如果至少处理了一个项目，则更新计数和缓存
-                    if has_processed:
-                        processed_count += 1
-                        # 添加到缓存，使用相同的键和值
-                        self._cached_data[imdb_id] = DoubanStatus.DONE.value
-                    else:
-                        skipped_count += 1
-                    
-                    # 提交当前处理的事务
-                    conn.commit()
-                    
-                except sqlite3.Error as e:
-                    logger.error(f"❌ 处理 {title} 时数据库错误: {e}")
-                    conn.rollback()
-                    error_count += 1
-                except Exception as e:
-                    logger.error(f"❌ 处理 {title} 时发生错误: {e}")
-                    conn.rollback()
-                    error_count += 1
-                
-                # 添加延迟，避免请求过快
-                time.sleep(0.5)
-            
-            # 输出统计信息
-            logger.info(f"同步完成统计:")
-            logger.info(f"  成功处理: {processed_count} 条")
-            logger.info(f"  跳过处理: {skipped_count} 条")
-            logger.info(f"  处理失败: {error_count} 条")
-            
-            if self._notify:
-                self.post_message(
-                    mtype=NotificationType.SiteMessage,
-                    title="【飞牛影视豆瓣同步】",
-                    text=f"豆瓣已看数据同步完成！\n成功处理: {processed_count} 条\n跳过: {skipped_count} 条\n失败: {error_count} 条",
-                )
-                
-            # 保存缓存数据
-            self.save_data("trimmediahelper", self._cached_data)
-                
+            self._get_douban_helper().ck
         except Exception as e:
-            logger.error(f"❌ 同步过程中发生严重错误: {e}")
-            conn.rollback()
-            
-            if self._notify:
-                self.post_message(
-                    mtype=NotificationType.SiteMessage,
-                    title="【飞牛影视豆瓣同步】",
-                    text=f"同步过程中发生错误: {str(e)[:100]}...",
-                )
-            raise
-            
-        finally:
-            # 关闭数据库连接
-            conn.close()
-        
-        # 同步豆瓣到飞牛影视为一次性任务，完成后关闭选项
-        self._reverse_sync_douban_status = False
-        self._update_config()
-        
-        logger.info("豆瓣已看数据同步到飞牛影视完成")
-
-    def sync_douban_status(self):
-        self.set_douban_watching()
-        self.set_douban_done()
+            logger.warning(f"预热豆瓣连接失败: {e}")
 
     def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
+        # 打开配置页时在后台预热豆瓣连接，不阻塞页面
+        if self._enabled and not (self._warm_up_thread and self._warm_up_thread.is_alive()):
+            self._warm_up_thread = threading.Thread(target=self._warm_up_douban_helper, daemon=True)
+            self._warm_up_thread.start()
         return [
             {
                 "component": "VForm",
@@ -930,6 +509,20 @@ class TrimMediaHelper(_PluginBase):
                                     }
                                 ],
                             },
+                            {
+                                "component": "VCol",
+                                "props": {"cols": 12, "md": 4},
+                                "content": [
+                                    {
+                                        "component": "VTextField",
+                                        "props": {
+                                            "model": "douban_concurrency",
+                                            "label": "豆瓣并发请求数",
+                                            "placeholder": "同时进行中的豆瓣请求数，默认3，总请求频率仍受限速控制。",
+                                        },
+                                    }
+                                ],
+                            },
                         ],
                     },
                     {
@@ -1028,7 +621,7 @@ class TrimMediaHelper(_PluginBase):
                                         "props": {
                                             "type": "info",
                                             "variant": "tonal",
-                                            "text": "双向同步仅执行一次，执行后会自动关闭。该选项会先将豆瓣已看数据同步到飞牛影视中。",
+                                            "text": "双向同步会先将豆瓣已看数据同步到飞牛影视中。首次运行抓取全部已看列表，之后只抓取上次同步后新标记的条目，清理缓存数据可重新全量同步。",
                                         },
                                     }
                                 ],
@@ -1063,6 +656,7 @@ class TrimMediaHelper(_PluginBase):
             "notify": False,
             "onlyonce": False,
             "cron": "0 0 * * *",
+            "douban_concurrency": self.DOUBAN_CONCURRENCY,
             "douban_score_update_days": 0,
         }
 
@@ -1074,6 +668,8 @@ class TrimMediaHelper(_PluginBase):
         退出插件
         """
         self._should_stop = True
+        if self._sync_state:
+            self._sync_state.flush()
         try:
             if self._scheduler:
                 self._scheduler.remove_all_jobs()
@@ -0,0 +1,151 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+from app.log import logger
+
+
+class DoubanCache:
+    """
+    豆瓣数据的持久化缓存
+    imdb_douban: IMDb ID -> 豆瓣ID 解析结果，命中的结果永久有效，未命中的结果在 negative_ttl 秒内有效，过期后重新搜索
+    subject: 豆瓣条目信息（IMDb ID、标题、年份、类型），由详情页解析得到，条目信息基本不变，永久有效
+    """
+
+    # 未命中结果的默认有效期：7 天
+    NEGATIVE_TTL = 7 * 24 * 3600
+
+    def __init__(self, db_file: Path, negative_ttl: int = NEGATIVE_TTL):
+        self._negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        Path(db_file).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_file), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS imdb_douban (
+                imdb_id TEXT PRIMARY KEY,
+                douban_id TEXT,
+                updated_at INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_imdb_douban_douban_id ON imdb_douban (douban_id)"
+        )
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS subject (
+                douban_id TEXT PRIMARY KEY,
+                imdb_id TEXT,
+                title TEXT,
+                year TEXT,
+                type TEXT,
+                updated_at INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_subject_imdb_id ON subject (imdb_id)"
+        )
+        self._conn.commit()
+
+    def get_douban_id(self, imdb_id: str) -> Tuple[bool, Optional[str]]:
+        """
+        查询缓存
+        :return: (是否命中, 豆瓣ID)，命中但豆瓣ID为None表示豆瓣上不存在该条目
+        """
+        if not imdb_id:
+            return False, None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT douban_id, updated_at FROM imdb_douban WHERE imdb_id = ?",
+                (imdb_id,),
+            ).fetchone()
+        if not row:
+            return False, None
+        douban_id, updated_at = row
+        if douban_id:
+            return True, douban_id
+        if time.time() - updated_at < self._negative_ttl:
+            return True, None
+        return False, None
+
+    def get_imdb_id(self, douban_id: str) -> Optional[str]:
+        """
+        通过豆瓣ID反查已知的 IMDb ID
+        """
+        if not douban_id:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT imdb_id FROM imdb_douban WHERE douban_id = ? LIMIT 1",
+                (str(douban_id),),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_douban_id(self, imdb_id: str, douban_id: Optional[str]):
+        """
+        写入解析结果，douban_id 为 None 时记录为未命中
+        """
+        if not imdb_id:
+            return
+        try:
+            with self._lock:
+                self._conn.execute(
+                    """
+                    INSERT INTO imdb_douban (imdb_id, douban_id, updated_at)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(imdb_id) DO UPDATE SET
+                        douban_id = excluded.douban_id,
+                        updated_at = excluded.updated_at
+                    """,
+                    (imdb_id, str(douban_id) if douban_id else None, int(time.time())),
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"写入豆瓣ID缓存失败 {imdb_id}: {e}")
+
+    def get_subject(self, douban_id: str) -> Optional[dict]:
+        """
+        查询豆瓣条目信息，未缓存时返回 None
+        """
+        if not douban_id:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT imdb_id, title, year, type FROM subject WHERE douban_id = ?",
+                (str(douban_id),),
+            ).fetchone()
+        if not row:
+            return None
+        return dict(zip(("imdb_id", "title", "year", "type"), row))
+
+    def set_subject(self, douban_id: str, imdb_id: Optional[str] = None, title: Optional[str] = None,
+                    year: Optional[str] = None, type: Optional[str] = None):
+        """
+        写入详情页解析得到的条目信息，imdb_id 为 None 表示该条目没有 IMDb ID
+        """
+        if not douban_id:
+            return
+        try:
+            with self._lock:
+                self._conn.execute(
+                    """
+                    INSERT INTO subject (douban_id, imdb_id, title, year, type, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(douban_id) DO UPDATE SET
+                        imdb_id = excluded.imdb_id,
+                        title = excluded.title,
+                        year = excluded.year,
+                        type = excluded.type,
+                        updated_at = excluded.updated_at
+                    """,
+                    (str(douban_id), imdb_id, title, year, type, int(time.time())),
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"写入豆瓣条目缓存失败 {douban_id}: {e}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
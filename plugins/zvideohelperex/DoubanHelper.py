@@ -3,94 +3,100 @@ from typing import Tuple
 from urllib.parse import unquote
 
 import requests
-from bs4 import BeautifulSoup
-from http.cookies import SimpleCookie
-from app.helper.cookiecloud import CookieCloudHelper
+from app.plugins.zvideohelperex.DoubanParser import get_backend
+from app.plugins.zvideohelperex.DoubanClient import (MOVIE_URL, WWW_URL, DoubanAccount, DoubanThrottledError,
+                                                     get_account, shared_cache)
 from app.log import logger
 
-import time
-import json
+from typing import Callable, Hashable, Optional
+
+
+class CollectionCrawl:
+    """
+    一次收藏列表抓取的结果，每次抓取单独创建，同一助手被多个同步同时使用时互不影响
+    """
+
+    def __init__(self):
+        # 是否完整抓取到列表末尾或水位处，请求失败或中断时为 False
+        self.complete = False
+        # 本次抓取到的最新条目，用于推进水位
+        self.newest: Optional[dict] = None
+
 
 class DoubanHelper:
 
-    def __init__(self, user_cookie: str = None):
-        if not user_cookie:
-            self.cookiecloud = CookieCloudHelper()
-            cookie_dict, msg = self.cookiecloud.download()
-            if cookie_dict is None:
-                logger.error(f"获取cookiecloud数据错误 {msg}")
-            self.cookies = cookie_dict.get("douban.com")
-        else:
-            self.cookies = user_cookie
-        self.cookies = {k: v.value for k, v in SimpleCookie(self.cookies).items()}
-        user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36 Edg/113.0.1774.57'
-        self.headers = {
-            'User-Agent': user_agent,
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, sdch',
-            'Accept-Language': 'zh-CN,zh;q=0.8,en-US;q=0.6,en;q=0.4,en-GB;q=0.2,zh-TW;q=0.2',
-            'Connection': 'keep-alive',
-            'DNT': '1',
-        }
+    # 请求超时时间（秒）
+    TIMEOUT = DoubanAccount.TIMEOUT
+    # 被限流后同一请求最多重试次数
+    MAX_THROTTLE_RETRIES = DoubanAccount.MAX_THROTTLE_RETRIES
 
-        if self.cookies.get('__utmz'):
-            self.cookies.pop("__utmz")
+    def __init__(self, user_cookie: str = None, cache=None,
+                 ck_state: dict = None, on_ck_refresh: Callable[[dict], None] = None,
+                 parser: str = None, owner: Hashable = None):
+        """
+        构造时不发起任何网络请求，cookie 与 ck 在第一次请求豆瓣时才获取
+        会话、ck 与限速器按账号在进程内共享（见 DoubanClient），多个插件使用同一账号时共用请求额度
+        :param ck_state: 上次保存的 ck 状态（ck、过期时间、对应的 cookie 指纹）
+        :param on_ck_refresh: 重新获取 ck 后的回调，用于持久化 ck 状态
+        :param parser: 页面解析后端（selectolax/lxml/bs4），为空时使用可用的最快后端
+        :param owner: 回调的登记者，同一 owner 重新创建助手时替换旧回调
+        """
+        # 豆瓣数据持久化缓存（DoubanCache），进程内各插件共用，已有共享缓存时使用共享缓存
+        self.cache = shared_cache(cache)
+        self.account = get_account(user_cookie, ck_state)
+        if on_ck_refresh:
+            self.account.add_ck_listener(owner if owner is not None else id(self), on_ck_refresh)
+        # 全局限速器，替代分散在各处的固定 sleep
+        self.limiter = self.account.limiter
+        self.parser = get_backend(parser)
 
-        # 移除用户传进来的comment-key
-        if self.cookies.get('ck'):
-            self.cookies.pop("ck")
+    @property
+    def session(self) -> requests.Session:
+        return self.account.session
 
-        # 获取最新的ck
-        self.set_ck()
+    @property
+    def ck(self) -> str:
+        return self.account.ck
 
-        self.ck = self.cookies.get('ck')
-        logger.debug(f"ck:{self.ck} cookie:{self.cookies}")
+    @property
+    def cookies(self) -> dict:
+        return self.account.cookies
 
-        if not self.cookies:
-            logger.error(f"cookie获取为空，请检查插件配置或cookie cloud")
-        if not self.ck:
-            logger.error(f"请求ck失败，请检查传入的cookie登录状态")
+    @property
+    def headers(self) -> dict:
+        return self.account.headers
+
+    def _is_throttled(self, response) -> bool:
+        return self.account.is_throttled(response)
+
+    def _request(self, endpoint: str, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        经全局限速器发出请求，被限流（403/429/验证页）时降速并在冷却后重试
+        :param endpoint: 限速器中的接口名称，见 RateLimiter.DEFAULT_RATES
+        """
+        return self.account.request(endpoint, method, url, **kwargs)
 
     def set_ck(self):
-        self.headers["Cookie"] = ";".join([f"{key}={value}" for key, value in self.cookies.items()])
-        response = requests.get("https://www.douban.com/", headers=self.headers)
-        ck_str = response.headers.get('Set-Cookie', '')
-        logger.debug(ck_str)
-        if not ck_str:
-            logger.error('获取ck失败，检查豆瓣登录状态')
-            self.cookies['ck'] = ''
-            return
-        cookie_parts = ck_str.split(";")
-        ck = cookie_parts[0].split("=")[1].strip()
-        logger.debug(ck)
-        self.cookies['ck'] = ck
+        self.account.set_ck()
 
     def get_subject_id(self, title: str) -> Tuple[str, str, str]:
-        url = f"https://www.douban.com/search?cat=1002&q={title}"
-        print(f"请求URL: {url}")
-        response = requests.get(url, headers=self.headers, cookies=self.cookies)
+        url = f"{WWW_URL}/search?cat=1002&q={title}"
+        logger.debug(f"请求URL: {url}")
+        response = self._request("search", "GET", url)
         if response.status_code != 200:
-            print(f"搜索 {title} 失败 状态码：{response.status_code}")
+            logger.warning(f"搜索 {title} 失败 状态码：{response.status_code}")
             return None, None, None
-        soup = BeautifulSoup(response.text, 'html.parser')
-        title_divs = soup.find_all("div", class_="title")
         subject_items = []
-        for div in title_divs:
+        for result in self.parser.search_results(response.text):
             item = {}
-            a_tag = div.find_all("a")[0]
-            item["title"] = a_tag.string.strip()
-            if len(div.find_all(class_="subject-cast")) == 0:
+            item["title"] = result["title"] or ""
+            if not result["cast"]:
                 continue
-            span_tag = div.find_all(class_="subject-cast")[0]
-            year = span_tag.string[-4:]
+            year = result["cast"][-4:]
             if year.isdigit():
                 item["year"] = year
-            rating_nums = div.find_all(class_="rating_nums")
-            if rating_nums:
-                item["rating_nums"] = rating_nums[0].string
-            else:
-                item["rating_nums"] = "0"
-            link = unquote(a_tag["href"])
+            item["rating_nums"] = result["rating"] or "0"
+            link = unquote(result["link"] or "")
             if "subject/" in link:
                 pattern = r"subject/(\d+)/"
                 match = re.search(pattern, link)
@@ -98,18 +104,18 @@ class DoubanHelper:
                     item["subject_id"] = match.group(1)
             subject_items.append(item)
         if not subject_items:
-            print(f"找不到 {title} 相关条目")
+            logger.info(f"找不到 {title} 相关条目")
             return None, None, None
         for subject_item in subject_items:
-            print(f"找到: {subject_item['title']} {subject_item['subject_id']} 评分: {subject_item['rating_nums']}")
+            logger.debug(f"找到: {subject_item['title']} {subject_item['subject_id']} 评分: {subject_item['rating_nums']}")
             return subject_item["title"], subject_item["subject_id"], subject_item["rating_nums"]
         return None, None, None
 
     def set_watching_status(self, subject_id: str, status: str = "do", private: bool = True) -> bool:
-        self.headers["Referer"] = f"https://movie.douban.com/subject/{subject_id}/"
-        self.headers["Origin"] = "https://movie.douban.com"
-        self.headers["Host"] = "movie.douban.com"
-        self.headers["Cookie"] = ";".join([f"{key}={value}" for key, value in self.cookies.items()])
+        headers = {
+            "Referer": f"{MOVIE_URL}/subject/{subject_id}/",
+            "Origin": MOVIE_URL,
+        }
         data_json = {
             "ck": self.ck,
             "interest": "do",
@@ -121,10 +127,15 @@ class DoubanHelper:
         if private:
             data_json["private"] = "on"
         data_json["interest"] = status
-        response = requests.post(
-            url=f"https://movie.douban.com/j/subject/{subject_id}/interest",
-            headers=self.headers,
-            data=data_json)
+        try:
+            response = self._request(
+                "interest", "POST",
+                f"{MOVIE_URL}/j/subject/{subject_id}/interest",
+                headers=headers,
+                data=data_json)
+        except DoubanThrottledError as e:
+            logger.error(f"douban_id: {subject_id} 标记失败: {e}")
+            return False
         if not response:
             return False
         if response.status_code == 200:
@@ -132,6 +143,7 @@ class DoubanHelper:
             ret = response.json().get("r")
             r = False if (isinstance(ret, bool) and ret is False) else True
             if r:
+                self.account.record_interest(subject_id, status)
                 return True
             # 未开播 {"r": false}
             else:
@@ -164,13 +176,40 @@ class DoubanHelper:
         return "".join(parts)
     
     
+    @staticmethod
+    def reached_watermark(douban_id: str, rating_date: str, watermark: dict = None) -> bool:
+        """
+        收藏列表按标记时间倒序，遇到上次同步时最新的条目或更早标记的条目即可停止
+        :param watermark: 上次同步时最新条目 {"douban_id": ..., "rating_date": ...}
+        """
+        if not watermark:
+            return False
+        if douban_id and douban_id == watermark.get("douban_id"):
+            return True
+        return bool(rating_date and watermark.get("rating_date") and rating_date < watermark["rating_date"])
+
     # ---------------------------
     # 用户全部影视（含评分日期）
     # ---------------------------
+
+    STATUS_NAMES = {
+        "collect": "看过",
+        "do": "在看",
+        "wish": "想看",
+    }
     
-    def fetch_all_movies(self, douban_user: str = None):
+    def fetch_all_movies(self, douban_user: str = None, watermark: dict = None, status: str = "collect",
+                         crawl: CollectionCrawl = None):
+        """
+        按标记时间倒序抓取用户的看过列表
+        :param watermark: 上次同步的水位，抓取到水位处即停止，为空时抓取全部
+        :param status: collect 看过 / do 在看 / wish 想看
+        :param crawl: 记录本次抓取是否完整和最新条目，请求失败或被限流时记录日志并停止抓取，不抛出异常
+        """
+        crawl = crawl if crawl is not None else CollectionCrawl()
+        crawl.complete = False
         #statuses = ["collect", "wish"]
-        statuses = ["collect"]
+        statuses = [status]
         for status in statuses:
             start = 0
             empty_pages = 0
@@ -178,19 +217,22 @@ class DoubanHelper:
             while True:
                 logger.info(f"⏳ 抓取豆瓣影音记录，start={start}")
 
-                url = f"https://movie.douban.com/people/{douban_user}/{status}"
+                url = f"{MOVIE_URL}/people/{douban_user}/{status}"
                 params = {
                     "start": start,
                     "sort": "time",
                     "rating": "all",
                     "filter": "all",
                     "mode": "grid"
-                }               
-                resp = requests.get(url, headers=self.headers, cookies=self.cookies, params=params, timeout=10)
-                resp.raise_for_status()
+                }
+                try:
+                    resp = self._request("collection", "GET", url, params=params)
+                    resp.raise_for_status()
+                except Exception as e:
+                    logger.error(f"请求列表失败 {url}: {e}")
+                    return
     
-                soup = BeautifulSoup(resp.text, "html.parser")
-                items = soup.select(".item")
+                items = self.parser.collection_items(resp.text)
     
                 if not items:
                     empty_pages += 1
@@ -200,33 +242,48 @@ class DoubanHelper:
                     empty_pages = 0
     
                 for item in items:
-                    link_el = item.select_one(".info a")
-                    if not link_el:
-                        continue
-    
-                    title = self.clean_title(link_el.text)
-                    detail_url = link_el["href"]
+                    title = self.clean_title(item["title"] or "")
+                    detail_url = item["link"]
                     douban_id = self.extract_douban_id(detail_url)
     
                     # ⭐ 评分日期（只在“看过”里有）
-                    rating_date = None
-                    if status == "collect":
-                        date_el = item.select_one(".date")
-                        if date_el:
-                            rating_date = date_el.text.strip()
-                            
-                    yield {
+                    rating_date = item["date"] if status == "collect" else None
+
+                    if self.reached_watermark(douban_id, rating_date, watermark):
+                        logger.info(f"已抓取到上次同步的位置: {title} ({rating_date})，停止抓取")
+                        crawl.complete = True
+                        return
+
+                    movie = {
                         "douban_id": douban_id,
                         "title": title,
-                        "status": "看过" if status == "collect" else "想看",
+                        "status": self.STATUS_NAMES.get(status, status),
                         "rating_date": rating_date,
                     }
-    
-                    time.sleep(1)
+                    if crawl.newest is None:
+                        crawl.newest = movie
+                    yield movie
     
                 start += 15
-                time.sleep(2)
-            
+        crawl.complete = True
+
+    def get_collection_ids(self, douban_user: str, status: str = "collect") -> Optional[set]:
+        """
+        获取用户某个状态下全部条目的豆瓣ID，只抓取列表页
+        :return: 豆瓣ID集合，未能完整抓取时返回 None
+        """
+        # 其它插件刚抓取过同一列表时直接使用
+        douban_ids = self.account.get_collection(douban_user, status)
+        if douban_ids is not None:
+            logger.info(f"使用最近抓取的{self.STATUS_NAMES.get(status, status)}列表，共 {len(douban_ids)} 条")
+            return douban_ids
+        crawl = CollectionCrawl()
+        douban_ids = {movie["douban_id"] for movie in self.fetch_all_movies(douban_user, status=status, crawl=crawl)
+                      if movie["douban_id"]}
+        if not crawl.complete:
+            return None
+        self.account.set_collection(douban_user, status, douban_ids)
+        return douban_ids
 
 
 if __name__ == "__main__":
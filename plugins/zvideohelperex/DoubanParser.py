@@ -0,0 +1,310 @@
+"""
+豆瓣页面解析
+只从页面中提取原始字段，不做业务处理；不依赖 MoviePilot，可单独用于基准测试
+
+解析后端按可用性依次选择 selectolax、lxml，均未安装时使用 BeautifulSoup（html.parser）
+partial 为 True 时先截取页面中需要的片段再解析，片段定位失败时解析整个页面
+"""
+import re
+from typing import Dict, List, Optional, Type
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# 各类页面需要解析的片段：(起始标记, 结束标记)，结束标记不存在时截取到页面末尾
+SEARCH_REGION = ('<div class="result-list"', '<div class="paginator"')
+COLLECTION_REGION = ('<div class="grid-view"', '<div class="paginator"')
+SUBJECT_REGION = ('<h1', '<div id="interest_sectl"')
+
+IMDB_PATTERN = re.compile(r'IMDb[:：]\s*(\S+)')
+YEAR_PATTERN = re.compile(r'\d{4}')
+TV_PATTERN = re.compile(r'集数[:：]')
+
+
+def _slice(html: str, region: tuple) -> str:
+    start_marker, end_marker = region
+    start = html.find(start_marker)
+    if start < 0:
+        return html
+    end = html.find(end_marker, start)
+    return html[start:end] if end > 0 else html[start:]
+
+
+def _text(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    value = value.strip()
+    return value or None
+
+
+def _subject_fields(info_text: str, title: Optional[str], year_text: Optional[str]) -> dict:
+    imdb = IMDB_PATTERN.search(info_text)
+    year = YEAR_PATTERN.search(year_text or '')
+    return {
+        'imdb_id': imdb.group(1) if imdb else None,
+        'title': _text(title),
+        'year': year.group(0) if year else None,
+        # 剧集的 #info 中有集数
+        'type': 'tv' if TV_PATTERN.search(info_text) else 'movie',
+    }
+
+
+class ParserBackend:
+    """
+    解析后端基类
+
+    search_results: 搜索结果页，返回 [{title, link, cast, rating}]
+    collection_items: 收藏列表页，返回 [{link, title, date}]，title 为条目原始标题
+    subject_info: 条目详情页，返回 {imdb_id, title, year, type}，页面中没有 #info 时返回 None
+    """
+
+    name = ""
+
+    def __init__(self, partial: bool = True):
+        self.partial = partial
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    def _region(self, html: str, region: tuple) -> str:
+        return _slice(html, region) if self.partial else html
+
+    def search_results(self, html: str) -> List[dict]:
+        raise NotImplementedError
+
+    def collection_items(self, html: str) -> List[dict]:
+        raise NotImplementedError
+
+    def subject_info(self, html: str) -> Optional[dict]:
+        raise NotImplementedError
+
+
+class SoupBackend(ParserBackend):
+    """
+    BeautifulSoup + html.parser，纯 Python 实现，速度最慢但不依赖额外的库
+    partial 为 True 时配合 SoupStrainer 只构建需要的节点
+    """
+
+    name = "bs4"
+
+    @staticmethod
+    def _strainer(name: str, css_class: str) -> SoupStrainer:
+        # 解析过程中 class 为原始字符串，需按单词匹配才能命中 "item comment-item"
+        return SoupStrainer(name, class_=re.compile(rf'(^|\s){css_class}(\s|$)'))
+
+    def _soup(self, html: str, region: tuple, strainer: SoupStrainer = None) -> BeautifulSoup:
+        if self.partial:
+            return BeautifulSoup(_slice(html, region), 'html.parser', parse_only=strainer)
+        return BeautifulSoup(html, 'html.parser')
+
+    def search_results(self, html: str) -> List[dict]:
+        soup = self._soup(html, SEARCH_REGION, self._strainer('div', 'title'))
+        results = []
+        for div in soup.find_all('div', class_='title'):
+            a_tag = div.find('a')
+            if not a_tag:
+                continue
+            cast = div.find(class_='subject-cast')
+            rating = div.find(class_='rating_nums')
+            results.append({
+                'title': _text(a_tag.get_text()),
+                'link': a_tag.get('href'),
+                'cast': _text(cast.get_text()) if cast else None,
+                'rating': _text(rating.get_text()) if rating else None,
+            })
+        return results
+
+    def collection_items(self, html: str) -> List[dict]:
+        soup = self._soup(html, COLLECTION_REGION, self._strainer('div', 'item'))
+        items = []
+        for item in soup.find_all('div', class_='item'):
+            link = item.find('a', class_='nbg') or item.select_one('.info a')
+            if not link:
+                continue
+            title = item.find('em') or link
+            date = item.find('span', class_='date')
+            items.append({
+                'link': link.get('href'),
+                'title': _text(title.get_text()),
+                'date': _text(date.get_text()) if date else None,
+            })
+        return items
+
+    def subject_info(self, html: str) -> Optional[dict]:
+        soup = self._soup(html, SUBJECT_REGION)
+        info = soup.find('div', id='info')
+        if not info:
+            return None
+        title = soup.find('span', property='v:itemreviewed')
+        year = soup.find('span', class_='year')
+        return _subject_fields(info.get_text(),
+                               title.get_text() if title else None,
+                               year.get_text() if year else None)
+
+
+class LxmlBackend(ParserBackend):
+    """
+    lxml.html，基于 libxml2
+    """
+
+    name = "lxml"
+
+    @classmethod
+    def available(cls) -> bool:
+        try:
+            import lxml.html  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    @staticmethod
+    def _tree(html: str):
+        import lxml.html
+        # lxml 不接受空文档
+        return lxml.html.fromstring(html if html.strip() else '<html></html>')
+
+    @staticmethod
+    def _first(node, xpath: str):
+        found = node.xpath(xpath)
+        return found[0] if found else None
+
+    @staticmethod
+    def _class(name: str) -> str:
+        return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+    def search_results(self, html: str) -> List[dict]:
+        tree = self._tree(self._region(html, SEARCH_REGION))
+        results = []
+        for div in tree.xpath(f'//div[{self._class("title")}]'):
+            a_tag = self._first(div, './/a')
+            if a_tag is None:
+                continue
+            cast = self._first(div, f'.//*[{self._class("subject-cast")}]')
+            rating = self._first(div, f'.//*[{self._class("rating_nums")}]')
+            results.append({
+                'title': _text(a_tag.text_content()),
+                'link': a_tag.get('href'),
+                'cast': _text(cast.text_content()) if cast is not None else None,
+                'rating': _text(rating.text_content()) if rating is not None else None,
+            })
+        return results
+
+    def collection_items(self, html: str) -> List[dict]:
+        tree = self._tree(self._region(html, COLLECTION_REGION))
+        items = []
+        for item in tree.xpath(f'//div[{self._class("item")}]'):
+            link = self._first(item, f'.//a[{self._class("nbg")}]')
+            if link is None:
+                link = self._first(item, f'.//*[{self._class("info")}]//a')
+            if link is None:
+                continue
+            title = self._first(item, './/em')
+            if title is None:
+                title = link
+            date = self._first(item, f'.//span[{self._class("date")}]')
+            items.append({
+                'link': link.get('href'),
+                'title': _text(title.text_content()),
+                'date': _text(date.text_content()) if date is not None else None,
+            })
+        return items
+
+    def subject_info(self, html: str) -> Optional[dict]:
+        tree = self._tree(self._region(html, SUBJECT_REGION))
+        info = self._first(tree, '//div[@id="info"]')
+        if info is None:
+            return None
+        title = self._first(tree, '//span[@property="v:itemreviewed"]')
+        year = self._first(tree, f'//span[{self._class("year")}]')
+        return _subject_fields(info.text_content(),
+                               title.text_content() if title is not None else None,
+                               year.text_content() if year is not None else None)
+
+
+class SelectolaxBackend(ParserBackend):
+    """
+    selectolax，基于 lexbor 引擎的 CSS 选择器，速度最快
+    """
+
+    name = "selectolax"
+
+    @classmethod
+    def available(cls) -> bool:
+        try:
+            import selectolax.lexbor  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    @staticmethod
+    def _tree(html: str):
+        from selectolax.lexbor import LexborHTMLParser
+        return LexborHTMLParser(html)
+
+    def search_results(self, html: str) -> List[dict]:
+        tree = self._tree(self._region(html, SEARCH_REGION))
+        results = []
+        for div in tree.css('div.title'):
+            a_tag = div.css_first('a')
+            if a_tag is None:
+                continue
+            cast = div.css_first('.subject-cast')
+            rating = div.css_first('.rating_nums')
+            results.append({
+                'title': _text(a_tag.text()),
+                'link': a_tag.attributes.get('href'),
+                'cast': _text(cast.text()) if cast is not None else None,
+                'rating': _text(rating.text()) if rating is not None else None,
+            })
+        return results
+
+    def collection_items(self, html: str) -> List[dict]:
+        tree = self._tree(self._region(html, COLLECTION_REGION))
+        items = []
+        for item in tree.css('div.item'):
+            link = item.css_first('a.nbg')
+            if link is None:
+                link = item.css_first('.info a')
+            if link is None:
+                continue
+            title = item.css_first('em')
+            if title is None:
+                title = link
+            date = item.css_first('span.date')
+            items.append({
+                'link': link.attributes.get('href'),
+                'title': _text(title.text()),
+                'date': _text(date.text()) if date is not None else None,
+            })
+        return items
+
+    def subject_info(self, html: str) -> Optional[dict]:
+        tree = self._tree(self._region(html, SUBJECT_REGION))
+        info = tree.css_first('div#info')
+        if info is None:
+            return None
+        title = tree.css_first('span[property="v:itemreviewed"]')
+        year = tree.css_first('span.year')
+        return _subject_fields(info.text(),
+                               title.text() if title is not None else None,
+                               year.text() if year is not None else None)
+
+
+# 按优先级排列的解析后端
+BACKENDS: Dict[str, Type[ParserBackend]] = {
+    SelectolaxBackend.name: SelectolaxBackend,
+    LxmlBackend.name: LxmlBackend,
+    SoupBackend.name: SoupBackend,
+}
+
+
+def get_backend(name: str = None, partial: bool = True) -> ParserBackend:
+    """
+    获取解析后端，未指定或指定的后端不可用时使用可用的最快后端
+    """
+    if name in BACKENDS and BACKENDS[name].available():
+        return BACKENDS[name](partial=partial)
+    for backend in BACKENDS.values():
+        if backend.available():
+            return backend(partial=partial)
+    return SoupBackend(partial=partial)
@@ -0,0 +1,145 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from app.log import logger
+
+
+class TokenBucket:
+    """
+    自适应令牌桶
+    连续成功时逐步提速，被限流时速率减半并冷却一段时间（AIMD）
+    """
+
+    # 连续成功多少次后提速一次
+    INCREASE_EVERY = 10
+    # 每次提速的倍数
+    INCREASE_FACTOR = 1.1
+    # 被限流后的冷却时间（秒），连续被限流时翻倍
+    BASE_COOLDOWN = 30
+    MAX_COOLDOWN = 600
+
+    def __init__(self, name: str, rate: float, min_rate: float, max_rate: float,
+                 capacity: float = 1.0, jitter: float = 0.2):
+        """
+        :param rate: 初始速率（次/秒）
+        :param min_rate: 最低速率
+        :param max_rate: 最高速率
+        :param capacity: 桶容量，即允许的突发请求数
+        :param jitter: 等待时间的随机抖动比例，避免请求间隔过于规律
+        """
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self._capacity = capacity
+        self._jitter = jitter
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._success = 0
+        self._penalty = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self) -> float:
+        """
+        尝试取出一个令牌，成功返回0，否则返回需要等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = self._blocked_until - now
+            if wait > 0:
+                return wait
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def _delay(self, wait: float) -> float:
+        return wait * (1 + random.uniform(0, self._jitter))
+
+    def acquire(self):
+        """
+        获取一个令牌，令牌不足时阻塞等待
+        """
+        while True:
+            wait = self._reserve()
+            if not wait:
+                return
+            time.sleep(self._delay(wait))
+
+    async def acquire_async(self):
+        """
+        acquire 的协程版本，等待期间不阻塞事件循环
+        """
+        while True:
+            wait = self._reserve()
+            if not wait:
+                return
+            await asyncio.sleep(self._delay(wait))
+
+    def on_success(self):
+        with self._lock:
+            self._penalty = 0
+            self._success += 1
+            if self._success >= self.INCREASE_EVERY and self.rate < self.max_rate:
+                self._success = 0
+                self.rate = min(self.max_rate, self.rate * self.INCREASE_FACTOR)
+
+    def on_throttled(self):
+        with self._lock:
+            self._success = 0
+            self._penalty += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            cooldown = min(self.MAX_COOLDOWN, self.BASE_COOLDOWN * 2 ** (self._penalty - 1))
+            self._blocked_until = time.monotonic() + cooldown
+            self._tokens = 0
+        logger.warning(f"豆瓣接口 {self.name} 被限流，降速至 {1 / self.rate:.1f} 秒/次，冷却 {cooldown} 秒")
+
+
+class RateLimiter:
+    """
+    按接口区分的豆瓣请求限速器，只对真实发出的请求计数
+    """
+
+    # 各接口速率（次/秒）：(初始, 最低, 最高)
+    DEFAULT_RATES: Dict[str, Tuple[float, float, float]] = {
+        # 首页，仅用于获取ck
+        "home": (1.0, 1 / 10, 1.0),
+        # 搜索接口反爬最严格
+        "search": (1 / 8, 1 / 30, 1 / 3),
+        # 条目详情页
+        "subject": (1 / 1.5, 1 / 10, 1.0),
+        # 用户收藏列表页
+        "collection": (1 / 3, 1 / 20, 1.0),
+        # 标记想看/在看/看过
+        "interest": (1.0, 1 / 10, 2.0),
+    }
+
+    def __init__(self, rates: Optional[Dict[str, Tuple[float, float, float]]] = None):
+        self._buckets: Dict[str, TokenBucket] = {
+            name: TokenBucket(name, *rate)
+            for name, rate in {**self.DEFAULT_RATES, **(rates or {})}.items()
+        }
+
+    def bucket(self, endpoint: str) -> TokenBucket:
+        return self._buckets[endpoint]
+
+    def acquire(self, endpoint: str):
+        self.bucket(endpoint).acquire()
+
+    async def acquire_async(self, endpoint: str):
+        await self.bucket(endpoint).acquire_async()
+
+    def on_success(self, endpoint: str):
+        self.bucket(endpoint).on_success()
+
+    def on_throttled(self, endpoint: str):
+        self.bucket(endpoint).on_throttled()
@@ -0,0 +1,245 @@
+from typing import List, Optional, Set, Tuple
+
+from app.log import logger
+
+from app.plugins.zvideohelperex.MediaDatabase import begin_read, connect
+from app.plugins.zvideohelperex.SyncEngine import MediaSourceAdapter, MovieStream, SyncError, WatchedTarget
+
+#发现有部分电影的ID豆瓣会跳转到新的ID上去，导致同步失败，这里做下映射
+ID_REPLACEMENTS = {
+    34951057: 36069854,  #猩球崛起：新世界
+    # 34951058: 36069855,  # 可以添加更多替换规则
+}
+
+#豆瓣没有数据或者异常的几部片子ID，这几个没法标记为已看，过滤掉
+EXCLUDED_DOUBAN_IDS = {
+    35196946: "三体 第 1 季",
+    26920285: "怪物猎人",
+    26933053: "反击 第 6 季"
+}
+
+# 从 meta_info 中取标题和豆瓣ID，meta_info 不是合法 JSON 时 json_extract 会使整个查询失败，需先用 json_valid 判断
+COLLECTION_META_COLUMNS = """
+    c.collection_id,
+    json_valid(c.meta_info),
+    CASE WHEN json_valid(c.meta_info) THEN json_extract(c.meta_info, '$.title') END,
+    CASE WHEN json_valid(c.meta_info) THEN json_extract(c.meta_info, '$.relation.douban.douban_id') END
+"""
+
+
+def state_key(douban_id) -> str:
+    """
+    同步状态的主键，与旧版本以标题为 key 的条目区分
+    """
+    return f"douban:{douban_id}"
+
+
+class ZvideoAdapter(MediaSourceAdapter):
+    """
+    极影视：在看取自播放列表，已看取自“是否看过”标签，条目的 meta_info 中记录了豆瓣ID
+    同步状态以豆瓣ID为主键，旧版本以标题记录的条目通过标题查询
+    """
+
+    name = "极影视"
+    # 反向同步时每个事务写入的标签数
+    write_batch = 500
+
+    def __init__(self, db_path: str, username: str):
+        self.db_path = db_path
+        self.username = username
+
+    def config_key(self) -> str:
+        return self.db_path
+
+    def validate(self, kind: str) -> Optional[str]:
+        if kind == "reverse" and not self.username:
+            return "极影视用户名未配置，请检查设置"
+        return None
+
+    def scan(self, kind: str, since) -> Tuple[int, List[dict], Optional[Set[str]]]:
+        # 只读事务内完成扫描，标记豆瓣状态在关闭连接后进行
+        conn = begin_read(self.db_path)
+        try:
+            if kind == "watching":
+                return self._scan_watching(conn, since)
+            return self._scan_done(conn, since)
+        finally:
+            conn.close()
+
+    def _scan_watching(self, conn, since):
+        # 播放列表以 rowid 作为增量标记，与扫描在同一读事务内读取新的水位
+        high_water = conn.execute("SELECT MAX(rowid) FROM zvideo_playlist").fetchone()[0] or since
+        playlist_filter = "" if since is None else "WHERE rowid > ?"
+        # 一次查询取出播放列表中剧集的标题和豆瓣ID，在 SQLite 中解析 meta_info
+        cursor = conn.execute(f"""
+            SELECT {COLLECTION_META_COLUMNS}
+            FROM zvideo_collection c
+            WHERE c.type = 200
+              AND c.collection_id IN (SELECT collection_id FROM zvideo_playlist {playlist_filter})
+        """, () if since is None else (since,))
+        return high_water, self._items(cursor), None
+
+    def _scan_done(self, conn, since):
+        # 看过标记以 rowid 作为增量标记，与扫描在同一读事务内读取新的水位
+        # 不用 created_at：反向同步写入的标记时间取自豆瓣标记日期（当天 12:00），可能晚于之后才新增的真实标记
+        if not isinstance(since, int):
+            # 旧版本以 created_at 记录的水位，完整扫描一次
+            since = None
+        high_water = conn.execute(
+            "SELECT MAX(rowid) FROM zvideo_collection_tags WHERE tag_name = '是否看过'"
+        ).fetchone()[0] or since
+        excluded_ids = list(EXCLUDED_DOUBAN_IDS.keys())
+        placeholders = ','.join(['?' for _ in excluded_ids])
+        # 一次查询取出看过的条目的标题和豆瓣ID，在 SQLite 中解析 meta_info
+        sql = f"""
+            SELECT {COLLECTION_META_COLUMNS}
+            FROM zvideo_collection c
+            WHERE c.extend_type != 7
+              AND c.collection_id IN (
+                  SELECT collection_id FROM zvideo_collection_tags WHERE tag_name = '是否看过'
+                  {"" if since is None else "AND rowid > ?"}
+              )
+              AND c.douban_id NOT IN ({placeholders})
+        """
+        params = ([] if since is None else [since]) + excluded_ids
+        # 完整扫描时顺便取出库中所有条目的豆瓣ID和标题，清理已移除条目的同步状态
+        library_keys = None
+        if since is None:
+            library_keys = set()
+            for title, douban_id in conn.execute("""
+                SELECT json_extract(meta_info, '$.title'),
+                       json_extract(meta_info, '$.relation.douban.douban_id')
+                FROM zvideo_collection
+                WHERE json_valid(meta_info)
+            """):
+                # 旧版本以标题为 key
+                library_keys.add(title)
+                if douban_id:
+                    library_keys.add(state_key(ID_REPLACEMENTS.get(douban_id, douban_id)))
+        return high_water, self._items(conn.execute(sql, params)), library_keys
+
+    @staticmethod
+    def _items(cursor) -> List[dict]:
+        """
+        逐行读取 COLLECTION_META_COLUMNS 查询结果，跳过无法解析的 meta_info 和没有豆瓣ID的条目
+        """
+        items = []
+        for collection_id, valid, title, douban_id in cursor:
+            if not valid:
+                logger.error(f"An error occurred while decoding JSON for collection_id {collection_id}")
+                continue
+            if title is None:
+                logger.error(f"collection_id {collection_id} 的 meta_info 中没有标题，解析失败")
+                continue
+            if douban_id == 0:  #豆瓣ID为0的直接跳过，没必要去查找
+                continue
+            if douban_id is None:
+                logger.error(f"未找到豆瓣ID: {title}")
+                continue
+            # 使用映射替换
+            douban_id = ID_REPLACEMENTS.get(douban_id, douban_id)
+            items.append({"key": state_key(douban_id), "title": title, "douban_id": douban_id})
+        return items
+
+    def state_lookup(self, item: dict) -> dict:
+        return {"douban_id": item.get("douban_id"), "title": item.get("title")}
+
+    def douban_movies(self, helper, douban_user: str, watermark: Optional[dict]) -> MovieStream:
+        # 只有反向同步需要抓取豆瓣，扫描和写入看过标签不依赖 HTTP 客户端
+        from app.plugins.zvideohelperex.DoubanHelper import CollectionCrawl
+
+        # 列表请求失败或被限流时抓取停止，crawl.complete 为 False，水位不推进
+        crawl = CollectionCrawl()
+        return MovieStream(
+            helper.fetch_all_movies(douban_user, watermark=watermark, crawl=crawl),
+            complete=lambda: crawl.complete,
+            newest=lambda: crawl.newest,
+        )
+
+    def open_target(self) -> "ZvideoTarget":
+        return ZvideoTarget(self.db_path, self.username)
+
+
+class ZvideoTarget(WatchedTarget):
+    """
+    把豆瓣看过写入极影视的“是否看过”标签
+    """
+
+    def __init__(self, db_path: str, username: str):
+        self.username = username
+        self.conn = connect(db_path, readonly=False)
+        try:
+            self._load()
+        except Exception:
+            self.conn.close()
+            raise
+
+    def _load(self):
+        # 预加载 douban_id -> collection_id 映射和用户已有的"是否看过"标签，避免逐条查询
+        # 两次查询放在同一个读事务中，保证数据一致
+        self.conn.execute("BEGIN")
+        self.collection_map = {}
+        for douban_id, collection_id in self.conn.execute("""
+            SELECT douban_id, collection_id
+            FROM zvideo_collection
+            WHERE douban_id IS NOT NULL AND douban_id != 0
+            ORDER BY collection_id
+        """):
+            self.collection_map.setdefault(douban_id, collection_id)
+        self.tagged_ids = {row[0] for row in self.conn.execute("""
+            SELECT collection_id
+            FROM zvideo_collection_tags
+            WHERE tag_type = 9
+            AND user_name = ?
+        """, (self.username,))}
+        self.conn.commit()
+        logger.info(f"极影视库中共 {len(self.collection_map)} 个豆瓣条目，已标记看过 {len(self.tagged_ids)} 个")
+
+    def match(self, movie: dict) -> Optional[dict]:
+        # 检查status是否为'看过'
+        if movie.get('status') != '看过':
+            return None
+        douban_id = movie.get('douban_id')
+        rating_date = movie.get('rating_date')
+        title = movie.get('title')
+        if not douban_id or not rating_date:
+            logger.info(f"⚠️ 数据不完整: {title}，跳过")
+            return None
+        try:
+            collection_id = self.collection_map.get(int(douban_id))
+        except ValueError:
+            collection_id = None
+        if not collection_id:
+            logger.info(f"ℹ️ 数据库中未找到:{title} (豆瓣ID: {douban_id})，跳过")
+            return None
+        return {"key": state_key(douban_id), "title": title, "douban_id": douban_id,
+                "collection_id": collection_id, "rating_date": rating_date}
+
+    def plan(self, item: dict) -> list:
+        collection_id = item["collection_id"]
+        if collection_id in self.tagged_ids:
+            return []
+        # 简化时间处理：直接在豆瓣时间后面加上固定字符串
+        # 豆瓣格式: "2026-01-05"
+        # 目标格式: "2026-01-05 12:00:00.000000000+08:00"
+        created_at_str = f"{item['rating_date']} 12:00:00.000000000+08:00"
+        self.tagged_ids.add(collection_id)
+        logger.info(f"✅ 待同步: {item['title']} (豆瓣ID: {item['douban_id']}, 时间: {created_at_str})")
+        return [(self.username, collection_id, created_at_str)]
+
+    def write(self, writes: list):
+        # tag_id固定为1，tag_type固定为9
+        with self.conn:
+            self.conn.executemany("""
+                INSERT INTO zvideo_collection_tags
+                (user_name, collection_id, tag_id, tag_type, tag_name, created_at)
+                VALUES (?, ?, 1, 9, '是否看过', ?)
+            """, writes)
+        logger.info(f"写入 {len(writes)} 条看过标记 (用户: {self.username})")
+
+    def discard(self, writes: list):
+        for _, collection_id, _ in writes:
+            self.tagged_ids.discard(collection_id)
+
+    def close(self):
+        self.conn.close()
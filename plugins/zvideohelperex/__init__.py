@@ -1,8 +1,14 @@
 from datetime import datetime, timedelta
 import sqlite3
-import json
+from app.plugins.zvideohelperex.DoubanCache import DoubanCache
+from app.plugins.zvideohelperex.DoubanClient import shared_cache
 from app.plugins.zvideohelperex.DoubanHelper import *
-from enum import Enum
+from app.plugins.zvideohelperex.MediaDatabase import check_unchanged
+from app.plugins.zvideohelperex.SyncEngine import SyncEngine
+from app.plugins.zvideohelperex.SyncState import SyncState
+from app.plugins.zvideohelperex.ZvideoAdapter import ZvideoAdapter
+
+import threading
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -17,12 +23,6 @@ from typing import Any, List, Dict, Tuple, Optional
 from app.log import logger
 import time
 
-# 豆瓣状态
-class DoubanStatus(Enum):
-    WATCHING = "do"
-    DONE = "collect"
-
-
 class ZvideoHelperEx(_PluginBase):
     # 插件名称
     plugin_name = "极影视豆瓣同步"
@@ -31,7 +31,7 @@ class ZvideoHelperEx(_PluginBase):
     # 插件图标
     plugin_icon = "zvideo.png"
     # 插件版本
-    plugin_version = "2.1"
+    plugin_version = "2.2"
     # 插件作者
     plugin_author = "superxyj2021"
     # 作者主页
@@ -52,8 +52,11 @@ class ZvideoHelperEx(_PluginBase):
     _clean_cache = False
     _private = False
     _reverse_sync_douban_status = False
-    _douban_helper = None
-    _cached_data: dict = {}
+    _douban_cache: Optional[DoubanCache] = None
+    _douban_helper: Optional[DoubanHelper] = None
+    _douban_helper_lock = threading.Lock()
+    _warm_up_thread: Optional[threading.Thread] = None
+    _sync_state: Optional[SyncState] = None
     _db_path = ""
     _cookie = ""
     _zvideo_username = ""
@@ -62,18 +65,17 @@ class ZvideoHelperEx(_PluginBase):
     _scheduler: Optional[BackgroundScheduler] = None
     _should_stop = False
 
-    #发现有部分电影的ID豆瓣会跳转到新的ID上去，导致同步失败，这里做下映射
-    ID_REPLACEMENTS = {
-        34951057: 36069854,  #猩球崛起：新世界
-        # 34951058: 36069855,  # 可以添加更多替换规则
-    }
-    #豆瓣没有数据或者异常的几部片子ID，这几个没法标记为已看，过滤掉
-    EXCLUDED_DOUBAN_IDS = {
-        35196946: "三体 第 1 季",
-        26920285: "怪物猎人", 
-        26933053: "反击 第 6 季"
-    }
-    
+    # 判断数据库是否有变化的信号：标记和播放列表的最大 rowid 与数量、条目数量
+    # 新增记录使 MAX(rowid) 变化（与增量查询的水位一致，按主键直接取得，无需扫描全表），删除记录使数量变化
+    CHANGE_SIGNAL_SQL = """
+        SELECT
+            (SELECT MAX(rowid) FROM zvideo_collection_tags),
+            (SELECT COUNT(*) FROM zvideo_collection_tags),
+            (SELECT MAX(rowid) FROM zvideo_playlist),
+            (SELECT COUNT(*) FROM zvideo_playlist),
+            (SELECT COUNT(*) FROM zvideo_collection)
+    """
+
     def init_plugin(self, config: dict = None):
         self._should_stop = False
         # 停止现有任务
@@ -92,19 +94,22 @@ class ZvideoHelperEx(_PluginBase):
             self._reverse_sync_douban_status = config.get("reverse_sync_douban_status")
             self._zvideo_username = config.get("zvideo_username")
             self._douban_user = config.get("douban_user")
-            self._douban_helper = DoubanHelper(user_cookie=self._cookie)
+            # 已同步条目的状态，以豆瓣ID为主键，标题为辅助索引，按需查询，不在启动时加载
+            if not self._sync_state:
+                # 旧版本以标题为 key
+                self._sync_state = SyncState(self.get_data_path() / "sync_state.db", legacy_field="title")
+                self._migrate_cached_data()
+            # 豆瓣数据缓存进程内各插件共用：已有插件登记时直接使用，否则使用本插件的缓存
+            # 本插件的缓存在创建豆瓣助手时才登记，飞牛影视插件即使加载在后，其已积累的缓存仍优先共用
+            if not self._douban_cache:
+                self._douban_cache = shared_cache() or DoubanCache(self.get_data_path() / "douban_cache.db")
+            # 豆瓣助手在第一次使用时才创建，避免加载插件时访问豆瓣
+            self._douban_helper = None
 
-        # 获取历史数据
-        self._cached_data = (
-            self.get_data("zvideohelperex")
-            if self.get_data("zvideohelperex") is not None
-            else dict()
-        )
         # 加载模块
         if self._onlyonce:
             if self._clean_cache:
-                self._cached_data = {}
-                self.save_data("zvideohelperex", self._cached_data)
+                self._sync_engine().clear()
                 self._clean_cache = False
             # 检查数据库路径是否存在
             path = Path(self._db_path)
@@ -251,299 +256,112 @@ class ZvideoHelperEx(_PluginBase):
         if self._reverse_sync_douban_status:
             self.reverse_sync_douban_status()
         if self._sync_douban_status:
-            self.sync_douban_status()
-
+            unchanged, fingerprint = self._check_db_unchanged()
+            if unchanged:
+                logger.info("极影视数据库自上次同步后没有变化，跳过同步观影状态")
+                self.save_data("db_fingerprint", fingerprint)
+                return
+            # 同步全部成功后才记录指纹，失败的条目下次重新处理
+            if self.sync_douban_status() and fingerprint:
+                self.save_data("db_fingerprint", fingerprint)
+            else:
+                self.del_data("db_fingerprint")
 
-    def set_douban_watching(self):
-        logger.info("⏳ 开始同步在看状态...")
-        watching_douban_id = []
+    def _check_db_unchanged(self) -> Tuple[bool, Optional[dict]]:
+        """
+        判断极影视数据库自上次同步成功后是否有变化
+        """
         try:
-            conn = sqlite3.connect(self._db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT collection_id FROM zvideo_playlist")
-            collection_ids = cursor.fetchall()
-            collection_ids = set([collection_id[0] for collection_id in collection_ids])
-            meta_info_list = []
-            for collection_id in collection_ids:
-                if self._should_stop:
-                    logger.info("检测到中断请求，停止同步在看状态...")
-                    break
-                cursor.execute(
-                    "SELECT meta_info FROM zvideo_collection WHERE collection_id = ? AND type = 200",
-                    (collection_id,),
-                )
-                rows = cursor.fetchall()
-                for row in rows:
-                    if self._should_stop:
-                        logger.info("检测到中断请求，停止同步在看状态...")
-                        break
-                    try:
-                        meta_info_json = json.loads(row[0])
-                        meta_info_list.append(meta_info_json)
-                    except json.JSONDecodeError as e:
-                        logger.error(
-                            f"An error occurred while decoding JSON for collection_id {collection_id}: {e}"
-                        )
-            for meta_info in meta_info_list:
-                if self._should_stop:
-                    logger.info("检测到中断请求，停止同步在看状态...")
-                    break
-                try:
-                    douban_id = meta_info["relation"]["douban"]["douban_id"]
-                    title = meta_info["title"]
-                except Exception as e:
-                    logger.error(f"meta_info: {meta_info}，解析失败: {e}")
-                    continue
-                if self._cached_data.get(title) is not None:
-                    logger.info(f"ℹ️ 已处理过: {title}，跳过...")
-                    continue
-                if douban_id == 0: #豆瓣ID为0的直接跳过，没必要去查找
-                    continue
-                if douban_id is not None:
-                    watching_douban_id.append((title, douban_id))
-                else:
-                    logger.error(f"未找到豆瓣ID: {title}")
-
-        except sqlite3.Error as e:
-            logger.error(f"An error occurred: {e}")
-
-        finally:
-            # 确保游标和连接在使用完后关闭
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
-            message = ""
-            for item in watching_douban_id:
-                status = DoubanStatus.WATCHING.value
-                ret = self._douban_helper.set_watching_status(
-                    subject_id=item[1], status=status, private=self._private
-                )
-                if ret:
-                    self._cached_data[item[0]] = status
-                    logger.info(f"✅ title: {item[0]}, douban_id: {item[1]}，已标记为在看")
-                    message += f"{item[0]}，已标记为在看\n"
-                else:
-                    logger.error(
-                        f"⚠️ title: {item[0]}, douban_id: {item[1]}，标记在看失败"
-                    )
-                    message += f"{item[0]}，***标记在看失败***\n"
-            if self._notify and len(message) > 0:
-                self.post_message(
-                    mtype=NotificationType.SiteMessage,
-                    title="【极影视豆瓣同步】",
-                    text=message,
-                )
+            return check_unchanged(self.get_data("db_fingerprint"), self._db_path, self.CHANGE_SIGNAL_SQL,
+                                   key=self._db_path)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"检查极影视数据库变化失败，执行完整同步: {e}")
+            return False, None
 
-    def set_douban_done(self):
-        logger.info("⏳ 开始同步已看状态...")
-        watching_douban_id = []
-        try:
-            conn = sqlite3.connect(self._db_path)
-            cursor = conn.cursor()
-            
-            #"""安全地获取收藏ID"""
-            excluded_ids = list(self.EXCLUDED_DOUBAN_IDS.keys())
-            
-            # 基础查询
-            sql_parts = [
-                "SELECT t.collection_id",
-                "FROM zvideo_collection_tags t",
-                "JOIN zvideo_collection c ON t.collection_id = c.collection_id",
-                "WHERE t.tag_name = '是否看过'",
-                "AND c.extend_type != 7"
-            ]
-            
-            params = []
-            
-            # 处理排除ID
-            if excluded_ids:
-                placeholders = ','.join(['?' for _ in excluded_ids])
-                sql_parts.append(f"AND c.douban_id NOT IN ({placeholders})")
-                params.extend(excluded_ids)
-            
-            # 构建完整SQL
-            sql = "\n".join(sql_parts)
-            
-            cursor.execute(sql, params)
-            
-            collection_ids = cursor.fetchall()
-            collection_ids = set([collection_id[0] for collection_id in collection_ids])
-            meta_info_list = []
-            for collection_id in collection_ids:
-                if self._should_stop:
-                    logger.info("检测到中断请求，停止同步已看状态...")
-                    break
-                cursor.execute(
-                    "SELECT meta_info FROM zvideo_collection WHERE collection_id = ?",
-                    (collection_id,),
-                )
-                rows = cursor.fetchall()
-                for row in rows:
-                    if self._should_stop:
-                        logger.info("检测到中断请求，停止同步已看状态...")
-                        break
-                    try:
-                        meta_info_json = json.loads(row[0])
-                        meta_info_list.append(meta_info_json)
-                    except json.JSONDecodeError as e:
-                        logger.error(
-                            f"An error occurred while decoding JSON for collection_id {collection_id}: {e}"
-                        )
-            for meta_info in meta_info_list:
-                if self._should_stop:
-                    logger.info("检测到中断请求，停止同步已看状态...")
-                    break
-                try:
-                    douban_id = meta_info["relation"]["douban"]["douban_id"]
-                    # 使用映射替换
-                    douban_id = self.ID_REPLACEMENTS.get(douban_id, douban_id)
-                    title = meta_info["title"]
-                except Exception as e:
-                    logger.error(f"meta_info: {meta_info}，解析失败: {e}")
-                    continue
-                if self._cached_data.get(title) == DoubanStatus.DONE.value:
-                    logger.info(f"ℹ️ 已处理过: {title}，跳过...")
-                    continue
-                if douban_id == 0: #豆瓣ID为0的直接跳过，没必要去查找
-                    continue
-                if douban_id is not None:
-                    watching_douban_id.append((title, douban_id))
-                else:
-                    logger.error(f"未找到豆瓣ID: {title}")
-
-        except sqlite3.Error as e:
-            logger.error(f"An error occurred: {e}")
-
-        finally:
-            # 确保游标和连接在使用完后关闭
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
-            message = ""
-            for item in watching_douban_id:
-                status = DoubanStatus.DONE.value
-                ret = self._douban_helper.set_watching_status(
-                    subject_id=item[1], status=status, private=self._private
-                )
-                if ret:
-                    self._cached_data[item[0]] = status
-                    logger.info(f"✅ title: {item[0]}, douban_id: {item[1]},已标记为已看")
-                    message += f"{item[0]}，已标记为已看\n"
-                else:
-                    logger.error(
-                        f"⚠️ title: {item[0]}, douban_id: {item[1]}, 标记已看失败"
-                    )
-                    message += f"{item[0]}，***标记已看失败***\n"
-            if self._notify and len(message) > 0:
-                self.post_message(
-                    mtype=NotificationType.SiteMessage,
-                    title="【极影视豆瓣同步】",
-                    text=message,
+
+    def set_douban_watching(self) -> bool:
+        return self._sync_engine().forward("watching")
+
+    def set_douban_done(self) -> bool:
+        return self._sync_engine().forward("done")
+
+    def reverse_sync_douban_status(self) -> bool:
+        return self._sync_engine().reverse()
+
+    def _sync_engine(self) -> SyncEngine:
+        """
+        同步流程由 SyncEngine 完成，极影视的查询和写入由 ZvideoAdapter 提供
+        """
+        return SyncEngine(
+            ZvideoAdapter(self._db_path, self._zvideo_username), self._sync_state, self,
+            helper=self._get_douban_helper,
+            should_stop=lambda: self._should_stop,
+            notify=self._notify_message,
+            douban_user=self._douban_user,
+            private=self._private,
+        )
+
+    def _notify_message(self, text: str):
+        if self._notify:
+            self.post_message(
+                mtype=NotificationType.SiteMessage,
+                title="【极影视豆瓣同步】",
+                text=text,
+            )
+
+    def _migrate_cached_data(self):
+        """
+        旧版本把同步状态整体保存在插件数据中，导入同步状态存储后删除
+        """
+        legacy = self.get_data("zvideohelperex")
+        if legacy:
+            logger.info(f"已将 {self._sync_state.migrate(legacy, field='title')} 条旧缓存数据导入同步状态存储")
+        if legacy is not None:
+            self.del_data("zvideohelperex")
+        # 旧版本的增量标记按数据来源命名
+        watermarks = self.get_data("sync_watermark")
+        if watermarks and ("playlist" in watermarks or "tags" in watermarks):
+            for old, kind in (("playlist", "watching"), ("tags", "done")):
+                if old in watermarks:
+                    watermarks[kind] = watermarks.pop(old)
+            self.save_data("sync_watermark", watermarks)
+
+    def sync_douban_status(self) -> bool:
+        """
+        :return: 是否全部同步成功
+        """
+        watching_ok = self.set_douban_watching()
+        done_ok = self.set_douban_done()
+        # 提交剩余的同步状态
+        self._sync_state.flush()
+        return bool(watching_ok and done_ok)
+
+    def _get_douban_helper(self) -> DoubanHelper:
+        """
+        第一次使用时创建豆瓣助手，ck 状态持久化以便重启后复用
+        """
+        with self._douban_helper_lock:
+            if not self._douban_helper:
+                self._douban_helper = DoubanHelper(
+                    user_cookie=self._cookie,
+                    cache=self._douban_cache,
+                    ck_state=self.get_data("douban_ck"),
+                    on_ck_refresh=lambda state: self.save_data("douban_ck", state),
+                    owner=self.__class__.__name__,
                 )
+            return self._douban_helper
 
-    def reverse_sync_douban_status(self):
-        
-        logger.info(f"⏳ 开始同步豆瓣数据到极影视...")
-        # 连接到数据库
-        conn = sqlite3.connect(self._db_path)
-        conn.text_factory = str
-        cursor = conn.cursor()
-        
+    def _warm_up_douban_helper(self):
         try:
-            # 遍历fetch_all_movies返回的所有电影数据
-            for movie in self._douban_helper.fetch_all_movies(douban_user=self._douban_user):
-                if self._should_stop:
-                    logger.info("检测到中断请求，停止同步已看状态...")
-                    break
-                # 1. 检查status是否为'看过'
-                if movie.get('status') != '看过':
-                    continue
-                
-                douban_id = movie.get('douban_id')
-                rating_date = movie.get('rating_date')
-                
-                if not douban_id or not rating_date:
-                    logger.info(f"⚠️ 数据不完整: {movie.get('title')}，跳过")
-                    continue
-                
-                logger.info(f"正在处理: {movie.get('title')} (豆瓣ID: {douban_id})")
-                
-                # 2. 在zvideo_collection中查找是否存在该douban_id的条目
-                cursor.execute("""
-                    SELECT collection_id 
-                    FROM zvideo_collection 
-                    WHERE douban_id = ?
-                """, (int(douban_id),))
-                
-                result = cursor.fetchone()
-                
-                if not result:
-                    logger.info(f"ℹ️ 数据库中未找到:{movie.get('title')} (豆瓣ID: {douban_id})，跳过")
-                    continue
-                
-                collection_id = result[0]
-                
-                # 3. 检查zvideo_collection_tags中是否已存在tag_type=9的条目
-                cursor.execute("""
-                    SELECT id 
-                    FROM zvideo_collection_tags 
-                    WHERE collection_id = ? 
-                    AND tag_type = 9
-                    AND user_name = ?
-                """, (collection_id, self._zvideo_username))
-                
-                existing_tag = cursor.fetchone()
-                
-                if existing_tag:
-                    logger.info(f"ℹ️ 已同步过: {movie.get('title')} (豆瓣ID: {douban_id})，跳过")
-                    continue
-                
-                # 4. 简化时间处理：直接在豆瓣时间后面加上固定字符串
-                # 豆瓣格式: "2026-01-05"
-                # 目标格式: "2026-01-05 12:00:00.000000000+08:00"
-                created_at_str = f"{rating_date} 12:00:00.000000000+08:00"
-                logger.info(f"📅 处理时间: {created_at_str}")
-                
-                # 5. 插入新的标签记录
-                cursor.execute("""
-                    INSERT INTO zvideo_collection_tags 
-                    (user_name, collection_id, tag_id, tag_type, tag_name, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    self._zvideo_username,  # 使用用户输入的user_name
-                    collection_id,
-                    1,      # tag_id固定为1
-                    9,      # tag_type固定为9
-                    '是否看过',
-                    created_at_str
-                ))
-                
-                logger.info(f"✅ 成功同步: {movie.get('title')} (豆瓣ID: {douban_id}) (用户: {self._zvideo_username})")
-                
-                # 提交当前插入
-                conn.commit()
-                
+            self._get_douban_helper().ck
         except Exception as e:
-            logger.error(f"❌ 处理过程中发生错误: {e}")
-            conn.rollback()
-            raise
-        
-        finally:
-            # 关闭数据库连接
-            conn.close()
-        #同步豆瓣到极影视为一次性任务，完成后关闭选项
-        self._reverse_sync_douban_status = False
-        self._update_config()
-
-    def sync_douban_status(self):
-        self.set_douban_watching()
-        self.set_douban_done()
-        # 缓存数据
-        self.save_data("zvideohelperex", self._cached_data)
+            logger.warning(f"预热豆瓣连接失败: {e}")
 
     def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
+        # 打开配置页时在后台预热豆瓣连接，不阻塞页面
+        if self._enabled and not (self._warm_up_thread and self._warm_up_thread.is_alive()):
+            self._warm_up_thread = threading.Thread(target=self._warm_up_douban_helper, daemon=True)
+            self._warm_up_thread.start()
         return [
             {
                 "component": "VForm",
@@ -778,7 +596,7 @@ class ZvideoHelperEx(_PluginBase):
                                         "props": {
                                             "type": "info",
                                             "variant": "tonal",
-                                            "text": "双向同步仅执行一次，执行后会自动关闭。该选项会先将豆瓣已看数据同步到极影视中。",
+                                            "text": "双向同步会先将豆瓣已看数据同步到极影视中。首次运行抓取全部已看列表，之后只抓取上次同步后新标记的条目，清理缓存数据可重新全量同步。",
                                         },
                                     }
                                 ],
@@ -824,6 +642,8 @@ class ZvideoHelperEx(_PluginBase):
         退出插件
         """
         self._should_stop = True
+        if self._sync_state:
+            self._sync_state.flush()
         try:
             if self._scheduler:
                 self._scheduler.remove_all_jobs()